@@ -0,0 +1,643 @@
+"""
+Benchmarks for the DLL and Git implementations in main.py.
+
+Run with `python bench.py [name ...] [--sizes N ...] [--json PATH] [--baseline PATH]`. Without
+names, every benchmark is run. Results can be written as JSON and compared against a baseline
+written the same way; the run fails when an operation got slower than the baseline by more than
+the threshold, and by more than the minimum delta in absolute terms.
+
+bench_baseline.json is a reference run of `python bench.py --sizes 1000 10000 100000 --json
+bench_baseline.json`. Timings depend on the machine and its load: regenerate it on the machine you
+compare on before relying on --baseline, and raise --threshold on shared machines, where two runs of
+the same code can differ by more than 25%.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+from itertools import islice
+from typing import Callable, Dict, List, Optional
+
+from main import DLL, CompactDLL, Git, MessagePool, AsyncGit, TextIndex
+
+SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+# Runs of every measured operation; the fastest one is reported.
+REPEAT = 3
+# Operations faster than this many seconds are run up to SHORT_REPEAT times instead, since their
+# timings are dominated by noise.
+SHORT_ROW = 0.01
+SHORT_REPEAT = 20
+# Slowdowns smaller than this many seconds are never reported as regressions.
+MIN_DELTA = 0.001
+# Tree shapes built by build_tree.
+SHAPES = ["linear", "fanout", "branches"]
+# Commits per branch in the "branches" shape.
+SMALL_BRANCH = 10
+# Lookups timed per operation for the constant and logarithmic time queries.
+SAMPLE = 10 ** 4
+
+# Every row reported during the run, as written by --json.
+RESULTS: List[dict] = []
+
+
+def timed(fn: Callable[[], object]) -> float:
+    """
+    Time a single call.
+
+    :param fn: zero-argument callable to time.
+    :return: elapsed wall-clock time in seconds.
+    """
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def measure(op: Callable[[object], object], setup: Callable[[], object], repeat: int = REPEAT) -> float:
+    """
+    Time `op` on fresh state `repeat` times, with a collected heap before each run, so results do not
+    depend on garbage left by earlier benchmarks. Operations faster than SHORT_ROW are run
+    SHORT_REPEAT times when `repeat` allows more than one run.
+
+    :param op: callable receiving the state returned by `setup`.
+    :param setup: zero-argument callable preparing the state; not timed.
+    :param repeat: number of runs.
+    :return: fastest elapsed wall-clock time in seconds.
+    """
+    best = float("inf")
+    runs = 0
+    while runs < repeat or (1 < repeat and runs < SHORT_REPEAT and best < SHORT_ROW):
+        state = setup()
+        gc.collect()
+        start = time.perf_counter()
+        op(state)
+        best = min(best, time.perf_counter() - start)
+        runs += 1
+    return best
+
+
+def report(name: str, n: int, elapsed: float, ops: Optional[int] = None) -> None:
+    """
+    Print and record one benchmark row, including the per-node (or per-operation) cost so linear
+    scaling is easy to spot.
+
+    :param name: label of the measured operation.
+    :param n: number of nodes the operation worked on.
+    :param elapsed: elapsed time in seconds.
+    :param ops: number of operations timed, when the row times repeated calls rather than one call
+        over `n` nodes.
+    :return: None.
+    """
+    unit, count = ("ns/op", ops) if ops is not None else ("ns/node", n)
+    print(f"{name:<36} n={n:<9} {elapsed * 1e3:10.2f} ms {elapsed / max(count, 1) * 1e9:10.1f} {unit}")
+    RESULTS.append({"name": name, "n": n, "seconds": elapsed, "ops": count})
+
+
+def bench_remove_all(sizes: List[int]) -> None:
+    """
+    Remove every other node of a DLL with remove_all and remove_if.
+
+    :param sizes: list sizes to measure.
+    :return: None.
+    """
+    for n in sizes:
+        for indexed in (False, True):
+            dll = DLL(indexed=indexed)
+            dll.list_to_dll([i % 2 for i in range(n)])
+            label = "remove_all" + (" (indexed)" if indexed else "")
+            report(label, n, timed(lambda: dll.remove_all(0)))
+
+        dll = DLL()
+        dll.list_to_dll(range(n))
+        report("remove_if", n, timed(lambda: dll.remove_if(lambda value: value % 2 == 0)))
+
+
+def bench_build(sizes: List[int]) -> None:
+    """
+    Build a DLL with list_to_dll, with extend from a generator, and with one push per value.
+
+    :param sizes: list sizes to measure.
+    :return: None.
+    """
+    for n in sizes:
+        source = list(range(n))
+        dll = DLL()
+        report("list_to_dll", n, timed(lambda: dll.list_to_dll(source)))
+        dll = DLL()
+        report("extend (generator)", n, timed(lambda: dll.extend(i for i in range(n))))
+
+        def push_all() -> None:
+            dll = DLL()
+            for value in source:
+                dll.push(value)
+
+        report("push loop", n, timed(push_all))
+
+
+def bench_commit_many(sizes: List[int]) -> None:
+    """
+    Import a linear history with Git.commit_many and with one Git.commit call per message.
+
+    :param sizes: number of commits to import.
+    :return: None.
+    """
+    for n in sizes:
+        messages = [f"commit {i}" for i in range(n)]
+        report("commit_many", n, timed(lambda: Git().commit_many(messages)))
+
+        def commit_all() -> None:
+            git = Git()
+            for message in messages:
+                git.commit(message)
+
+        report("commit loop", n, timed(commit_all))
+
+
+def measure_memory(build: Callable[[], object]) -> int:
+    """
+    Measure the memory retained by the object `build` returns.
+
+    :param build: zero-argument callable constructing the object.
+    :return: bytes still allocated once `build` returned.
+    """
+    tracemalloc.start()
+    try:
+        kept = build()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del kept
+    return current
+
+
+def bench_memory(sizes: List[int]) -> None:
+    """
+    Compare memory and build time of Node-based DLL and array-backed CompactDLL holding the
+    same small integers (interned by CPython, so only the list structure is counted).
+
+    :param sizes: list sizes to measure.
+    :return: None.
+    """
+    values = list(range(256))
+    for n in sizes:
+        source = [values[i % 256] for i in range(n)]
+        for name, cls in (("DLL", DLL), ("CompactDLL", CompactDLL)):
+            def build() -> object:
+                dll = cls()
+                for value in source:
+                    dll.push(value)
+                return dll
+
+            used = measure_memory(build)
+            report(f"push {name}", n, timed(build))
+            print(f"{'memory ' + name:<36} n={n:<9} {used / 2 ** 20:10.2f} MiB {used / n:10.1f} B/node")
+
+
+def bench_messages(sizes: List[int]) -> None:
+    """
+    Import a history of mostly repeated messages (short ones and a long merge template), each
+    commit receiving its own copy as if read from a file, with and without a message pool.
+
+    :param sizes: number of commits to import.
+    :return: None.
+    """
+    template = "Merge branch 'feature' into main\n\n" + "Resolve conflicts in the parser. " * 20
+    for n in sizes:
+        pattern = ["wip", "fix tests", template] + [f"change {i}" for i in range(n // 100)]
+        for label, make_pool in (("unpooled", lambda: None), ("pooled", MessagePool),
+                                 ("pooled+zlib", lambda: MessagePool(compress_threshold=128))):
+            def build() -> object:
+                git = Git(make_pool())
+                git.commit_many(pattern[i % len(pattern)].encode().decode() for i in range(n))
+                return git
+
+            report(f"commit_many {label}", n, timed(build))
+            used = measure_memory(build)
+            print(f"{'memory ' + label:<36} n={n:<9} {used / 2 ** 20:10.2f} MiB {used / n:10.1f} B/node")
+        pool = build().message_pool
+        print(f"{'pool report':<36} n={n:<9} {pool.report()}")
+
+
+def bench_dll(sizes: List[int]) -> None:
+    """
+    Time every public DLL method on lists of `n` values drawn from 1000 distinct ones. Mutating
+    methods run on a fresh list each time.
+
+    :param sizes: list sizes to measure.
+    :return: None.
+    """
+    for n in sizes:
+        values = [i % 1000 for i in range(n)]
+        missing = -1
+
+        def fresh(**options) -> Callable[[], DLL]:
+            def setup() -> DLL:
+                dll = DLL(**options)
+                dll.list_to_dll(values)
+                return dll
+            return setup
+
+        def pending_reverse() -> DLL:
+            dll = fresh(lazy_reverse=True)()
+            dll.reverse()
+            return dll
+
+        shared = fresh()()
+        indexed = fresh(indexed=True)()
+        for label, op, setup, ops in [
+            ("DLL.list_to_dll", lambda dll: dll.list_to_dll(values), DLL, None),
+            ("DLL.extend", lambda dll: dll.extend(iter(values)), DLL, None),
+            ("DLL.extendleft", lambda dll: dll.extendleft(values), DLL, None),
+            ("DLL.push", lambda dll: deque(map(dll.push, values), 0), DLL, n),
+            ("DLL.pop", lambda dll: deque((dll.pop() for _ in range(n)), 0), fresh(), n),
+            ("DLL.__iter__", lambda dll: deque(dll, 0), lambda: shared, None),
+            ("DLL.__reversed__", lambda dll: deque(reversed(dll), 0), lambda: shared, None),
+            ("DLL.cursor", lambda dll: deque(dll.cursor(), 0), lambda: shared, None),
+            ("DLL.__contains__", lambda dll: missing in dll, lambda: shared, None),
+            ("DLL.__len__", lambda dll: deque((len(dll) for _ in range(n)), 0), lambda: shared, n),
+            ("DLL.empty", lambda dll: deque((dll.empty() for _ in range(n)), 0), lambda: shared, n),
+            ("DLL.dll_to_list", lambda dll: dll.dll_to_list(), lambda: shared, None),
+            ("DLL.find", lambda dll: dll.find(missing), lambda: shared, None),
+            ("DLL.find_all", lambda dll: dll.find_all(0), lambda: shared, None),
+            ("DLL.find (indexed)", lambda dll: dll.find(missing), lambda: indexed, None),
+            ("DLL.find_all (indexed)", lambda dll: dll.find_all(0), lambda: indexed, None),
+            ("DLL.remove", lambda dll: dll.remove(999), fresh(), None),
+            ("DLL.remove_all", lambda dll: dll.remove_all(0), fresh(), None),
+            ("DLL.remove_all (indexed)", lambda dll: dll.remove_all(0), fresh(indexed=True), None),
+            ("DLL.remove_if", lambda dll: dll.remove_if(lambda value: value % 2 == 0), fresh(), None),
+            ("DLL.reverse", lambda dll: dll.reverse(), fresh(), None),
+            ("DLL.reverse (lazy)", lambda dll: dll.reverse(), fresh(lazy_reverse=True), None),
+            ("DLL.materialize", lambda dll: dll.materialize(), pending_reverse, None),
+        ]:
+            report(label, n, measure(op, setup), ops)
+
+
+def build_tree(shape: str, n: int, seed: int = 0) -> Git:
+    """
+    Build a commit tree of `n` commits with messages c0..c{n-1}.
+
+    "linear" is a single branch; "fanout" is a main branch of n/2 commits with a one-commit branch
+    forked from every one of them; "branches" is n/SMALL_BRANCH branches of SMALL_BRANCH commits,
+    each forked from a random earlier commit that has no branch yet.
+
+    :param shape: one of SHAPES.
+    :param n: number of commits.
+    :param seed: seed of the random fork points.
+    :return: Git object with the last created branch checked out.
+    """
+    git = Git()
+    if shape == "linear":
+        git.commit_many(f"c{i}" for i in range(n))
+    elif shape == "fanout":
+        trunk = n - n // 2
+        git.commit_many(f"c{i}" for i in range(trunk))
+        for i in range(n // 2):
+            git.checkout_commit(f"c{i}")
+            git.checkout_branch(f"b{i}")
+            git.commit(f"c{trunk + i}")
+    elif shape == "branches":
+        rng = random.Random(seed)
+        first = min(n, SMALL_BRANCH)
+        git.commit_many(f"c{i}" for i in range(first))
+        forks = list(range(first))
+        made = first
+        while made < n:
+            # Swap-remove a random commit that has no branch yet.
+            slot = rng.randrange(len(forks))
+            forks[slot], forks[-1] = forks[-1], forks[slot]
+            git.checkout_commit(f"c{forks.pop()}")
+            git.checkout_branch(f"b{made}")
+            size = min(SMALL_BRANCH, n - made)
+            git.commit_many(f"c{made + i}" for i in range(size))
+            forks.extend(range(made, made + size))
+            made += size
+    else:
+        raise Exception(f"Unknown tree shape {shape}, expected one of {', '.join(SHAPES)}")
+    return git
+
+
+def bench_git(sizes: List[int]) -> None:
+    """
+    Time every public GitBranch and Git method on trees of every shape in SHAPES. Queries are timed
+    over up to SAMPLE random commits; walks and whole-tree operations are timed once per run.
+
+    :param sizes: number of commits in the trees.
+    :return: None.
+    """
+    for shape in SHAPES:
+        for n in sizes:
+            report(f"{shape} build", n, measure(lambda _: build_tree(shape, n), lambda: None))
+            git = build_tree(shape, n)
+            rng = random.Random(n)
+            sample = [f"c{rng.randrange(n)}" for _ in range(min(n, SAMPLE))]
+            pairs = list(zip(sample, reversed(sample)))
+            branches = git.list_branches()
+            tip = git.current_branch.get_last_commit()
+            main = git.start
+
+            def fresh() -> Git:
+                return build_tree(shape, n)
+
+            def at_tip() -> Git:
+                git.checkout_branch(tip.branch.name)
+                return git
+
+            def at_root() -> Git:
+                git.checkout_commit("c0")
+                return git
+
+            def create_branches(g: Git) -> None:
+                for i, message in enumerate(sample):
+                    g.checkout_commit(message)
+                    g.checkout_branch(f"new{i}")
+
+            def repeat(call: Callable[[], object], times: int) -> None:
+                deque((call() for _ in range(times)), 0)
+
+            # Page token half way down the history of the tip.
+            cursor = git.history(tip)
+            deque(islice(cursor, tip.generation // 2), 0)
+            middle = cursor.token()
+
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "history.snap")
+                for label, op, setup, ops in [
+                    ("GitBranch.push_commit", lambda b: deque(map(b.push_commit, sample), 0),
+                     lambda: type(main)("bench", tip), len(sample)),
+                    ("GitBranch.get_first_commit", lambda b: repeat(b.get_first_commit, len(sample)),
+                     lambda: main, len(sample)),
+                    ("GitBranch.get_last_commit", lambda b: repeat(b.get_last_commit, len(sample)),
+                     lambda: main, len(sample)),
+                    ("Git.commit", lambda g: deque(map(g.commit, sample), 0), fresh, len(sample)),
+                    ("Git.commit_many", lambda g: g.commit_many(sample), fresh, None),
+                    ("Git.get_current_commit", lambda g: repeat(g.get_current_commit, len(sample)),
+                     at_tip, len(sample)),
+                    ("Git.get_current_branch_name", lambda g: repeat(g.get_current_branch_name, len(sample)),
+                     at_tip, len(sample)),
+                    ("Git.backwards", lambda g: repeat(g.backwards, tip.generation), at_tip, tip.generation),
+                    ("Git.forward", lambda g: repeat(g.forward, main.size - 1), at_root, main.size - 1),
+                    ("Git.checkout_commit", lambda g: deque(map(g.checkout_commit, sample), 0), at_tip,
+                     len(sample)),
+                    ("Git.checkout_branch", lambda g: deque(map(g.checkout_branch, branches), 0), at_tip,
+                     len(branches)),
+                    ("Git.checkout_branch (create)", create_branches, fresh, len(sample)),
+                    ("Git.list_branches", lambda g: g.list_branches(), at_tip, None),
+                    ("Git.snapshot", lambda g: repeat(g.snapshot, len(sample)), at_tip, len(sample)),
+                    ("Git.is_ancestor", lambda g: deque((g.is_ancestor(a, b) for a, b in pairs), 0), at_tip,
+                     len(pairs)),
+                    ("Git.merge_base", lambda g: deque((g.merge_base(a, b) for a, b in pairs), 0), at_tip,
+                     len(pairs)),
+                    ("Git.distance", lambda g: deque((g.distance(a, b) for a, b in pairs), 0), at_tip,
+                     len(pairs)),
+                    ("Git.log", lambda g: g.log(n), at_tip, None),
+                    ("Git.log_page(50) resumed", lambda g: g.log_page(50, page_token=middle), at_tip, 1),
+                    ("Git.find_branch", lambda g: g.find_branch(g.start, "missing"), at_tip, None),
+                    ("Git.find_commit", lambda g: g.find_commit(g.start, "missing"), at_tip, None),
+                    ("Git.save", lambda g: g.save(path), at_tip, None),
+                    ("Git.load", lambda g: Git.load(path).checkout_commit(sample[0]), at_tip, None),
+                ]:
+                    report(f"{shape} {label}", n, measure(op, setup), ops)
+
+
+def bench_async(sizes: List[int]) -> None:
+    """
+    Commit through AsyncGit with a journal, from 1, 10 and 100 concurrent clients each extending
+    its own branch, to show durable commit throughput growing with the number of clients.
+
+    :param sizes: total number of commits; sizes above 10^4 are skipped, as every single-client
+        commit waits for its own fsync.
+    :return: None.
+    """
+    for n in sizes:
+        if n > 10 ** 4:
+            continue
+        for clients in (1, 10, 100):
+            with tempfile.TemporaryDirectory() as directory:
+                git = Git()
+                git.commit_many(f"c{k}" for k in range(clients))
+                git.open_journal(os.path.join(directory, "journal"), group_size=10 ** 6)
+                front = AsyncGit(git)
+
+                async def client(k: int) -> None:
+                    tree = front.worktree()
+                    await tree.checkout_commit(f"c{k}")
+                    await tree.checkout_branch(f"client{k}")
+                    for i in range(n // clients):
+                        await tree.commit(f"client{k}-{i}")
+
+                async def serve() -> None:
+                    await asyncio.gather(*(client(k) for k in range(clients)))
+
+                report(f"AsyncGit.commit ({clients} clients)", n, timed(lambda: asyncio.run(serve())), n)
+                git.close_journal()
+
+
+def bench_search(sizes: List[int]) -> None:
+    """
+    Search every commit message of a "branches" tree for a regular expression with Git.search,
+    on one process and on a pool of 2 and 4 processes, next to Git.find_commit for a missing message.
+    The speedup is bounded by the number of CPUs (os.cpu_count() is printed).
+
+    :param sizes: number of commits to search.
+    :return: None.
+    """
+    print(f"cpus: {os.cpu_count()}")
+    for n in sizes:
+        git = build_tree("branches", n)
+        report("Git.find_commit (missing)", n, measure(lambda g: g.find_commit(g.start, "missing"), lambda: git))
+        for processes in (1, 2, 4):
+            report(f"Git.search ({processes} processes)", n,
+                   measure(lambda g: g.search(r"c\d*(12|34)\d*7$", processes=processes), lambda: git))
+
+
+def bench_grep(sizes: List[int]) -> None:
+    """
+    Index commits drawn from a 10000 word vocabulary with a TextIndex, then answer keyword queries
+    with Git.grep next to the equivalent regular expression scan with Git.search.
+
+    :param sizes: number of commits.
+    :return: None.
+    """
+    for n in sizes:
+        rng = random.Random(n)
+        messages = [" ".join(f"w{int(rng.paretovariate(1)) % 10000}" for _ in range(6)) for _ in range(n)]
+        report("commit_many (no index)", n, timed(lambda: Git().commit_many(messages)))
+        git = Git(text_index=TextIndex())
+        report("commit_many (text index)", n, timed(lambda: git.commit_many(messages)))
+        for query, pattern in [("w9999", r"\bw9999\b"), ("w1 w2", r"(?=.*\bw1\b)(?=.*\bw2\b)"),
+                               ("w77*", r"\bw77"), ("w500 OR w501", r"\bw50[01]\b")]:
+            hits = len(git.grep(query))
+            report(f"Git.grep {query!r} ({hits} hits)", n, measure(lambda g: g.grep(query), lambda: git))
+            report(f"Git.search {query!r}", n, measure(lambda g: g.search(pattern, processes=1), lambda: git, 1))
+
+
+def bench_fan_out(sizes: List[int]) -> None:
+    """
+    Fork `k` branches of one commit each from the same commit of a 100 commit history, then time
+    the branch creation, the searches and the navigation through that commit.
+
+    :param sizes: numbers of branches per commit.
+    :return: None.
+    """
+    for k in sizes:
+        def build() -> Git:
+            git = Git()
+            git.commit_many(f"c{i}" for i in range(100))
+            for i in range(k):
+                git.checkout_commit("c50")
+                git.checkout_branch(f"b{i}")
+                git.commit(f"b{i}-0")
+            return git
+
+        report("fan-out build", k, measure(lambda _: build(), lambda: None))
+        git = build()
+        middle = f"b{k // 2}"
+
+        def at(name: str) -> Callable[[], Git]:
+            def setup() -> Git:
+                git.checkout_branch(name)
+                return git
+            return setup
+
+        def round_trip(g: Git) -> None:
+            for _ in range(20):
+                g.backwards()
+            for _ in range(20):
+                g.forward()
+
+        for label, op, setup, ops in [
+            ("fan-out Git.find_branch", lambda g: g.find_branch(g.start, middle), at("main"), None),
+            ("fan-out Git.find_commit", lambda g: g.find_commit(g.start, middle + "-0"), at("main"), None),
+            ("fan-out Git.checkout_commit", lambda g: g.checkout_commit(middle + "-0"), at("main"), 1),
+            ("fan-out Git.checkout_branch", lambda g: g.checkout_branch(middle), at("main"), 1),
+            ("fan-out backwards/forward x20", round_trip, at(middle), 40),
+        ]:
+            report(label, k, measure(op, setup), ops)
+
+
+def bench_merges(sizes: List[int]) -> None:
+    """
+    Build a history of `n` commits where branches of SMALL_BRANCH commits fork from the tip of main
+    and are merged back, then time the DAG walks: a full history listing, the latest 100 commits,
+    and the ancestry queries between the newest merge and the root or a merged branch.
+
+    :param sizes: numbers of commits.
+    :return: None.
+    """
+    for n in sizes:
+        def build() -> Git:
+            git = Git()
+            git.commit("c0")
+            made = 1
+            while made < n:
+                git.checkout_branch("main")
+                git.checkout_branch(f"b{made}")
+                count = min(SMALL_BRANCH, n - made - 1) or 1
+                git.commit_many(f"c{made + i}" for i in range(count))
+                made += count
+                if made < n:
+                    git.checkout_branch("main")
+                    git.merge(f"b{made - count}", f"c{made}")
+                    made += 1
+            git.checkout_branch("main")
+            return git
+
+        report("merges build", n, measure(lambda _: build(), lambda: None))
+        git = build()
+        tip = git.selected_commit
+        merged = tip.merge_parents[0] if tip.merge_parents else tip
+        cursor = git.history(tip)
+        deque(islice(cursor, n // 2), 0)
+        middle = cursor.token()
+        for label, op, ops in [
+            ("merges Git.history (all)", lambda g: sum(1 for _ in g.history(tip)), None),
+            ("merges Git.log(100)", lambda g: g.log(100), 1),
+            ("merges Git.is_ancestor(root, tip)", lambda g: g.is_ancestor("c0", tip), 1),
+            ("merges Git.merge_base(branch, tip)", lambda g: g.merge_base(merged, tip.parent()), 1),
+            ("merges Git.log_page(50) resumed", lambda g: g.log_page(50, page_token=middle), 1),
+        ]:
+            report(label, n, measure(op, lambda: git), ops)
+
+
+BENCHMARKS: Dict[str, Callable[[List[int]], None]] = {
+    "remove_all": bench_remove_all,
+    "build": bench_build,
+    "commit_many": bench_commit_many,
+    "memory": bench_memory,
+    "messages": bench_messages,
+    "dll": bench_dll,
+    "git": bench_git,
+    "async": bench_async,
+    "search": bench_search,
+    "grep": bench_grep,
+    "fan_out": bench_fan_out,
+    "merges": bench_merges,
+}
+
+
+def compare(results: List[dict], baseline: List[dict], threshold: float, min_delta: float = MIN_DELTA) -> List[str]:
+    """
+    Compare results against a baseline run, row by row (rows missing from either side are ignored).
+
+    :param results: rows of this run.
+    :param baseline: rows of the baseline run.
+    :param threshold: tolerated slowdown, as a fraction of the baseline time.
+    :param min_delta: tolerated slowdown in seconds, whatever the fraction; keeps the noise of
+        sub-millisecond rows from being reported.
+    :return: description of every row slower than the baseline by more than both `threshold` and
+        `min_delta`.
+    """
+    before = {(row["name"], row["n"]): row["seconds"] for row in baseline}
+    regressions = []
+    for row in results:
+        seconds = before.get((row["name"], row["n"]))
+        if seconds is not None and row["seconds"] > max(seconds * (1 + threshold), seconds + min_delta):
+            regressions.append(f"{row['name']} n={row['n']}: {seconds * 1e3:.2f} ms -> "
+                               f"{row['seconds'] * 1e3:.2f} ms ({row['seconds'] / seconds - 1:+.0%})")
+    return regressions
+
+
+def main(argv: List[str]) -> int:
+    """
+    Run the benchmarks named in `argv`, or all of them.
+
+    :param argv: benchmark names and options.
+    :return: process exit status, 1 if a regression against the baseline was found.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the DLL and Git implementations.")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--sizes", nargs="+", type=int, default=SIZES, help="input sizes")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare against the results stored in this file")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="tolerated slowdown against the baseline (default 0.25, i.e. 25%%)")
+    parser.add_argument("--min-delta", type=float, default=MIN_DELTA,
+                        help=f"tolerated slowdown in seconds, whatever the threshold (default {MIN_DELTA})")
+    args = parser.parse_args(argv)
+
+    for name in args.names or BENCHMARKS:
+        if name not in BENCHMARKS:
+            raise Exception(f"Unknown benchmark {name}, expected one of {', '.join(BENCHMARKS)}")
+        BENCHMARKS[name](args.sizes)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"python": sys.version, "results": RESULTS}, file, indent=1)
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(RESULTS, json.load(file)["results"], args.threshold, args.min_delta)
+        for regression in regressions:
+            print("regression:", regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -1,10 +1,33 @@
 from __future__ import annotations
-from typing import TypeVar, List, Tuple, Optional
+import asyncio
+import base64
+import bisect
+import gc
+import heapq
+import json
+import mmap
+import os
+import re
+import shutil
+import struct
+import sys
+import threading
+import time
+import weakref
+import zlib
+from array import array
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import islice, repeat
+from typing import TypeVar, List, Tuple, Optional, Callable, Iterable, Iterator
 
 T = TypeVar("T")  # represents generic type
 Node = TypeVar("Node")  # represents a Node object (forward-declare to use in Node __init__)
 DLL = TypeVar("DLL")
 
+# Size of the first batch of values DLL.extend reads from its source; later batches double.
+EXTEND_BATCH = 4096
+
+
 class Node:
     """
     Implementation of a doubly linked list node.
@@ -38,21 +61,243 @@ class Node:
     __str__ = __repr__
 
 
+class IndexedNode(Node):
+    """
+    Doubly linked list node that is also threaded onto the chain of Nodes holding an equal value.
+    Only created by a DLL constructed with `indexed=True`.
+    """
+    __slots__ = ["next_equal", "prev_equal"]
+
+    def __init__(self, value: T, next: Node = None, prev: Node = None) -> None:
+        """
+        Construct an indexed doubly linked list node.
+
+        :param value: value held by the Node.
+        :param next: reference to the next Node in the linked list.
+        :param prev: reference to the previous Node in the linked list.
+        :return: None.
+        """
+        super().__init__(value, next, prev)
+        # Neighbouring Nodes (in list order) holding the same value.
+        self.next_equal: Optional[IndexedNode] = None
+        self.prev_equal: Optional[IndexedNode] = None
+
+
+class Commit(Node):
+    """
+    Doubly linked list node holding one commit of a GitBranch.
+
+    Besides its place in the branch, every commit records its generation (number of ancestors)
+    and a single jump pointer to an ancestor. Jump lengths follow the skew-binary scheme of
+    Myers' "An applicative random-access stack", so any ancestor of a commit is reached in
+    O(log n) hops while each commit stores O(1) extra references.
+
+    Generations and jump pointers follow first parents. A merge commit also has merge parents, which
+    turn the history into a DAG; `level` then orders the commits of that DAG (every commit has a
+    higher level than all of its parents). It is None while a commit has no merge in its history,
+    in which case the history is the chain of first parents and the generation plays that role.
+    """
+    __slots__ = ["branch", "position", "generation", "jump", "merge_parents", "level"]
+
+    def __init__(self, value: T, next: Node = None, prev: Node = None,
+                 branch: GitBranch = None, position: int = 0, parent: Commit = None) -> None:
+        """
+        Construct a commit node.
+
+        :param value: commit message held by the Node.
+        :param next: reference to the next Node in the branch.
+        :param prev: reference to the previous Node in the branch.
+        :param branch: GitBranch the commit belongs to.
+        :param position: zero-based index of the commit within its branch.
+        :param parent: commit this one is based on, or None for the root commit.
+        :return: None.
+        """
+        super().__init__(value, next, prev)
+        self.branch = branch
+        self.position = position
+        self.merge_parents: Tuple[Commit, ...] = ()
+
+        if parent is None:
+            self.generation = 0
+            self.jump = self
+            self.level = None
+        else:
+            self.level = parent.level + 1 if parent.level is not None else None
+            self.generation = parent.generation + 1
+            jump = parent.jump
+            if parent.generation - jump.generation == jump.generation - jump.jump.generation:
+                self.jump = jump.jump
+            else:
+                self.jump = parent
+
+    def parent(self) -> Optional[Commit]:
+        """
+        Return the commit this one is based on: the previous commit of its branch or, for the
+        first commit of a branch, the commit the branch was created from.
+
+        :return: parent commit, or None for the root commit.
+        """
+        return self.prev if self.prev is not None else self.branch.parent_node
+
+    def parents(self) -> Tuple[Commit, ...]:
+        """
+        Return every parent of this commit: the first parent (see parent), then its merge parents.
+
+        :return: tuple of parent commits; empty for the root commit.
+        """
+        parent = self.parent()
+        if parent is None:
+            return self.merge_parents
+        return (parent,) + self.merge_parents
+
+    def order(self) -> int:
+        """
+        Return the rank of this commit in the DAG order: its level, or its generation if it has no
+        merge in its history. A commit ranks higher than every one of its ancestors.
+
+        :return: rank of the commit.
+        """
+        return self.level if self.level is not None else self.generation
+
+    def set_merge_parents(self, merge_parents: Tuple[Commit, ...]) -> None:
+        """
+        Turn this commit into a merge commit (or back into a plain one) and update its level. Its
+        descendants must not exist yet, as their levels derive from this one.
+
+        :param merge_parents: parents besides the first one, in order.
+        :return: None.
+        """
+        self.merge_parents = merge_parents
+        parent = self.parent()
+        if merge_parents:
+            self.level = max(node.order() for node in self.parents()) + 1
+        else:
+            self.level = parent.level + 1 if parent is not None and parent.level is not None else None
+
+    def child_branches(self) -> Iterator[GitBranch]:
+        """
+        Iterate the branches created from this commit. They form an intrusive list: children_branch
+        is the most recent one and every branch links to the previous one through `sibling`, so a
+        commit with any number of child branches holds a single reference.
+
+        :return: generator of branches, most recently created first.
+        """
+        branch = self.children_branch
+        while branch is not None:
+            yield branch
+            branch = branch.sibling
+
+    def add_branch(self, branch: GitBranch) -> None:
+        """
+        Record a branch created from this commit, in O(1).
+
+        :param branch: new branch whose parent_node is this commit.
+        :return: None.
+        """
+        newest = self.children_branch
+        branch.sibling = newest
+        branch.sibling_index = newest.sibling_index + 1 if newest is not None else 0
+        self.children_branch = branch
+
+    def ancestor(self, generation: int) -> Optional[Commit]:
+        """
+        Return the ancestor of this commit (or the commit itself) at a given generation in O(log n).
+
+        :param generation: generation of the wanted ancestor.
+        :return: ancestor commit, or None if `generation` is negative or larger than this commit's.
+        """
+        if generation < 0 or generation > self.generation:
+            return None
+        node = self
+        while node.generation > generation:
+            node = node.jump if node.jump.generation >= generation else node.parent()
+        return node
+
+
+class Cursor:
+    """
+    Resumable position in a chain of Nodes. Iterating a cursor yields values one at a time and
+    leaves the cursor on the first Node not yet yielded, so a traversal can be stopped and picked
+    up again later with O(1) extra memory.
+    """
+    __slots__ = ["node", "reverse"]
+
+    def __init__(self, node: Optional[Node], reverse: bool = False) -> None:
+        """
+        Construct a cursor.
+
+        :param node: Node the cursor is positioned at, or None if it is exhausted.
+        :param reverse: if True, the cursor follows `prev` references instead of `next`.
+        :return: None.
+        """
+        self.node = node
+        self.reverse = reverse
+
+    def __repr__(self) -> str:
+        """
+        Represent the Cursor as a string.
+
+        :return: string representation of the Cursor.
+        """
+        return f"Cursor({self.node})"
+
+    def __iter__(self) -> Iterator[T]:
+        """
+        Lazily yield values starting at the current Node, advancing the cursor as it goes.
+
+        :return: generator over the remaining values.
+        """
+        while self.node is not None:
+            node = self.node
+            self.node = node.prev if self.reverse else node.next
+            yield node.value
+
+    def exhausted(self) -> bool:
+        """
+        Return boolean indicating whether the cursor has moved past the end of its chain.
+
+        :return: True if there is no Node left to visit, else False.
+        """
+        return self.node is None
+
+    def advance(self) -> Optional[Node]:
+        """
+        Move the cursor one Node further.
+
+        :return: Node the cursor was positioned at before moving, or None if it was exhausted.
+        """
+        node = self.node
+        if node is not None:
+            self.node = node.prev if self.reverse else node.next
+        return node
+
+
 class DLL:
     """
     Implementation of a doubly linked list without padding nodes.
     Modify only below indicated line.
     """
-    __slots__ = ["head", "tail", "size"]
+    __slots__ = ["head", "tail", "size", "_index", "_lazy_reverse", "_reversed"]
 
-    def __init__(self) -> None:
+    def __init__(self, indexed: bool = False, lazy_reverse: bool = False) -> None:
         """
         Construct an empty doubly linked list.
 
+        :param indexed: if True, keep a value -> Nodes index so that find, find_all and remove
+            run in constant time instead of scanning from head. Values must then be hashable
+            and must not be mutated while they are in the DLL.
+        :param lazy_reverse: if True, reverse only flips the orientation of the DLL in constant time.
+            `head` and `tail` then keep pointing at the physical ends of the chain, and the list
+            reads from `tail` to `head` while it is reversed (see materialize).
         :return: None.
         """
         self.head = self.tail = None
         self.size = 0
+        # Maps each value to [first, last] of the chain of IndexedNodes holding it, in chain order.
+        self._index: Optional[dict] = {} if indexed else None
+        self._lazy_reverse = lazy_reverse
+        # True while the list reads from tail to head.
+        self._reversed = False
 
     def __repr__(self) -> str:
         """
@@ -61,10 +306,10 @@ class DLL:
         :return: string representation of the DLL.
         """
         result = []
-        node = self.head
+        node = self.tail if self._reversed else self.head
         while node is not None:
             result.append(str(node))
-            node = node.next
+            node = node.prev if self._reversed else node.next
         return " <-> ".join(result)
 
     def __str__(self) -> str:
@@ -86,6 +331,118 @@ class DLL:
         """
         return self.head is None
 
+    def _new_node(self, val: T) -> Node:
+        """
+        Create the Node that will hold `val` once it is linked into the DLL.
+
+        :param val: value to be held by the Node.
+        :return: unlinked Node containing `val`.
+        """
+        return Node(val) if self._index is None else IndexedNode(val)
+
+    def _index_link(self, node: IndexedNode, back: bool = True) -> None:
+        """
+        Add a freshly linked Node to the back (or front) of the chain for its value.
+
+        :param node: Node that was just added to the back (or front) of the DLL.
+        :param back: if True, the Node is now the last occurrence of its value; else the first.
+        :return: None.
+        """
+        chain = self._index.get(node.value)
+        if chain is None:
+            self._index[node.value] = [node, node]
+        elif back:
+            node.prev_equal = chain[1]
+            chain[1].next_equal = node
+            chain[1] = node
+        else:
+            node.next_equal = chain[0]
+            chain[0].prev_equal = node
+            chain[0] = node
+
+    def _index_unlink(self, node: IndexedNode) -> None:
+        """
+        Remove a Node that is being unlinked from the DLL from the chain for its value.
+
+        :param node: Node leaving the DLL.
+        :return: None.
+        """
+        chain = self._index[node.value]
+        if node.prev_equal is None:
+            chain[0] = node.next_equal
+        else:
+            node.prev_equal.next_equal = node.next_equal
+        if node.next_equal is None:
+            chain[1] = node.prev_equal
+        else:
+            node.next_equal.prev_equal = node.prev_equal
+
+        if chain[0] is None:
+            del self._index[node.value]
+        node.next_equal = node.prev_equal = None
+
+    def is_indexed(self) -> bool:
+        """
+        Return boolean indicating whether the DLL maintains a value index.
+
+        :return: True if the DLL was constructed with `indexed=True`, else False.
+        """
+        return self._index is not None
+
+    def __len__(self) -> int:
+        """
+        Return the number of values in the DLL.
+
+        :return: size of the DLL.
+        """
+        return self.size
+
+    def __iter__(self) -> Iterator[T]:
+        """
+        Lazily yield the values of the DLL from head to tail.
+
+        :return: generator over the values of the DLL.
+        """
+        return iter(self.cursor())
+
+    def __reversed__(self) -> Iterator[T]:
+        """
+        Lazily yield the values of the DLL from tail to head.
+
+        :return: generator over the values of the DLL in reverse order.
+        """
+        return iter(self.cursor(reverse=True))
+
+    def __contains__(self, val: T) -> bool:
+        """
+        Return boolean indicating whether `val` is in the DLL. Constant time if the DLL is indexed.
+
+        :param val: value to look for.
+        :return: True if a Node of the DLL contains `val`, else False.
+        """
+        return self._find_nodes(val, find_first=True) is not None
+
+    def cursor(self, node: Optional[Node] = None, reverse: bool = False) -> Cursor:
+        """
+        Create a cursor over the DLL.
+
+        :param node: Node to start from; defaults to the first (or last if `reverse`) Node of the list.
+        :param reverse: if True, the cursor moves from the back of the list towards the front.
+        :return: Cursor positioned at `node`.
+        """
+        reverse = reverse != self._reversed
+        if node is None:
+            node = self.tail if reverse else self.head
+        return Cursor(node, reverse)
+
+    def is_reversed(self) -> bool:
+        """
+        Return boolean indicating whether a lazy reversal is pending, i.e. the list reads from tail to head.
+
+        :return: True if the orientation of the DLL is flipped, else False.
+        """
+        return self._reversed
+
     def push(self, val: T, back: bool = True) -> None:
         """
         Create Node containing `val` and add to back (or front) of DLL. Increment size by one.
@@ -95,7 +452,18 @@ class DLL:
             if False, add to front (head-end).
         :return: None.
         """
-        new_node = Node(val)
+        self._link(self._new_node(val), back)
+
+    def _link(self, new_node: Node, back: bool = True) -> None:
+        """
+        Add a Node created by _new_node to back (or front) of DLL. Increment size by one, last.
+
+        :param new_node: unlinked Node.
+        :param back: if True, add the Node to back (tail-end) of DLL; if False, add to front (head-end).
+        :return: None.
+        """
+        if self._reversed:
+          back = not back
 
         if self.size == 0:
           self.head = new_node
@@ -111,6 +479,8 @@ class DLL:
           self.head.prev = new_node
           self.head = new_node
 
+        if self._index is not None:
+          self._index_link(new_node, back)
         self.size += 1
 
     def pop(self, back: bool = True) -> None:
@@ -124,7 +494,13 @@ class DLL:
         if self.size == 0:
           return
 
-        elif self.size == 1:
+        if self._reversed:
+          back = not back
+
+        if self._index is not None:
+          self._index_unlink(self.tail if back else self.head)
+
+        if self.size == 1:
           self.head = None
           self.tail = None
 
@@ -140,17 +516,87 @@ class DLL:
 
     def list_to_dll(self, source: List[T]) -> None:
         """
-        Construct DLL from a standard Python list.
+        Construct DLL from a standard Python list. The current chain is dropped as a whole
+        instead of being popped node by node.
+
+        :param source: standard Python list (or any iterable) from which to construct DLL.
+        :return: None.
+        """
+        self.head = self.tail = None
+        self.size = 0
+        self._reversed = False
+        if self._index is not None:
+          self._index = {}
+
+        self.extend(source)
+
+    def extend(self, source: Iterable[T], back: bool = True) -> None:
+        """
+        Add every value of `source` to back (or front) of DLL, as if each were pushed in turn.
+        Nodes are linked in a single pass, and `source` may be any iterable, including a
+        generator; it is read in batches that start at EXTEND_BATCH values and double each time,
+        so it is never materialized at once.
 
-        :param source: standard Python list from which to construct DLL.
+        :param source: iterable of values to be added to the DLL.
+        :param back: if True, append values to back (tail-end) of DLL in iteration order;
+            if False, add each value to front (head-end), which leaves them in reverse order.
         :return: None.
         """
+        new_node = self._new_node
+        index = self._index
+        values = iter(source)
+        if self._reversed:
+          back = not back
+
+        batch_size = EXTEND_BATCH
+        while True:
+          # `source` runs with the garbage collector in whatever state the caller left it.
+          batch = list(islice(values, batch_size))
+          batch_size *= 2
+          if not batch:
+            return
+          # Allocating many Nodes would otherwise trigger repeated cyclic garbage collections;
+          # only the linking below, which runs no caller code, pauses the collector. Doubling
+          # the batch keeps the collections between batches to a logarithmic number.
+          gc_enabled = gc.isenabled()
+          gc.disable()
+          try:
+            batch = iter(batch)
+            if self.size == 0:
+              node = new_node(next(batch))
+              self.head = self.tail = node
+              if index is not None:
+                self._index_link(node, back)
+              self.size = 1
+
+            # head, tail and size stay current on every step: subclasses such as GitBranch build
+            # each new Node from them.
+            for val in batch:
+              node = new_node(val)
+              if back:
+                node.prev = self.tail
+                self.tail.next = node
+                self.tail = node
+              else:
+                node.next = self.head
+                self.head.prev = node
+                self.head = node
+              if index is not None:
+                self._index_link(node, back)
+              self.size += 1
+          finally:
+            if gc_enabled:
+              gc.enable()
 
-        while not self.empty():
-          self.pop(back = True)
+    def extendleft(self, source: Iterable[T]) -> None:
+        """
+        Add every value of `source` to front of DLL, as if each were pushed to the front in turn.
+        The values therefore end up in reverse iteration order, like `collections.deque.extendleft`.
 
-        for i in source:
-          self.push(i, back = True)
+        :param source: iterable of values to be added to the DLL.
+        :return: None.
+        """
+        self.extend(source, back=False)
 
     def dll_to_list(self) -> List[T]:
         """
@@ -159,6 +605,14 @@ class DLL:
         :return: standard Python list containing values stored in DLL.
         """
         lis = []
+
+        if self._reversed:
+          item = self.tail
+          while item is not None:
+            lis.append(item.value)
+            item = item.prev
+          return lis
+
         item = self.head
 
         while item is not None:
@@ -177,7 +631,22 @@ class DLL:
         :return: A list of all the Nodes with value val.
         """
         lis_filtered = []
-        item = self.head
+
+        reverse = self._reversed
+
+        if self._index is not None:
+          chain = self._index.get(val)
+          if chain is None:
+            return None
+          item = chain[1] if reverse else chain[0]
+          if find_first:
+            return item
+          while item is not None:
+            lis_filtered.append(item)
+            item = item.prev_equal if reverse else item.next_equal
+          return lis_filtered
+
+        item = self.tail if reverse else self.head
 
         while item is not None:
           if item.value == val:
@@ -185,7 +654,7 @@ class DLL:
             if find_first:
               return lis_filtered[0]
 
-          item = item.next
+          item = item.prev if reverse else item.next
 
         return lis_filtered if lis_filtered != [] else None
 
@@ -207,7 +676,8 @@ class DLL:
         :return: Python list of all Node objects in DLL containing `val`.
             If `val` does not exist in DLL, return None.
         """
-        return self._find_nodes(val, find_first=False) if self._find_nodes(val, find_first=False) is not None else []
+        nodes = self._find_nodes(val, find_first=False)
+        return nodes if nodes is not None else []
 
     def _remove_node(self, to_remove: Node) -> None:
         """
@@ -239,6 +709,8 @@ class DLL:
           if to_remove.next is not None:
             to_remove.next.prev = to_remove.prev
 
+        if self._index is not None:
+          self._index_unlink(to_remove)
         self.size -= 1
 
     def remove(self, val: T) -> bool:
@@ -248,19 +720,12 @@ class DLL:
         :param val: value to be deleted from DLL.
         :return: True if Node containing `val` was deleted from DLL; else, False.
         """
-        if self.size == 0:
-          return
-
-        item = self.head
-
-        while item is not None:
-          if item.value == val:
-            self._remove_node(item)
-            return True
-
-          item = item.next
+        node = self._find_nodes(val, find_first=True)
+        if node is None:
+          return False
 
-        return False
+        self._remove_node(node)
+        return True
 
 
     def remove_all(self, val: T) -> int:
@@ -271,15 +736,67 @@ class DLL:
         :return: integer indicating the number of Nodes containing `val` deleted from DLL;
                  if no Node containing `val` exists in DLL, return 0.
         """
+        if self._index is not None:
+            # Only the chain of Nodes holding `val` has to be visited.
+            chain = self._index.get(val)
+            item = chain[0] if chain is not None else None
+            count = 0
+            while item is not None:
+                next_equal = item.next_equal
+                self._remove_node(item)
+                count += 1
+                item = next_equal
+            return count
+
+        return self.remove_if(lambda value: value == val)
+
+    def remove_if(self, fn: Callable[[T], bool]) -> int:
+        """
+        Delete every Node whose value satisfies `fn` in a single pass from front to back.
+        Must call _remove_node.
+
+        :param fn: predicate called once per value in the DLL, in list order.
+        :return: integer indicating the number of Nodes deleted from DLL.
+        """
         count = 0
-        while self.remove(val):
-            count+= 1
+        reverse = self._reversed
+        item = self.tail if reverse else self.head
+
+        while item is not None:
+            next_node = item.prev if reverse else item.next
+            if fn(item.value):
+                self._remove_node(item)
+                count += 1
+            item = next_node
+
         return count
 
     def reverse(self) -> None:
         """
         Reverse DLL in-place by modifying all `next` and `prev` references of Nodes in the
         DLL and resetting the `head` and `tail` references.
+        If the DLL was constructed with `lazy_reverse=True`, only flip its orientation in constant time instead.
+
+        :return: None.
+        """
+        if self._lazy_reverse:
+            self._reversed = not self._reversed
+        else:
+            self._reverse_links()
+
+    def materialize(self) -> None:
+        """
+        Apply a pending lazy reversal to the Nodes, so that the list reads from `head` to `tail` again.
+
+        :return: None.
+        """
+        if self._reversed:
+            self._reverse_links()
+            self._reversed = False
+
+    def _reverse_links(self) -> None:
+        """
+        Swap the `next` and `prev` references of every Node and swap `head` and `tail`.
 
         :return: None.
         """
@@ -291,233 +808,3585 @@ class DLL:
             next_node = current.next
             current.next = prev
             current.prev = next_node
+            if self._index is not None:
+                current.next_equal, current.prev_equal = current.prev_equal, current.next_equal
             prev = current
             current = next_node
 
+        if self._index is not None:
+            for chain in self._index.values():
+                chain.reverse()
+
         self.head = prev
 
 
 
-class GitBranch(DLL):
-    def __init__(self, name: str = "main", parent_node: Node = None):
-        self.name = name
-        self.parent_node = parent_node
-        super().__init__()
+class CompactDLL:
+    """
+    Implementation of a doubly linked list that stores values and links in parallel arrays
+    instead of one Node object per value. Positions are addressed by integer handles and
+    -1 marks a missing neighbour. Handles of removed values are recycled through a free-list.
+    """
+    __slots__ = ["head", "tail", "size", "_values", "_next", "_prev", "_free"]
 
-    def push_commit(self, value: T) -> Optional[Node]:
+    def __init__(self) -> None:
         """
-        Push a value in the Git timeline.
-        If the value is the first in the branch, assign previous node to be the parent node.
-        :param value: Value to be added to the branch.
-        :return: The new last node of the branch.
+        Construct an empty array-backed doubly linked list.
+
+        :return: None.
         """
-        if self.empty():
-            new_node = Node(value, prev=self.parent_node)
-            self.head = self.tail = new_node
-            if self.parent_node:
-                self.parent_node.next = new_node
-        else:
-            new_node = Node(value, prev=self.tail)
-            self.tail.next = new_node
-            self.tail = new_node
+        self.head = self.tail = -1
+        self.size = 0
+        self._values: List[T] = []
+        self._next = array("q")
+        self._prev = array("q")
+        # Handles of unlinked slots, reused before the arrays grow.
+        self._free: List[int] = []
 
-        self.size += 1
-        return self.tail
+    def __repr__(self) -> str:
+        """
+        Represent the CompactDLL as a string.
 
-    def get_first_commit(self) -> Node:
+        :return: string representation of the CompactDLL.
         """
-        Get first commit on the branch/timeline.
-        :return: The first commit node on the branch.
+        return " <-> ".join(f"Node({str(value)})" for value in self)
+
+    def __str__(self) -> str:
         """
-        return self.head
+        Represent the CompactDLL as a string.
 
-    def get_last_commit(self) -> Node:
+        :return: string representation of the CompactDLL.
         """
-        Get the last commit on the branch/timeline.
-        :return: The last commit node on the branch.
+        return repr(self)
+
+    def empty(self) -> bool:
         """
-        return self.tail
+        Return boolean indicating whether CompactDLL is empty.
 
+        :return: True if CompactDLL is empty, else False.
+        """
+        return self.head == -1
 
-class Git:
-    __slots__ = ["current_branch", "start", "selected_commit", "visited_branches"]
+    def __len__(self) -> int:
+        """
+        Return the number of values in the CompactDLL.
 
-    def __init__(self):
-        # Reference to the original/main branch.
-        self.start = GitBranch()
-        # Current working branch.
-        self.current_branch = self.start
-        # The currently selected commit of a branch, which might not be in the active working branch or the main branch,
-        # as we may be moving backwards or forward in the commit history
-        self.selected_commit: Node = None
-        # Keeps track of branches that have been visited on backwards movements.
-        self.visited_branches = set()
+        :return: size of the CompactDLL.
+        """
+        return self.size
 
-    def get_current_commit(self) -> Optional[str]:
+    def __iter__(self) -> Iterator[T]:
         """
-        Return the value stored in the currently selected commit.
-        :return: current working commit of tree.
+        Lazily yield the values of the CompactDLL from head to tail.
+
+        :return: generator over the values of the CompactDLL.
         """
-        if self.selected_commit is not None:
-            return self.selected_commit.value
-        return None
+        values, next_ = self._values, self._next
+        handle = self.head
+        while handle != -1:
+            yield values[handle]
+            handle = next_[handle]
 
-    def get_current_branch_name(self) -> Optional[str]:
+    def __reversed__(self) -> Iterator[T]:
         """
-        Return the name of the current working/active branch.
-        :return: Name of current working branch.
+        Lazily yield the values of the CompactDLL from tail to head.
+
+        :return: generator over the values of the CompactDLL in reverse order.
         """
-        return self.current_branch.name
+        values, prev = self._values, self._prev
+        handle = self.tail
+        while handle != -1:
+            yield values[handle]
+            handle = prev[handle]
 
-    def commit(self, message: str) -> None:
+    def __contains__(self, val: T) -> bool:
         """
-        Commit to the timeline if it is the last element in the commit.
-        If current working commit is not the last commit, raise exception.
-        :param message: Message to be added to commit.
+        Return boolean indicating whether `val` is in the CompactDLL.
+
+        :param val: value to look for.
+        :return: True if `val` is stored in the CompactDLL, else False.
         """
+        return self.find(val) is not None
 
-        if self.selected_commit is None:
-            self.current_branch.push(message)
-            self.selected_commit = self.current_branch.head
-        elif self.selected_commit.next is None:
-            self.current_branch.push(message)
-            self.selected_commit = self.selected_commit.next
+    def value(self, handle: int) -> T:
+        """
+        Return the value stored at a handle returned by find or find_all.
+
+        :param handle: handle of a linked slot.
+        :return: value stored in the slot.
+        """
+        return self._values[handle]
+
+    def _allocate(self, val: T) -> int:
+        """
+        Take a slot from the free-list, or grow the arrays by one, and store `val` in it.
+
+        :param val: value to be stored.
+        :return: handle of the slot.
+        """
+        if self._free:
+            handle = self._free.pop()
+            self._values[handle] = val
+            self._next[handle] = self._prev[handle] = -1
+        else:
+            handle = len(self._values)
+            self._values.append(val)
+            self._next.append(-1)
+            self._prev.append(-1)
+        return handle
+
+    def push(self, val: T, back: bool = True) -> None:
+        """
+        Store `val` and add it to back (or front) of CompactDLL. Increment size by one.
+
+        :param val: value to be added to the CompactDLL.
+        :param back: if True, add value to back (tail-end) of CompactDLL;
+            if False, add to front (head-end).
+        :return: None.
+        """
+        handle = self._allocate(val)
+
+        if self.size == 0:
+            self.head = self.tail = handle
+        elif back:
+            self._prev[handle] = self.tail
+            self._next[self.tail] = handle
+            self.tail = handle
+        else:
+            self._next[handle] = self.head
+            self._prev[self.head] = handle
+            self.head = handle
+
+        self.size += 1
+
+    def pop(self, back: bool = True) -> None:
+        """
+        Remove value from back (or front) of CompactDLL. Decrement size by 1. If CompactDLL is empty, do nothing.
+
+        :param back: if True, remove value from (tail-end) of CompactDLL;
+            if False, remove from front (head-end).
+        :return: None.
+        """
+        if self.size == 0:
+            return
+        self._remove_handle(self.tail if back else self.head)
+
+    def list_to_dll(self, source: List[T]) -> None:
+        """
+        Construct CompactDLL from a standard Python list, discarding the current contents.
+
+        :param source: standard Python list from which to construct CompactDLL.
+        :return: None.
+        """
+        values = list(source)
+        n = len(values)
+        self._values = values
+        self._next = array("q", range(1, n + 1))
+        self._prev = array("q", range(-1, n - 1))
+        self._free = []
+        self.size = n
+        if n == 0:
+            self.head = self.tail = -1
+        else:
+            self._next[n - 1] = -1
+            self.head, self.tail = 0, n - 1
+
+    def dll_to_list(self) -> List[T]:
+        """
+        Construct standard Python list from CompactDLL.
+
+        :return: standard Python list containing values stored in CompactDLL.
+        """
+        values, next_ = self._values, self._next
+        lis = []
+        handle = self.head
+        while handle != -1:
+            lis.append(values[handle])
+            handle = next_[handle]
+        return lis
+
+    def find(self, val: T) -> Optional[int]:
+        """
+        Find first instance of `val` in the CompactDLL.
+
+        :param val: value to be found in CompactDLL.
+        :return: handle of the first slot containing `val`, or None if `val` does not exist.
+        """
+        values, next_ = self._values, self._next
+        handle = self.head
+        while handle != -1:
+            if values[handle] == val:
+                return handle
+            handle = next_[handle]
+        return None
+
+    def find_all(self, val: T) -> List[int]:
+        """
+        Find all instances of `val` in the CompactDLL.
+
+        :param val: value to be searched for in CompactDLL.
+        :return: list of handles of slots containing `val`, in list order.
+        """
+        values, next_ = self._values, self._next
+        handles = []
+        handle = self.head
+        while handle != -1:
+            if values[handle] == val:
+                handles.append(handle)
+            handle = next_[handle]
+        return handles
+
+    def _remove_handle(self, handle: int) -> None:
+        """
+        Unlink a slot from the list and put it on the free-list.
+
+        :param handle: handle of a linked slot.
+        :return: None.
+        """
+        prev, next_ = self._prev[handle], self._next[handle]
+        if prev == -1:
+            self.head = next_
+        else:
+            self._next[prev] = next_
+        if next_ == -1:
+            self.tail = prev
+        else:
+            self._prev[next_] = prev
+
+        self._values[handle] = None
+        self._free.append(handle)
+        self.size -= 1
+
+    def remove(self, val: T) -> bool:
+        """
+        Delete first instance of `val` in the CompactDLL.
+
+        :param val: value to be deleted from CompactDLL.
+        :return: True if `val` was deleted from CompactDLL; else, False.
+        """
+        handle = self.find(val)
+        if handle is None:
+            return False
+        self._remove_handle(handle)
+        return True
+
+    def remove_all(self, val: T) -> int:
+        """
+        Delete all instances of `val` in the CompactDLL in a single pass.
+
+        :param val: value to be deleted from CompactDLL.
+        :return: integer indicating the number of values deleted from CompactDLL.
+        """
+        return self.remove_if(lambda value: value == val)
+
+    def remove_if(self, fn: Callable[[T], bool]) -> int:
+        """
+        Delete every value satisfying `fn` in a single pass from head to tail.
+
+        :param fn: predicate called once per value in the CompactDLL.
+        :return: integer indicating the number of values deleted from CompactDLL.
+        """
+        count = 0
+        handle = self.head
+        while handle != -1:
+            next_handle = self._next[handle]
+            if fn(self._values[handle]):
+                self._remove_handle(handle)
+                count += 1
+            handle = next_handle
+        return count
+
+    def reverse(self) -> None:
+        """
+        Reverse CompactDLL in-place. Every slot's next and prev links trade places, so swapping
+        the two link arrays (and head with tail) reverses the list in constant time.
+
+        :return: None.
+        """
+        self._next, self._prev = self._prev, self._next
+        self.head, self.tail = self.tail, self.head
+
+
+class GitBranch(DLL):
+    def __init__(self, name: str = "main", parent_node: Node = None):
+        self.name = name
+        self.parent_node = parent_node
+        # Branch created from the same commit just before this one, and the number of such branches.
+        self.sibling: Optional[GitBranch] = None
+        self.sibling_index = 0
+        # Position of the branch in the branches of its tree, in creation order (see Git.snapshot).
+        self.order = 0
+        # Version of the tree the branch was last committed to in, and its size before each earlier
+        # version it was committed to in, as (version, size) pairs (see Git.snapshot).
+        self.version = 0
+        self.sizes: List[Tuple[int, int]] = []
+        super().__init__()
+
+    def _new_node(self, val: T) -> Commit:
+        """
+        Create the commit node that will hold `val` once it is linked at the end of the branch.
+
+        :param val: commit message.
+        :return: unlinked commit node.
+        """
+        parent = self.tail if self.tail is not None else self.parent_node
+        return Commit(val, branch=self, position=self.size, parent=parent)
+
+    def push_commit(self, value: T) -> Optional[Node]:
+        """
+        Push a value in the Git timeline.
+        The first commit of a branch is linked to its parent node through Commit.parent, never
+        through `next`, as the parent node may have several child branches.
+        :param value: Value to be added to the branch.
+        :return: The new last node of the branch.
+        """
+        self.push(value)
+        return self.tail
+
+    def push_merge(self, value: T, merge_parents: Tuple[Commit, ...]) -> Commit:
+        """
+        Push a merge commit in the Git timeline. Its merge parents are set before it is linked, so
+        that whoever reads the branch up to its size (a compaction saving the tree from another
+        thread) never sees it as a plain commit.
+        :param value: Value to be added to the branch.
+        :param merge_parents: parents of the commit besides the last commit of the branch.
+        :return: The new last node of the branch.
+        """
+        node = self._new_node(value)
+        # Linked at the end of the branch, its first parent is the current tail.
+        node.prev = self.tail
+        node.set_merge_parents(merge_parents)
+        self._link(node)
+        return node
+
+    def get_first_commit(self) -> Node:
+        """
+        Get first commit on the branch/timeline.
+        :return: The first commit node on the branch.
+        """
+        return self.head
+
+    def get_last_commit(self) -> Node:
+        """
+        Get the last commit on the branch/timeline.
+        :return: The last commit node on the branch.
+        """
+        return self.tail
+
+
+class _CommitBitmap:
+    """
+    Set of commits holding one bit per commit, used by the walks over the history DAG to visit each
+    commit once. Bits are grouped by branch and indexed by position, so adding or testing a commit
+    is O(1) and a walk allocates one bit per commit of the branches it reaches, instead of one
+    hash table entry per commit it visits.
+    """
+    __slots__ = ["_bits"]
+
+    def __init__(self) -> None:
+        """
+        Construct an empty set.
+
+        :return: None.
+        """
+        self._bits: dict[GitBranch, bytearray] = {}
+
+    def __contains__(self, node: Commit) -> bool:
+        """
+        Check whether a commit is in the set.
+
+        :param node: commit to look for.
+        :return: True if `node` was added, else False.
+        """
+        bits = self._bits.get(node.branch)
+        byte = node.position >> 3
+        return bits is not None and byte < len(bits) and bits[byte] >> (node.position & 7) & 1 == 1
+
+    def add(self, node: Commit) -> bool:
+        """
+        Add a commit to the set.
+
+        :param node: commit to add.
+        :return: True if `node` was not in the set yet, else False.
+        """
+        byte = node.position >> 3
+        bits = self._bits.get(node.branch)
+        if bits is None:
+            bits = self._bits[node.branch] = bytearray((max(node.branch.size, node.position + 1) + 7) >> 3)
+        elif byte >= len(bits):
+            # The branch grew since the walk started.
+            bits.extend(bytes(byte + 1 - len(bits)))
+        mask = 1 << (node.position & 7)
+        if bits[byte] & mask:
+            return False
+        bits[byte] |= mask
+        return True
+
+
+class HistoryCursor:
+    """
+    Resumable walk over the history of a commit, created by Git.history. Iterating it yields the
+    commit and all its ancestors once each, newest first in the DAG order: a commit ranking higher
+    (see Commit.order) comes first, so every commit comes before its parents; commits of equal rank
+    come in the order they were reached. `token` turns the position of the cursor into a string
+    from which Git.history resumes the walk, in this or another process.
+
+    The cursor only holds the frontier of the walk: the commits reached but not yielded yet. A
+    commit ranks below all of its children, so by the time it is yielded every child has been
+    yielded and it can never be reached again; no visited set is needed. Memory (and token length)
+    is thus proportional to the number of lines of history running in parallel, not to the length
+    of the history. Once the frontier narrows down to a single commit without merges in its
+    history, the rest of the walk follows first parents directly.
+    """
+    __slots__ = ["_heap", "_queued", "_count", "_chain"]
+
+    def __init__(self, frontier: List[Tuple[Commit, int]], count: int) -> None:
+        """
+        Construct a cursor positioned on a frontier.
+
+        :param frontier: (commit, rank of discovery) pairs of the commits reached but not yielded.
+        :param count: number of commits discovered so far, to rank the next discoveries.
+        :return: None.
+        """
+        # Commit the walk continues from by following first parents, or None while using the heap.
+        self._chain: Optional[Commit] = None
+        self._heap: List[Tuple[int, int, Commit]] = []
+        self._queued: set = set()
+        self._count = count
+        if len(frontier) == 1 and frontier[0][0].level is None:
+            self._chain = frontier[0][0]
+        else:
+            self._heap = [(-node.order(), discovered, node) for node, discovered in frontier]
+            heapq.heapify(self._heap)
+            self._queued = {node for node, _ in frontier}
+
+    def __iter__(self) -> Iterator[Commit]:
+        """
+        :return: the cursor itself.
+        """
+        return self
+
+    def __next__(self) -> Commit:
+        """
+        Yield the next commit of the history and advance the cursor.
+
+        :return: commit node.
+        """
+        node = self._chain
+        if node is not None:
+            self._chain = node.parent()
+            return node
+
+        heap = self._heap
+        if not heap:
+            raise StopIteration
+        _, _, node = heapq.heappop(heap)
+        self._queued.discard(node)
+        if not heap and node.level is None:
+            self._chain = node.parent()
+            return node
+        for parent in node.parents():
+            if parent not in self._queued:
+                self._count += 1
+                self._queued.add(parent)
+                heapq.heappush(heap, (-parent.order(), self._count, parent))
+        return node
+
+    def token(self) -> Optional[str]:
+        """
+        Encode the position of the cursor: the commits of the frontier, by branch name and
+        position, and their ranks of discovery. Commits are never moved nor removed, so the token
+        stays valid while the tree grows, and across Git.save and Git.load.
+
+        :return: URL-safe page token, or None if the walk is over.
+        """
+        if self._chain is not None:
+            frontier = [(self._chain, 0)]
+        else:
+            frontier = [(node, discovered) for _, discovered, node in sorted(self._heap)]
+        if not frontier:
+            return None
+        data = [self._count, [[node.branch.name, node.position, discovered] for node, discovered in frontier]]
+        return base64.urlsafe_b64encode(json.dumps(data, separators=(",", ":")).encode()).decode()
+
+
+SNAPSHOT_MAGIC = b"GITSNAP2"
+# Snapshots written before merge commits existed: same layout, without merge count and merge table.
+SNAPSHOT_MAGIC_V1 = b"GITSNAP1"
+# magic, number of branches, number of commits, number of index slots, current branch, selected commit (or -1)
+_HEADER = struct.Struct("<8sQQQqq")
+# number of merge parents, following the header
+_MERGES = struct.Struct("<Q")
+# parent commit (or -1), first commit, number of commits, name offset, name length
+_BRANCH = struct.Struct("<qQQQQ")
+# message offset, message length
+_COMMIT = struct.Struct("<QQ")
+# commit holding the message find_commit would return (or -1 for an empty slot)
+_SLOT = struct.Struct("<q")
+# merge commit, one of its merge parents
+_MERGE = struct.Struct("<QQ")
+# Times Git.save reads the branch sizes again when commits made meanwhile left them inconsistent.
+SAVE_ATTEMPTS = 5
+
+
+def _materialized(name: str) -> property:
+    """
+    Build a property that materializes a _SnapshotBranch before reading one of its attributes.
+
+    :param name: attribute to read once the branch is materialized.
+    :return: read-only property.
+    """
+    def get(self: _SnapshotBranch):
+        self._snapshot.materialize(self._snapshot_id)
+        return getattr(self, name)
+    return property(get)
+
+
+class _SnapshotBranch(GitBranch):
+    """
+    GitBranch loaded from a snapshot whose commits have not been deserialized yet.
+    Reading any of its links turns it into a plain GitBranch holding Commit nodes.
+    """
+    head = _materialized("head")
+    tail = _materialized("tail")
+    size = _materialized("size")
+    parent_node = _materialized("parent_node")
+
+
+class _SnapshotCommitIndex(dict):
+    """
+    Commit message index of a Git loaded from a snapshot. Messages not looked up yet are
+    resolved through the hash table stored in the snapshot and cached.
+    """
+
+    def __init__(self, snapshot: _Snapshot) -> None:
+        """
+        Construct an index backed by a snapshot.
+
+        :param snapshot: snapshot holding the on-disk message index.
+        :return: None.
+        """
+        super().__init__()
+        self._snapshot = snapshot
+
+    def get(self, message: str, default=None) -> Optional[Tuple[GitBranch, Commit]]:
+        """
+        Return the (branch, commit) find_commit would return for `message`.
+
+        :param message: commit message.
+        :param default: value returned if no commit has the message.
+        :return: (branch, commit) tuple, or `default`.
+        """
+        found = dict.get(self, message)
+        if found is None:
+            node = self._snapshot.lookup(message)
+            if node is None:
+                return default
+            found = self[message] = (node.branch, node)
+        return found
+
+
+class _Snapshot:
+    """
+    Memory-mapped snapshot file written by Git.save. The branch table is read when the file is
+    opened; commits are only deserialized, one branch at a time, when something reaches them.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Map a snapshot file and create an unmaterialized branch for every branch it stores.
+
+        :param path: path of the snapshot file.
+        :return: None.
+        """
+        with open(path, "rb") as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic = self.buffer[:len(SNAPSHOT_MAGIC)]
+        if magic not in (SNAPSHOT_MAGIC, SNAPSHOT_MAGIC_V1):
+            raise Exception("File is not a Git snapshot")
+
+        _, branch_count, commit_count, self.slot_count, self.current, self.selected = \
+            _HEADER.unpack_from(self.buffer, 0)
+        if magic == SNAPSHOT_MAGIC:
+            (merge_count,) = _MERGES.unpack_from(self.buffer, _HEADER.size)
+            self.branch_offset = _HEADER.size + _MERGES.size
+        else:
+            merge_count = 0
+            self.branch_offset = _HEADER.size
+        self.commit_offset = self.branch_offset + branch_count * _BRANCH.size
+        self.slot_offset = self.commit_offset + commit_count * _COMMIT.size
+        merge_offset = self.slot_offset + self.slot_count * _SLOT.size
+        self.pool_offset = merge_offset + merge_count * _MERGE.size
+
+        self.parents: List[int] = []
+        self.firsts: List[int] = []
+        self.branches: List[GitBranch] = []
+        # Child branches of every branch, as (position of the commit they fork from, child branch id).
+        self.children: dict[int, List[Tuple[int, int]]] = {}
+        # (first commit, branch id) of every non-empty branch, sorted by first commit.
+        self.starts: List[Tuple[int, int]] = []
+        # Commit nodes of every materialized branch, and of the branches being materialized.
+        self.commits: dict[int, List[Commit]] = {}
+        self.building: dict[int, List[Commit]] = {}
+        # Merge commits of every branch, as (position, merge parent ids), by position.
+        self.merges: dict[int, List[Tuple[int, Tuple[int, ...]]]] = {}
+        # Number of merges of every branch being materialized whose parents are linked already.
+        self.settled: dict[int, int] = {}
+        self.lock = threading.RLock()
+
+        for branch_id in range(branch_count):
+            parent, first, size, name_offset, name_length = \
+                _BRANCH.unpack_from(self.buffer, self.branch_offset + branch_id * _BRANCH.size)
+            self.parents.append(parent)
+            self.firsts.append(first)
+            if size:
+                self.starts.append((first, branch_id))
+            if parent >= 0:
+                parent_branch = self.branch_of(parent)
+                self.children.setdefault(parent_branch, []).append((parent - self.firsts[parent_branch], branch_id))
+
+            branch = _SnapshotBranch.__new__(_SnapshotBranch)
+            branch.name = self.string(name_offset, name_length)
+            branch._index = None
+            branch._lazy_reverse = branch._reversed = False
+            branch.sibling, branch.sibling_index = None, 0
+            branch.order, branch.version, branch.sizes = branch_id, 0, []
+            branch._snapshot, branch._snapshot_id = self, branch_id
+            self.branches.append(branch)
+
+        for row in range(merge_count):
+            commit_id, parent = _MERGE.unpack_from(self.buffer, merge_offset + row * _MERGE.size)
+            branch_id = self.branch_of(commit_id)
+            merges = self.merges.setdefault(branch_id, [])
+            position = commit_id - self.firsts[branch_id]
+            if merges and merges[-1][0] == position:
+                merges[-1] = (position, merges[-1][1] + (parent,))
+            else:
+                merges.append((position, (parent,)))
+
+    def close(self) -> None:
+        """
+        Unmap the snapshot file. Commits not deserialized yet can no longer be reached.
+
+        :return: None.
+        """
+        with self.lock:
+            self.buffer.close()
+
+    def string(self, offset: int, length: int) -> str:
+        """
+        Read a string from the string pool.
+
+        :param offset: offset of the string within the pool.
+        :param length: length of the UTF-8 encoded string.
+        :return: decoded string.
+        """
+        start = self.pool_offset + offset
+        return self.buffer[start:start + length].decode()
+
+    def message(self, commit_id: int) -> str:
+        """
+        Read the message of a commit without materializing it.
+
+        :param commit_id: id of the commit.
+        :return: commit message.
+        """
+        return self.string(*_COMMIT.unpack_from(self.buffer, self.commit_offset + commit_id * _COMMIT.size))
+
+    def branch_of(self, commit_id: int) -> int:
+        """
+        Find the branch a commit belongs to.
+
+        :param commit_id: id of the commit.
+        :return: id of its branch.
+        """
+        return self.starts[bisect.bisect_right(self.starts, (commit_id, len(self.firsts))) - 1][1]
+
+    def commit(self, commit_id: int) -> Commit:
+        """
+        Return the node of a commit, materializing its branch if needed.
+
+        :param commit_id: id of the commit.
+        :return: commit node, whose merge parents (and those of its ancestors) are linked.
+        """
+        branch_id = self.branch_of(commit_id)
+        position = commit_id - self.firsts[branch_id]
+        nodes = self.commits.get(branch_id)
+        if nodes is not None:
+            return nodes[position]
+        with self.lock:
+            self._require(branch_id, position)
+            return self.commits.get(branch_id, self.building.get(branch_id))[position]
+
+    def materialize(self, branch_id: int) -> List[Commit]:
+        """
+        Deserialize the commits of a branch, and of every not yet materialized branch it is based on
+        or merges.
+
+        :param branch_id: id of the branch.
+        :return: commit nodes of the branch, in order.
+        """
+        nodes = self.commits.get(branch_id)
+        if nodes is not None:
+            return nodes
+
+        # Journal compaction may save the tree from another thread while this one is navigating it.
+        with self.lock:
+            self._require(branch_id, None)
+            return self.commits[branch_id]
+
+    def _ready(self, branch_id: int, position: Optional[int]) -> bool:
+        """
+        Tell whether the commits of a branch exist and have their merge parents linked, up to a position.
+
+        :param branch_id: id of the branch.
+        :param position: position of the last commit needed, or None for the whole branch.
+        :return: True if nothing is left to do for these commits.
+        """
+        if branch_id in self.commits:
+            return True
+        if branch_id not in self.building or position is None:
+            return False
+        merges = self.merges.get(branch_id, ())
+        settled = self.settled[branch_id]
+        return settled == len(merges) or merges[settled][0] > position
+
+    def _require(self, branch_id: int, position: Optional[int]) -> None:
+        """
+        Materialize the commits of a branch up to a position, with a work stack rather than
+        recursion, since a commit may depend on a long chain of branches through its first parent
+        and merge parents.
+
+        A branch is built once its parent commit is ready; the merge parents of its commits are then
+        linked in order, each one once that parent is ready. Merge parents are older than their
+        merge commit, so whatever a step waits for only ever depends on older commits, even when two
+        branches merge each other back and forth, and the work always ends. Every branch built is
+        settled completely before this returns.
+
+        :param branch_id: id of the branch.
+        :param position: position of the last commit needed, or None for the whole branch.
+        :return: None.
+        """
+        stack = [(branch_id, position)]
+        while stack:
+            branch_id, position = stack[-1]
+            if self._ready(branch_id, position):
+                stack.pop()
+                continue
+            if branch_id not in self.building:
+                parent = self.parents[branch_id]
+                if parent >= 0:
+                    parent_branch = self.branch_of(parent)
+                    if not self._ready(parent_branch, parent - self.firsts[parent_branch]):
+                        stack.append((parent_branch, parent - self.firsts[parent_branch]))
+                        continue
+                self._build(branch_id)
+                # Nothing depends on the commits a branch has past `position` yet: settle them all.
+                stack[-1] = (branch_id, None)
+            waiting = self._settle(branch_id)
+            if waiting is not None:
+                stack.append(waiting)
+
+    def _build(self, branch_id: int) -> None:
+        """
+        Deserialize the commits of an unmaterialized branch, whose merge parents are not linked yet.
+        Its parent commit must be ready. The commits are built on a stand-in GitBranch; the branch
+        itself stays unmaterialized until _settle hands them over.
+
+        :param branch_id: id of the branch.
+        :return: None.
+        """
+        _, first, size, _, _ = _BRANCH.unpack_from(self.buffer, self.branch_offset + branch_id * _BRANCH.size)
+        parent = self.parents[branch_id]
+        parent_node = self.commit(parent) if parent >= 0 else None
+
+        branch = GitBranch(self.branches[branch_id].name, parent_node)
+        branch.extend(self.message(commit_id) for commit_id in range(first, first + size))
+
+        nodes = []
+        node = branch.head
+        while node is not None:
+            nodes.append(node)
+            node = node.next
+        # Children are stored in creation order, which add_branch expects.
+        for position, child in self.children.get(branch_id, ()):
+            nodes[position].add_branch(self.branches[child])
+        self.building[branch_id] = nodes
+        self.settled[branch_id] = 0
+
+    def _settle(self, branch_id: int) -> Optional[Tuple[int, Optional[int]]]:
+        """
+        Link the merge parents of the commits of a branch being materialized, in order, and fix the
+        levels of the commits that follow each merge, until a merge parent is not ready. A branch
+        whose merges are all linked is done.
+
+        :param branch_id: id of the branch.
+        :return: (branch id, position) of the merge parent to make ready first, or None.
+        """
+        nodes = self.building[branch_id]
+        merges = self.merges.get(branch_id, ())
+        while self.settled[branch_id] < len(merges):
+            index = self.settled[branch_id]
+            merge, parents = merges[index]
+            for parent in parents:
+                parent_branch = self.branch_of(parent)
+                if not self._ready(parent_branch, parent - self.firsts[parent_branch]):
+                    return parent_branch, parent - self.firsts[parent_branch]
+            nodes[merge].set_merge_parents(tuple(self.commit(parent) for parent in parents))
+            end = merges[index + 1][0] if index + 1 < len(merges) else len(nodes)
+            for node in nodes[merge + 1:end]:
+                node.level = node.prev.level + 1
+            self.settled[branch_id] = index + 1
+
+        # Other threads read the links of a materialized branch without the lock (a compaction
+        # saving the tree, for one): the branch only becomes a GitBranch once they are complete,
+        # so they are written through the DLL slots its properties still hide until then.
+        branch = self.branches[branch_id]
+        parent = self.parents[branch_id]
+        branch.__dict__["parent_node"] = self.commit(parent) if parent >= 0 else None
+        for node in nodes:
+            node.branch = branch
+        DLL.head.__set__(branch, nodes[0] if nodes else None)
+        DLL.tail.__set__(branch, nodes[-1] if nodes else None)
+        DLL.size.__set__(branch, len(nodes))
+        branch.__class__ = GitBranch
+        del branch._snapshot, branch._snapshot_id
+        self.commits[branch_id] = nodes
+        del self.building[branch_id], self.settled[branch_id]
+        return None
+
+    def lookup(self, message: str) -> Optional[Commit]:
+        """
+        Find the commit find_commit would return for `message` through the stored hash table.
+
+        :param message: commit message.
+        :return: commit node, or None if no stored commit has the message.
+        """
+        if self.slot_count == 0 or not isinstance(message, str):
+            return None
+        data = message.encode()
+        mask = self.slot_count - 1
+        slot = zlib.crc32(data) & mask
+        while True:
+            (commit_id,) = _SLOT.unpack_from(self.buffer, self.slot_offset + slot * _SLOT.size)
+            if commit_id < 0:
+                return None
+            if self.message(commit_id) == message:
+                return self.commit(commit_id)
+            slot = (slot + 1) & mask
+
+
+class Journal:
+    """
+    Append-only write-ahead log of the commits and branches created on a Git object.
+
+    Every record is framed by its payload length and the CRC-32 of its payload, so a record torn
+    by a crash is detected and ignored on replay. Records describe the effect of an operation
+    (the branch and position a commit was appended at, the commit a branch was created from)
+    rather than the call itself, which makes replaying a record that is already part of the
+    tree a no-op. Records are written and fsynced in groups of `group_size`; a crash can lose at
+    most the last `group_size - 1` records.
+    """
+    __slots__ = ["path", "group_size", "_file", "_buffer", "_pending"]
+
+    _FRAME = struct.Struct("<II")
+    _RECORD = struct.Struct("<cQ")
+    _STRING = struct.Struct("<I")
+    _POSITION = struct.Struct("<Q")
+    COMMIT = b"C"
+    BRANCH = b"B"
+    MERGE = b"M"
+
+    def __init__(self, path: str, group_size: int = 1) -> None:
+        """
+        Open a journal file for appending, creating it if needed.
+
+        :param path: path of the journal file.
+        :param group_size: number of records written and fsynced together.
+        :return: None.
+        """
+        if group_size < 1:
+            raise Exception("Group size must be at least 1")
+        self.path = path
+        self.group_size = group_size
+        self._file = open(path, "ab")
+        self._buffer = bytearray()
+        self._pending = 0
+
+    def record_commit(self, branch: str, position: int, message: str) -> None:
+        """
+        Append a record for a commit added at the end of a branch.
+
+        :param branch: name of the branch.
+        :param position: position of the new commit within the branch.
+        :param message: commit message.
+        :return: None.
+        """
+        self._append(self.COMMIT, position, branch, message)
+
+    def record_branch(self, name: str, parent: str, position: int) -> None:
+        """
+        Append a record for a branch created from a commit.
+
+        :param name: name of the new branch.
+        :param parent: name of the branch holding the commit it was created from.
+        :param position: position of that commit within its branch.
+        :return: None.
+        """
+        self._append(self.BRANCH, position, name, parent)
+
+    def record_merge(self, branch: str, position: int, message: str, source: str, source_position: int) -> None:
+        """
+        Append a record for a merge commit added at the end of a branch.
+
+        :param branch: name of the branch.
+        :param position: position of the new commit within the branch.
+        :param message: commit message.
+        :param source: name of the branch holding the merged commit.
+        :param source_position: position of the merged commit within its branch.
+        :return: None.
+        """
+        self._append(self.MERGE, position, branch, message, source, suffix=self._POSITION.pack(source_position))
+
+    def _append(self, kind: bytes, position: int, *strings: str, suffix: bytes = b"") -> None:
+        """
+        Frame a record into the write buffer, and write the buffer out once a group is complete.
+
+        :param kind: record type.
+        :param position: position stored in the record.
+        :param strings: strings stored in the record.
+        :param suffix: packed fields stored after the strings.
+        :return: None.
+        """
+        payload = bytearray(self._RECORD.pack(kind, position))
+        for string in strings:
+            data = string.encode()
+            payload += self._STRING.pack(len(data))
+            payload += data
+        payload += suffix
+        self._buffer += self._FRAME.pack(len(payload), zlib.crc32(payload))
+        self._buffer += payload
+        self._pending += 1
+        if self._pending >= self.group_size:
+            self.sync()
+
+    def sync(self) -> None:
+        """
+        Write all buffered records and fsync the journal file.
+
+        :return: None.
+        """
+        if self.flush():
+            self.fsync()
+
+    def flush(self) -> bool:
+        """
+        Hand all buffered records to the operating system, without waiting for the disk.
+
+        :return: True if records were written, which then need an fsync to be durable.
+        """
+        self._pending = 0
+        if not self._buffer:
+            return False
+        self._file.write(self._buffer)
+        self._file.flush()
+        self._buffer.clear()
+        return True
+
+    def fsync(self) -> None:
+        """
+        Wait until the records written by flush are on disk. Safe to call from another thread
+        while records keep being appended.
+
+        :return: None.
+        """
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        """
+        Sync buffered records and close the journal file.
+
+        :return: None.
+        """
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    @classmethod
+    def records(cls, path: str) -> Iterator[tuple]:
+        """
+        Read the intact records of a journal file, stopping at the first torn or corrupt one.
+
+        :param path: path of the journal file.
+        :return: generator of (kind, position, first string, second string) tuples; merge records
+            are (kind, position, branch, message, source branch, source position) tuples.
+        """
+        with open(path, "rb") as file:
+            data = file.read()
+
+        offset = 0
+        while offset + cls._FRAME.size <= len(data):
+            length, checksum = cls._FRAME.unpack_from(data, offset)
+            start = offset + cls._FRAME.size
+            payload = data[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                return
+            kind, position = cls._RECORD.unpack_from(payload, 0)
+            strings = []
+            cursor = cls._RECORD.size
+            for _ in range(3 if kind == cls.MERGE else 2):
+                (size,) = cls._STRING.unpack_from(payload, cursor)
+                cursor += cls._STRING.size
+                strings.append(payload[cursor:cursor + size].decode())
+                cursor += size
+            if kind == cls.MERGE:
+                strings.append(cls._POSITION.unpack_from(payload, cursor)[0])
+            yield (kind, position, *strings)
+            offset = start + length
+
+
+class _SharedState:
+    """
+    Resources of a tree shared by a Git object, its worktrees and its snapshot views: the journal
+    and the compaction folding it, so that opening, closing or rotating the journal through any of
+    them applies to every one, the process pool searches run on, and the version of the tree.
+    """
+    __slots__ = ["journal", "compaction", "compaction_error", "pool", "pool_size", "lock", "version", "views"]
+
+    def __init__(self) -> None:
+        """
+        Construct a state with no journal open and no pool started.
+
+        :return: None.
+        """
+        # Write-ahead journal recording commits and branch creations, if one is open.
+        self.journal: Optional[Journal] = None
+        # Thread folding the journal into a snapshot, if a compaction was started.
+        self.compaction: Optional[threading.Thread] = None
+        # Error of the last background compaction, until it is raised by Git.sync or Git.compact.
+        self.compaction_error: Optional[Exception] = None
+        # Worker processes of Git.search, started by the first search that needs them.
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.pool_size = 0
+        # Guards the creation of the pool by searches running concurrently.
+        self.lock = threading.Lock()
+        # Number of snapshot views taken of the tree, and the ones still alive (see Git.snapshot).
+        self.version = 0
+        self.views: weakref.WeakSet[GitSnapshot] = weakref.WeakSet()
+
+    def search_pool(self, processes: int) -> ProcessPoolExecutor:
+        """
+        Return the pool of `processes` workers, starting it (or replacing one of another size) if needed.
+
+        :param processes: number of worker processes.
+        :return: process pool.
+        """
+        with self.lock:
+            if self.pool is None or self.pool_size != processes:
+                if self.pool is not None:
+                    self.pool.shutdown()
+                self.pool = ProcessPoolExecutor(processes)
+                self.pool_size = processes
+            return self.pool
+
+    def close_pool(self) -> None:
+        """
+        Shut the search pool down, if one was started.
+
+        :return: None.
+        """
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
+
+    def record_size(self, branch: GitBranch) -> None:
+        """
+        Prepare a branch to be committed to: the first time it is in a version of the tree, record
+        the size it had, which the views taken since it was last committed to see (see Git.snapshot).
+        The sizes are dropped instead when no view is alive.
+
+        :param branch: branch about to get new commits.
+        :return: None.
+        """
+        if branch.version != self.version:
+            if self.views:
+                branch.sizes.append((branch.version, branch.size))
+            else:
+                branch.sizes.clear()
+            branch.version = self.version
+
+
+class CompressedMessage(bytes):
+    """
+    zlib-compressed UTF-8 commit message stored in Node.value by a MessagePool. Compression is
+    deterministic, so equal messages compress to equal (and equally hashed) values.
+    """
+    __slots__ = []
+
+
+class MessagePool:
+    """
+    Deduplicates the commit messages of a Git object so every distinct message is stored once,
+    however many commits carry it. Messages at least `compress_threshold` characters long are
+    stored zlib-compressed as CompressedMessage values; MessagePool.text turns a stored value
+    back into the message.
+    """
+    __slots__ = ["compress_threshold", "_values", "commits", "raw_bytes", "stored_bytes"]
+
+    def __init__(self, compress_threshold: Optional[int] = None) -> None:
+        """
+        Construct an empty message pool.
+
+        :param compress_threshold: minimum length of the messages to compress, or None to never
+            compress.
+        :return: None.
+        """
+        if compress_threshold is not None and compress_threshold < 1:
+            raise Exception("Compression threshold must be at least 1")
+        self.compress_threshold = compress_threshold
+        # Maps every stored value to itself, so equal values resolve to a single object.
+        self._values: dict = {}
+        # Number of messages stored, and the bytes they would take if every commit kept its own.
+        self.commits = 0
+        self.raw_bytes = 0
+        # Bytes taken by the distinct stored values.
+        self.stored_bytes = 0
+
+    def key(self, message: T) -> T | CompressedMessage:
+        """
+        Return the value `message` is stored as, without storing it. Used to look messages up.
+
+        :param message: commit message.
+        :return: the message itself, or its compressed form.
+        """
+        if (self.compress_threshold is not None and isinstance(message, str)
+                and len(message) >= self.compress_threshold):
+            return CompressedMessage(zlib.compress(message.encode()))
+        return message
+
+    def store(self, message: T) -> T | CompressedMessage:
+        """
+        Store a message, returning the shared object to keep in the commit node.
+
+        :param message: commit message.
+        :return: the pooled value equal to key(message).
+        """
+        value = self.key(message)
+        pooled = self._values.setdefault(value, value)
+        if pooled is value:
+            self.stored_bytes += sys.getsizeof(value)
+        self.commits += 1
+        self.raw_bytes += sys.getsizeof(message)
+        return pooled
+
+    @staticmethod
+    def text(value: T | CompressedMessage) -> T | str:
+        """
+        Return the message a stored value stands for.
+
+        :param value: value returned by store or key.
+        :return: the original message.
+        """
+        if isinstance(value, CompressedMessage):
+            return zlib.decompress(value).decode()
+        return value
+
+    def __len__(self) -> int:
+        """
+        Count the distinct values stored in the pool.
+
+        :return: number of distinct stored values.
+        """
+        return len(self._values)
+
+    def report(self) -> dict:
+        """
+        Summarize the memory taken by the pooled messages, compared to every commit holding its
+        own copy of its message (as it does when messages are read from a file or a network).
+        Sizes are the sys.getsizeof of the message objects.
+
+        :return: dict with the number of commits and distinct messages, the bytes without and
+            with the pool, and the bytes saved.
+        """
+        return {
+            "commits": self.commits,
+            "distinct": len(self._values),
+            "raw_bytes": self.raw_bytes,
+            "stored_bytes": self.stored_bytes,
+            "saved_bytes": self.raw_bytes - self.stored_bytes,
+        }
+
+
+class TextIndex:
+    """
+    Inverted index from the words of commit messages to the commits containing them, kept up to date
+    by the Git object it is given to. Words are runs of letters, digits and underscores, compared
+    case-insensitively. Every commit gets a sequence number in the order it was added to the
+    history, and each posting list is an array of sequence numbers, so it is sorted by
+    construction and answers queries by merging and bisecting.
+    """
+    __slots__ = ["_commits", "_postings", "_tokens", "_sorted"]
+
+    WORD = re.compile(r"\w+")
+
+    def __init__(self) -> None:
+        """
+        Construct an empty index.
+
+        :return: None.
+        """
+        # Commits by sequence number.
+        self._commits: List[Commit] = []
+        # Maps each word to the sequence numbers of the commits containing it.
+        self._postings: dict[str, array] = {}
+        # Every indexed word, to find the words starting with a prefix. New words are appended, and
+        # the list is sorted again by the first prefix query that follows.
+        self._tokens: List[str] = []
+        self._sorted = True
+
+    def __len__(self) -> int:
+        """
+        Count the distinct words indexed.
+
+        :return: number of distinct words.
+        """
+        return len(self._postings)
+
+    def add(self, node: Commit, message: str) -> None:
+        """
+        Index a commit that was just added to the history.
+
+        :param node: the new commit.
+        :param message: its message.
+        :return: None.
+        """
+        sequence = len(self._commits)
+        self._commits.append(node)
+        for word in set(self.WORD.findall(message.casefold())):
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = array("q")
+                self._tokens.append(word)
+                self._sorted = False
+            postings.append(sequence)
+
+    def _matches(self, term: str) -> array | List[int]:
+        """
+        Return the sorted sequence numbers of the commits matching one query term.
+
+        :param term: a word, or a prefix followed by "*".
+        :return: sorted sequence numbers, without duplicates.
+        """
+        if not term.endswith("*"):
+            return self._postings.get(term, ())
+        prefix = term[:-1]
+        if not self._sorted:
+            # Only the words added since the last sort are out of order; timsort merges them in.
+            self._tokens.sort()
+            self._sorted = True
+        first = bisect.bisect_left(self._tokens, prefix)
+        last = bisect.bisect_left(self._tokens, prefix + "\U0010ffff", first)
+        lists = [self._postings[word] for word in self._tokens[first:last]]
+        if len(lists) == 1:
+            return lists[0]
+        # A commit containing several of the words appears in several lists.
+        merged = []
+        for sequence in heapq.merge(*lists):
+            if not merged or merged[-1] != sequence:
+                merged.append(sequence)
+        return merged
+
+    def query(self, query: str) -> List[Commit]:
+        """
+        Find the commits matching a query: words separated by spaces must all appear (AND), groups
+        separated by the keyword OR are alternatives, and a word ending with "*" matches every word
+        with that prefix. E.g. "fix pars* OR lexer". Words are matched case-insensitively.
+
+        The work is proportional to the posting lists of the query words, not to the tree size.
+
+        :param query: query string.
+        :return: matching commits, in the order they were added to the history.
+        """
+        groups = [[]]
+        for term in query.split():
+            if term == "OR":
+                groups.append([])
+            else:
+                groups[-1].append(term.casefold())
+        if not all(groups):
+            raise Exception("Invalid query")
+
+        results = []
+        for group in groups:
+            lists = sorted((self._matches(term) for term in group), key=len)
+            # Check the candidates of the shortest list against the others.
+            candidates = lists[0]
+            for other in lists[1:]:
+                if not candidates:
+                    break
+                kept = []
+                for sequence in candidates:
+                    at = bisect.bisect_left(other, sequence)
+                    if at < len(other) and other[at] == sequence:
+                        kept.append(sequence)
+                candidates = kept
+            results.append(candidates)
+
+        sequences = results[0] if len(results) == 1 else sorted(set().union(*results))
+        return [self._commits[sequence] for sequence in sequences]
+
+
+class RWLock:
+    """
+    Readers-writer lock: any number of readers, or a single writer. Once a writer waits, new readers
+    wait too, so a steady stream of readers cannot starve writers. Not reentrant.
+    """
+    __slots__ = ["_condition", "_readers", "_writer", "_waiting_writers"]
+
+    def __init__(self) -> None:
+        """
+        Construct an unlocked readers-writer lock.
+
+        :return: None.
+        """
+        self._condition = threading.Condition(threading.Lock())
+        # Number of threads holding the lock for reading.
+        self._readers = 0
+        # True while a thread holds the lock for writing.
+        self._writer = False
+        # Number of threads waiting to write.
+        self._waiting_writers = 0
+
+    def acquire_read(self) -> None:
+        """
+        Block until no writer holds or waits for the lock, then hold it for reading.
+
+        :return: None.
+        """
+        with self._condition:
+            while self._writer or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+
+    def release_read(self) -> None:
+        """
+        Release a read hold.
+
+        :return: None.
+        """
+        with self._condition:
+            self._readers -= 1
+            if not self._readers:
+                self._condition.notify_all()
+
+    def acquire_write(self) -> None:
+        """
+        Block until no thread holds the lock, then hold it for writing.
+
+        :return: None.
+        """
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+
+    def release_write(self) -> None:
+        """
+        Release the write hold.
+
+        :return: None.
+        """
+        with self._condition:
+            self._writer = False
+            self._condition.notify_all()
+
+
+class Hook:
+    """
+    Instrumentation hook receiving the traced operations of the Git objects it is installed on
+    (see Git.add_hook). Subclasses override before and/or after.
+    """
+    __slots__ = []
+
+    def before(self, operation: str) -> None:
+        """
+        Called when a traced operation starts.
+
+        :param operation: name of the Git method, e.g. "checkout_commit".
+        :return: None.
+        """
+
+    def after(self, operation: str, visited: int, elapsed_ns: int) -> None:
+        """
+        Called when a traced operation returns or raises.
+
+        :param operation: name of the Git method.
+        :param visited: commit nodes the operation traversed: every node scanned for find_branch and
+            find_commit, 1 for the constant-time operations.
+        :param elapsed_ns: wall-clock duration of the operation, excluding the hooks themselves.
+        :return: None.
+        """
+
+
+class LatencyStats(Hook):
+    """
+    Hook aggregating the latency and traversal counts of every traced operation. All samples are
+    kept, so install it for a bounded measurement window.
+    """
+    __slots__ = ["_samples"]
+
+    def __init__(self) -> None:
+        """
+        Construct an aggregator with no samples.
+
+        :return: None.
+        """
+        # Maps each operation name to its (elapsed ns, visited) sample lists.
+        self._samples: dict[str, Tuple[List[int], List[int]]] = {}
+
+    def after(self, operation: str, visited: int, elapsed_ns: int) -> None:
+        """
+        Record the latency and traversal count of an operation that just returned or raised.
+
+        :param operation: name of the Git method.
+        :param visited: commit nodes the operation traversed.
+        :param elapsed_ns: wall-clock duration of the operation.
+        :return: None.
+        """
+        samples = self._samples.get(operation)
+        if samples is None:
+            samples = self._samples[operation] = ([], [])
+        samples[0].append(elapsed_ns)
+        samples[1].append(visited)
+
+    @staticmethod
+    def _percentile(values: List[int], percent: int) -> int:
+        """
+        Nearest-rank percentile of sorted, non-empty values.
+
+        :param values: sorted samples.
+        :param percent: percentile between 1 and 100.
+        :return: sample at that rank.
+        """
+        return values[(len(values) * percent + 99) // 100 - 1]
+
+    def report(self) -> dict[str, dict[str, int]]:
+        """
+        Summarize the samples of every operation seen so far.
+
+        :return: dict mapping each operation to its count, p50/p99/max elapsed ns, p50/p99 visited
+            nodes and total visited nodes.
+        """
+        summary = {}
+        for operation, (elapsed, visited) in self._samples.items():
+            elapsed, visited = sorted(elapsed), sorted(visited)
+            summary[operation] = {
+                "count": len(elapsed),
+                "p50_ns": self._percentile(elapsed, 50),
+                "p99_ns": self._percentile(elapsed, 99),
+                "max_ns": elapsed[-1],
+                "visited_p50": self._percentile(visited, 50),
+                "visited_p99": self._percentile(visited, 99),
+                "visited_total": sum(visited),
+            }
+        return summary
+
+
+def _search_piece(matcher: str | Callable[[str], object], messages: List[str]) -> List[int]:
+    """
+    Scan one piece of a Git.search: return the indexes of the messages that match.
+
+    :param matcher: regular expression searched in every message, or predicate called on it.
+    :param messages: commit messages, in depth-first order.
+    :return: indexes of the matching messages within `messages`.
+    """
+    match = re.compile(matcher).search if isinstance(matcher, str) else matcher
+    return [index for index, message in enumerate(messages) if match(message)]
+
+
+class Git:
+    __slots__ = ["current_branch", "start", "selected_commit", "visited_branches", "_commit_index",
+                 "_branches", "_shared", "message_pool", "_hooks", "_visited", "text_index"]
+
+    def __init__(self, message_pool: Optional[MessagePool] = None, text_index: Optional[TextIndex] = None):
+        """
+        Construct a Git object holding an empty main branch.
+
+        :param message_pool: pool deduplicating (and possibly compressing) the commit messages, or
+            None to store every message as given.
+        :param text_index: full-text index to maintain for grep, or None. It must be empty.
+        :return: None.
+        """
+        # Reference to the original/main branch.
+        self.start = GitBranch()
+        # Current working branch.
+        self.current_branch = self.start
+        # The currently selected commit of a branch, which might not be in the active working branch or the main branch,
+        # as we may be moving backwards or forward in the commit history
+        self.selected_commit: Node = None
+        # Keeps track of branches (and merge commits) that have been visited on backwards movements.
+        self.visited_branches = set()
+        # Maps each commit message to the (branch, commit) find_commit would return for it.
+        self._commit_index: dict[str, Tuple[GitBranch, Commit]] = {}
+        # Maps each branch name to its branch, in creation order.
+        self._branches: dict[str, GitBranch] = {self.start.name: self.start}
+        # Journal, compaction and search pool, shared with every worktree and snapshot view.
+        self._shared = _SharedState()
+        # Pool the commit messages are stored through, if any.
+        self.message_pool = message_pool
+        # Installed instrumentation hooks, and the nodes traversed by the traced operation running.
+        self._hooks: List[Hook] = []
+        self._visited = 0
+        # Full-text index of the commit messages, if any.
+        self.text_index = text_index
+
+    @property
+    def _journal(self) -> Optional[Journal]:
+        """
+        Journal the tree is recorded in, if one is open.
+
+        :return: the shared journal, or None.
+        """
+        return self._shared.journal
+
+    @_journal.setter
+    def _journal(self, journal: Optional[Journal]) -> None:
+        """
+        Replace the journal shared with every worktree.
+
+        :param journal: new journal, or None.
+        :return: None.
+        """
+        self._shared.journal = journal
+
+    @property
+    def _compaction(self) -> Optional[threading.Thread]:
+        """
+        Thread of the last compaction started on the tree, if any.
+
+        :return: the shared compaction thread, or None.
+        """
+        return self._shared.compaction
+
+    @_compaction.setter
+    def _compaction(self, compaction: Optional[threading.Thread]) -> None:
+        """
+        Replace the compaction shared with every worktree.
+
+        :param compaction: new compaction, or None.
+        :return: None.
+        """
+        self._shared.compaction = compaction
+
+    def _key(self, message: T) -> T | CompressedMessage:
+        """
+        Return the value `message` is stored as in the commit nodes and the message index.
+
+        :param message: commit message.
+        :return: pooled form of the message, or the message itself without a pool.
+        """
+        if self.message_pool is None:
+            return message
+        return self.message_pool.key(message)
+
+    def get_current_commit(self) -> Optional[str]:
+        """
+        Return the value stored in the currently selected commit.
+        :return: current working commit of tree.
+        """
+        if self.selected_commit is not None:
+            return MessagePool.text(self.selected_commit.value)
+        return None
+
+    def get_current_branch_name(self) -> Optional[str]:
+        """
+        Return the name of the current working/active branch.
+        :return: Name of current working branch.
+        """
+        return self.current_branch.name
+
+    def commit(self, message: str) -> None:
+        """
+        Commit to the timeline if it is the last element in the commit.
+        If current working commit is not the last commit, raise exception.
+        :param message: Message to be added to commit.
+        """
+        if self.selected_commit is not None and self.selected_commit.next is not None:
+            raise Exception("Can't commit in middle of timeline")
+
+        value = message if self.message_pool is None else self.message_pool.store(message)
+        self._shared.record_size(self.current_branch)
+        self.current_branch.push(value)
+        self.selected_commit = self.current_branch.tail
+
+        node = self.current_branch.tail
+        self._index_commit(node)
+        if self.text_index is not None:
+            self.text_index.add(node, message)
+        if self._journal is not None:
+            self._journal.record_commit(node.branch.name, node.position, message)
+
+    def merge(self, name: str, message: str) -> None:
+        """
+        Merge a branch into the current one: commit a merge commit whose first parent is the
+        selected commit and whose merge parent is the last commit of branch `name` (or, if that
+        branch has no commits yet, the commit it was created from). The merge commit is indexed
+        and journaled like any other commit; it stays on the current branch, so find_commit and
+        find_branch still visit every commit once.
+        If current working commit is not the last commit, raise exception.
+        If the branch does not exist, or its last commit is already in the history of the selected
+        commit, raise exception.
+
+        :param name: name of the branch to merge.
+        :param message: Message of the merge commit.
+        :return: None.
+        """
+        source = self._branches.get(name)
+        if source is None:
+            raise Exception("Branch is not existent")
+        self._merge(source.tail if source.tail is not None else source.parent_node, message)
+
+    def _merge(self, merged: Optional[Commit], message: str) -> None:
+        """
+        Commit a merge commit of the selected commit and `merged` at the end of the current branch.
+
+        :param merged: merge parent of the new commit.
+        :param message: Message of the merge commit.
+        :return: None.
+        """
+        if self.selected_commit is not None and self.selected_commit.next is not None:
+            raise Exception("Can't commit in middle of timeline")
+        head = self.selected_commit if self.selected_commit is not None else self.current_branch.parent_node
+        if merged is None or head is None or self.is_ancestor(merged, head):
+            raise Exception("Nothing to merge")
+
+        value = message if self.message_pool is None else self.message_pool.store(message)
+        self._shared.record_size(self.current_branch)
+        node = self.current_branch.push_merge(value, (merged,))
+        self.selected_commit = node
+
+        self._index_commit(node)
+        if self.text_index is not None:
+            self.text_index.add(node, message)
+        if self._journal is not None:
+            self._journal.record_merge(node.branch.name, node.position, message,
+                                       merged.branch.name, merged.position)
+
+    def commit_many(self, messages: Iterable[str]) -> None:
+        """
+        Commit every message of `messages`, in order, as if commit were called for each one.
+        The position is validated once, the new commits are linked onto the current branch in
+        a single pass, and the selected commit ends up at the new tip.
+        If current working commit is not the last commit, raise exception.
+
+        :param messages: iterable of commit messages; it is consumed lazily.
+        :return: None.
+        """
+        if self.selected_commit is not None and self.selected_commit.next is not None:
+            raise Exception("Can't commit in middle of timeline")
+
+        branch = self.current_branch
+        previous_tail = branch.tail
+        if self.message_pool is not None:
+            messages = map(self.message_pool.store, messages)
+        self._shared.record_size(branch)
+        branch.extend(messages)
+        if branch.tail is previous_tail:
+            return
+
+        index = self._commit_index
+        journal = self._journal
+        text_index = self.text_index
+        node = previous_tail.next if previous_tail is not None else branch.head
+        while node is not None:
+            existing = index.get(node.value)
+            if existing is None:
+                index[node.value] = (branch, node)
+            elif self._dfs_key(node) < self._dfs_key(existing[1]):
+                index[node.value] = (branch, node)
+            if text_index is not None:
+                text_index.add(node, MessagePool.text(node.value))
+            if journal is not None:
+                journal.record_commit(branch.name, node.position, MessagePool.text(node.value))
+            node = node.next
+        self.selected_commit = branch.tail
+
+    def _index_commit(self, node: Commit) -> None:
+        """
+        Record a new commit in the message index. When the message already exists, keep
+        whichever commit comes first in the depth-first order used by find_commit.
+
+        :param node: commit that was just added to the tree.
+        :return: None.
+        """
+        existing = self._commit_index.get(node.value)
+        if existing is None or self._dfs_key(node) < self._dfs_key(existing[1]):
+            self._commit_index[node.value] = (node.branch, node)
+
+    @staticmethod
+    def _dfs_key(node: Commit) -> List[Tuple[int, int]]:
+        """
+        Build a key that orders commits the way find_commit visits them: a branch is scanned
+        head to tail before any of its child branches, child branches forked from later
+        commits are explored (completely) first, and branches forked from the same commit are
+        explored in the order they were created.
+
+        :param node: commit to build the key for.
+        :return: list of (kind, rank...) tuples from the root branch down to `node`.
+        """
+        key = [(0, node.position)]
+        branch = node.branch
+        while branch.parent_node is not None:
+            key.append((1, -branch.parent_node.position, branch.sibling_index))
+            branch = branch.parent_node.branch
+        key.reverse()
+        return key
+
+    def backwards(self, parent: int = 0) -> None:
+        """
+        Moves the reference of the current working commit back one commit.
+        If already in the first commit of the tree, do not move.
+        From a merge commit, moves to its first parent by default, or to one of its merge parents;
+        forward then steps back into the merge commit.
+
+        :param parent: 0 to move to the first parent, n to move to the n-th merge parent.
+        """
+        if parent:
+            if self.selected_commit is None or parent > len(self.selected_commit.merge_parents):
+                raise Exception("Commit does not have that many parents")
+            self.visited_branches.add(self.selected_commit)
+            self.selected_commit = self.selected_commit.merge_parents[parent - 1]
+            return
+
+        if self.selected_commit is None and self.current_branch.parent_node is None:
+            return
+
+        elif self.selected_commit is None and self.current_branch.parent_node:
+            self.visited_branches.add(self.current_branch)
+            self.selected_commit = self.current_branch.parent_node
+
+        elif self.selected_commit is not None:
+
+            if self.selected_commit.prev is not None:
+                self.selected_commit = self.selected_commit.prev
+            elif self.selected_commit.branch.parent_node is not None:
+                # First commit of a branch: step back to the commit the branch was created from.
+                self.visited_branches.add(self.selected_commit.branch)
+                self.selected_commit = self.selected_commit.branch.parent_node
+
+    def forward(self) -> None:
+        """
+        Move the reference of the current working commit forward one commit.
+        Keep the working commit on the working branch if multiple branches are available: when
+        the selected commit has child branches, the one backwards stepped out of is followed,
+        whatever the number of branches created from the commit. Likewise, after backwards moved
+        from a merge commit to a merge parent, forward moves back to the merge commit.
+        If already at the last commit of the tree, do not move.
+        """
+        if self.selected_commit is not None:
+            if self.selected_commit == self.current_branch.tail:
+                return
+            # visited_branches only holds the branches on the way back, never all the children.
+            for step in self.visited_branches:
+                if isinstance(step, Commit):
+                    if self.selected_commit in step.merge_parents:
+                        self.visited_branches.remove(step)
+                        self.selected_commit = step
+                        return
+                elif step.parent_node is self.selected_commit:
+                    self.visited_branches.remove(step)
+                    self.selected_commit = step.head
+                    return
+            if self.selected_commit.next:
+                self.selected_commit = self.selected_commit.next
+
+
+    def checkout_commit(self, message) -> None:
+        """
+        Check out any commit in the tree, moving the current selected branch to that commit's branch.
+        If the commit is found, change the current selected branch to be the parent branch of the commit.
+        If no such commit exists, raise an exception.
+        Commits are looked up in the message index in constant time. When several commits share the
+        message, the one find_commit(self.start, message) would return is checked out.
+
+        :param message: Commit message to look for.
+        """
+        existing_commit = self._commit_index.get(self._key(message))
+        if existing_commit is not None:
+            self.current_branch = existing_commit[0]
+            self.selected_commit = existing_commit[1]
+            return
+
+        raise Exception("Commit is not existent")
+
+    def checkout_branch(self, name) -> None:
+        """
+        Check out a tree branch, and move the working commit to the last commit on the branch.
+        If the branch with the given name already exist, change the current branch to be that one, and change the current
+        commit to be the last commit on the branch. If branch does not exist, then create a branch from the current
+        working commit; any number of branches can be created from the same commit. Existing branches are looked up
+        by name in constant time.
+
+        :param name: The branch name to look for.
+        :return: None.
+        """
+        existing_branch = self._branches.get(name)
+
+        # Branch exists
+        if existing_branch is not None:
+            self.current_branch = existing_branch
+            self.selected_commit = existing_branch.get_last_commit()
+            self.visited_branches.clear()
+            return
+
+        # Trying to create a branch on an empty head (No commits on branch yet)
+        if self.selected_commit is None:
+            raise Exception("Branches cannot be created on empty commits")
+
+        if self._journal is not None:
+            self._journal.record_branch(name, self.selected_commit.branch.name, self.selected_commit.position)
+        branch = GitBranch(name, self.selected_commit)
+        branch.order, branch.version = len(self._branches), self._shared.version
+        self.selected_commit.add_branch(branch)
+        self._branches[name] = branch
+        self.current_branch = branch
+        self.selected_commit = branch.head
+        self.visited_branches.clear()
+
+    def worktree(self) -> Git:
+        """
+        Create a lightweight worktree: a Git object sharing this tree (branches, commit nodes,
+        message index, message pool and journal) but keeping its own selected commit, current
+        branch and visited branches, starting at this object's position. Nothing is copied, so a
+        worktree costs O(1) memory whatever the size of the history.
+
+        backwards, forward, checkout_commit, checkout_branch and every query work on each worktree
+        independently; commits and branches created through any of them are seen by all. They also
+        share the journal: one opened, closed or compacted through any of them is the one all of
+        them write to. Worktrees share no lock; use ConcurrentGit to use them from several threads.
+
+        :return: new Git object over the same tree.
+        """
+        worktree = Git.__new__(Git)
+        worktree.start = self.start
+        worktree.current_branch = self.current_branch
+        worktree.selected_commit = self.selected_commit
+        worktree.visited_branches = set(self.visited_branches)
+        worktree._commit_index = self._commit_index
+        worktree._branches = self._branches
+        worktree._shared = self._shared
+        worktree.message_pool = self.message_pool
+        worktree.text_index = self.text_index
+        worktree._hooks = []
+        worktree._visited = 0
+        return worktree
+
+    def list_branches(self) -> List[str]:
+        """
+        Return the names of all branches in the tree, in the order they were created.
+
+        :return: list of branch names, starting with the original branch.
+        """
+        return list(self._branches)
+
+    def _extents(self) -> List[Tuple[GitBranch, int]]:
+        """
+        List the branches of the tree with their number of commits, all read in one pass.
+
+        :return: list of (branch, number of commits) pairs, in creation order.
+        """
+        return [(branch, branch.size) for branch in list(self._branches.values())]
+
+    def snapshot(self) -> GitSnapshot:
+        """
+        Take a point-in-time view of the tree in O(1) time and memory.
+
+        Commits and branches are never modified once created, only added at the end of a branch and
+        of the list of branches. The view shares every node with this object and only records the
+        number of branches and the version of the tree, which taking a view increments. A branch
+        remembers the version it was last committed to in and, the first time it is committed to in
+        a later version while a view is alive, the size it had then; the view reads the size each
+        branch had when it was taken from these. Commits, merges and branches created afterwards
+        (through this object or any worktree) are not visible in the view.
+
+        :return: read-only GitSnapshot.
+        """
+        view = GitSnapshot.__new__(GitSnapshot)
+        view._start = self.start
+        view._current_branch = self.current_branch
+        view.selected_commit = self.selected_commit
+        view.visited_branches = set()
+        view._commit_index = self._commit_index
+        view._branches = self._branches
+        view._shared = self._shared
+        view.message_pool = self.message_pool
+        view.text_index = self.text_index
+        view._hooks = []
+        view._visited = 0
+        shared = self._shared
+        view._branch_count = len(self._branches)
+        view._version = shared.version
+        shared.version += 1
+        shared.views.add(view)
+        return view
+
+    def _resolve(self, commit: str | Commit) -> Commit:
+        """
+        Turn a commit message or commit node into a commit node.
+
+        :param commit: commit node, or message looked up like checkout_commit does.
+        :return: commit node.
+        """
+        if isinstance(commit, Commit):
+            return commit
+        existing_commit = self._commit_index.get(self._key(commit))
+        if existing_commit is None:
+            raise Exception("Commit is not existent")
+        return existing_commit[1]
+
+    def is_ancestor(self, a: str | Commit, b: str | Commit) -> bool:
+        """
+        Check whether commit `a` is in the history of commit `b` (a commit is its own ancestor).
+        Runs in O(log n) using the jump pointers of the commits when `a` is a first parent ancestor
+        of `b` or `b` has no merge in its history. Otherwise the merge parents are followed, visiting each commit at most once and
+        skipping the commits that rank below `a` in the DAG order (see Commit.order).
+
+        :param a: possible ancestor, as commit node or message.
+        :param b: possible descendant, as commit node or message.
+        :return: True if `a` is `b` or an ancestor of `b`, else False.
+        """
+        a, b = self._resolve(a), self._resolve(b)
+        # The jump pointers find `a` among the first parents of `b`, merges or not.
+        if b.ancestor(a.generation) is a:
+            return True
+        if b.level is None:
+            return False
+
+        order = a.order()
+        visited = _CommitBitmap()
+        visited.add(b)
+        stack = [b]
+        while stack:
+            node = stack.pop()
+            if node.level is None:
+                # No merge below: the history of `node` is a chain of first parents.
+                if node.ancestor(a.generation) is a:
+                    return True
+                continue
+            if node is a:
+                return True
+            for parent in node.parents():
+                if parent.order() >= order and visited.add(parent):
+                    stack.append(parent)
+        return False
+
+    def merge_base(self, a: str | Commit, b: str | Commit) -> Commit:
+        """
+        Find the most recent commit that is in the history of both `a` and `b`.
+        Runs in O(log n) using the jump pointers of the commits while neither has a merge in its
+        history. Otherwise the histories of both are walked together, highest ranked commit first,
+        until a commit reached from both sides comes up: the common ancestor ranking highest in the
+        DAG order, which no other common ancestor descends from. Only the commits ranking above it
+        are visited, each at most once.
+
+        :param a: commit node or message.
+        :param b: commit node or message.
+        :return: lowest common ancestor of `a` and `b`.
+        """
+        a, b = self._resolve(a), self._resolve(b)
+        if a.level is not None or b.level is not None:
+            return self._dag_merge_base(a, b)
+        if a.generation > b.generation:
+            a = a.ancestor(b.generation)
+        elif b.generation > a.generation:
+            b = b.ancestor(a.generation)
+
+        # Commits of equal generation have jump pointers of equal length.
+        while a is not b:
+            if a.jump is not b.jump:
+                a, b = a.jump, b.jump
+            else:
+                a, b = a.parent(), b.parent()
+        return a
+
+    @staticmethod
+    def _dag_merge_base(a: Commit, b: Commit) -> Commit:
+        """
+        Find the merge base of two commits by walking their histories in the DAG order.
+
+        :param a: commit node.
+        :param b: commit node.
+        :return: common ancestor of `a` and `b` ranking highest in the DAG order.
+        """
+        from_a, from_b = _CommitBitmap(), _CommitBitmap()
+        from_a.add(a)
+        from_b.add(b)
+        count = 0
+        heap = [(-a.order(), count, a)]
+        if b is not a:
+            count += 1
+            heap.append((-b.order(), count, b))
+        while True:
+            _, _, node = heapq.heappop(heap)
+            in_a, in_b = node in from_a, node in from_b
+            if in_a and in_b:
+                return node
+            for parent in node.parents():
+                reached = in_a and from_a.add(parent)
+                reached = (in_b and from_b.add(parent)) or reached
+                if reached:
+                    count += 1
+                    heapq.heappush(heap, (-parent.order(), count, parent))
+
+    def distance(self, a: str | Commit, b: str | Commit) -> int:
+        """
+        Count the commits separating `a` and `b`: the number of parent links on the path from `a`
+        to their merge base and from there to `b`. Runs in O(log n) using commit generations.
+        When merges are involved, the shortest such path through any common ancestor is counted,
+        with a breadth-first walk of both histories visiting each commit at most once.
+
+        :param a: commit node or message.
+        :param b: commit node or message.
+        :return: number of parent links between the two commits; 0 if they are the same commit.
+        """
+        a, b = self._resolve(a), self._resolve(b)
+        if a.level is None and b.level is None:
+            return a.generation + b.generation - 2 * self.merge_base(a, b).generation
+
+        # Parent links from `a` to each of its ancestors; the dictionary is the visited set.
+        from_a = {a: 0}
+        level = [a]
+        while level:
+            following = []
+            for node in level:
+                for parent in node.parents():
+                    if parent not in from_a:
+                        from_a[parent] = from_a[node] + 1
+                        following.append(parent)
+            level = following
+
+        best = None
+        visited = _CommitBitmap()
+        visited.add(b)
+        level, depth = [b], 0
+        while level and (best is None or depth < best):
+            following = []
+            for node in level:
+                if node in from_a:
+                    best = min(best, depth + from_a[node]) if best is not None else depth + from_a[node]
+                for parent in node.parents():
+                    if visited.add(parent):
+                        following.append(parent)
+            level, depth = following, depth + 1
+        return best
+
+    def log(self, n: int, start: str | Commit | None = None) -> List[Commit]:
+        """
+        Return the most recent `n` commits in the history of `start`, newest first, visiting only those commits.
+        With merges, the history holds the commits reachable through any parent, each listed once,
+        in the DAG order (see Git.history). Use log_page to list a long history page by page.
+
+        :param n: maximum number of commits to return.
+        :param start: commit node or message to start from; defaults to the currently selected commit
+            (or the commit the current branch was created from, if it has no commits yet).
+        :return: list of at most `n` commit nodes, starting with `start` itself.
+        """
+        return list(islice(self.history(start), max(n, 0)))
+
+    def _log_start(self, start: str | Commit | None) -> Optional[Commit]:
+        """
+        Resolve the commit a history listing starts from.
+
+        :param start: commit node or message, or None for the currently selected commit (or the
+            commit the current branch was created from, if it has no commits yet).
+        :return: commit node, or None if there is no history.
+        """
+        if start is not None:
+            return self._resolve(start)
+        if self.selected_commit is not None:
+            return self.selected_commit
+        return self.current_branch.parent_node
+
+    def history(self, start: str | Commit | None = None, page_token: Optional[str] = None) -> HistoryCursor:
+        """
+        Lazily walk the history of a commit, across branch boundaries: the commit and all its
+        ancestors through first and merge parents, each yielded exactly once, newest first in a
+        stable topological order (see HistoryCursor).
+
+        :param start: commit node or message to start from; defaults to the currently selected commit
+            (or the commit the current branch was created from, if it has no commits yet).
+        :param page_token: token returned by HistoryCursor.token (or log_page) to resume a walk right
+            after the last commit it yielded; `start` is then ignored.
+        :return: cursor over the commit nodes.
+        """
+        if page_token is None:
+            start = self._log_start(start)
+            return HistoryCursor([(start, 0)] if start is not None else [], 0)
+
+        try:
+            count, entries = json.loads(base64.urlsafe_b64decode(page_token.encode()))
+            frontier = [(self._commit_at(name, position), discovered) for name, position, discovered in entries]
+        except (ValueError, TypeError, AttributeError):
+            raise Exception("Invalid page token")
+        if not frontier or any(node is None for node, _ in frontier) or not isinstance(count, int):
+            raise Exception("Invalid page token")
+        return HistoryCursor(frontier, count)
+
+    def _commit_at(self, name: str, position: int) -> Optional[Commit]:
+        """
+        Find a commit by branch and position in O(log n), through the jump pointers of the branch tip.
+
+        :param name: name of the branch.
+        :param position: position of the commit within the branch.
+        :return: commit node, or None if there is no such commit.
+        """
+        branch = self._branches.get(name)
+        if branch is None or not isinstance(position, int) or not 0 <= position < branch.size:
+            return None
+        tail = branch.tail
+        return tail.ancestor(tail.generation - (tail.position - position))
+
+    def log_page(self, n: int, start: str | Commit | None = None,
+                 page_token: Optional[str] = None) -> Tuple[List[Commit], Optional[str]]:
+        """
+        Return one page of the history of `start` (see history), and the token of the next page.
+        Serving a page costs time proportional to its size and memory proportional to the width of
+        the history, however deep into the history the page is.
+
+        :param n: maximum number of commits to return.
+        :param start: commit node or message to start from; defaults to the currently selected commit.
+        :param page_token: token of the page to return, as returned with the previous page; None
+            for the first page.
+        :return: (list of at most `n` commit nodes, token of the next page or None after the last one).
+        """
+        cursor = self.history(start, page_token)
+        return list(islice(cursor, max(n, 0))), cursor.token()
+
+    def save(self, path: str) -> None:
+        """
+        Write the whole tree to a binary snapshot file that Git.load can memory-map.
+
+        The file holds a header, a branch table (parent commit, first commit, size and name of
+        every branch, in creation order), a commit table (message of every commit, branch by
+        branch), an open-addressing hash table from message to the commit find_commit would
+        return, the merge parents of every merge commit, and a string pool in which every distinct
+        string is stored once.
+
+        The tree may keep growing from another thread while it is saved (see compact); the file
+        then holds the branches and commits that existed when the branch sizes were read, all of
+        them before anything is encoded. Should a merge made while they were read refer to a commit
+        past the size read for its branch, the sizes are read again, up to SAVE_ATTEMPTS times.
+        The snapshot is written to `path` + ".tmp" and then moved over `path`, so a Git object
+        loaded from `path` keeps reading the file it mapped.
+
+        :param path: path of the file to write.
+        :return: None.
+        """
+        for _ in range(SAVE_ATTEMPTS):
+            encoded = self._encode(self._extents())
+            if encoded is not None:
+                break
         else:
-            raise Exception("Can't commit in middle of timeline")
+            raise Exception("Tree changed while it was saved")
+        branch_ids, commit_ids, slots, merge_rows, branch_rows, commit_rows, pool = encoded
+        selected = commit_ids.get(self.selected_commit, -1)
+        header = _HEADER.pack(SNAPSHOT_MAGIC, len(branch_ids), len(commit_ids), len(slots),
+                              branch_ids.get(self.current_branch, 0), selected)
+        header += _MERGES.pack(len(merge_rows) // _MERGE.size)
+        # A Git loaded from `path` may still be reading it: write the new file next to it, then swap.
+        with open(path + ".tmp", "wb") as file:
+            for chunk in (header, branch_rows, commit_rows, slots.tobytes(), merge_rows, pool):
+                file.write(chunk)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + ".tmp", path)
+
+    def _encode(self, extents: List[Tuple[GitBranch, int]]) -> Optional[tuple]:
+        """
+        Build the tables of a snapshot file (see save) in memory.
+
+        :param extents: (branch, number of commits) pairs to write, in creation order.
+        :return: (branch ids, commit ids, hash table slots, merge rows, branch rows, commit rows,
+            string pool), or None if a merge parent lies past the size read for its branch.
+        """
+        branch_ids = {}
+        commit_ids = {}
+        pool = bytearray()
+        pooled = {}
+        branch_rows = bytearray()
+        commit_rows = bytearray()
+
+        def intern(string: str) -> Tuple[int, int]:
+            if string not in pooled:
+                data = string.encode()
+                pooled[string] = (len(pool), len(data))
+                pool.extend(data)
+            return pooled[string]
+
+        messages = {}
+        merges = []
+        for branch, size in extents:
+            branch_ids[branch] = len(branch_ids)
+            first = len(commit_ids)
+            node = branch.head
+            for _ in range(size):
+                message = MessagePool.text(node.value)
+                if not isinstance(message, str):
+                    raise Exception("Only string commit messages can be saved")
+                commit_ids[node] = len(commit_ids)
+                messages[message] = node.value
+                commit_rows += _COMMIT.pack(*intern(message))
+                if node.merge_parents:
+                    merges.append(node)
+                node = node.next
+            parent = commit_ids[branch.parent_node] if branch.parent_node is not None else -1
+            branch_rows += _BRANCH.pack(parent, first, len(commit_ids) - first, *intern(branch.name))
+
+        merge_rows = bytearray()
+        for node in merges:
+            for parent in node.merge_parents:
+                if parent not in commit_ids:
+                    # The parent was committed after the size of its branch was read.
+                    return None
+                merge_rows += _MERGE.pack(commit_ids[node], commit_ids[parent])
+
+        winners = {}
+        unresolved = {}
+        for message, value in messages.items():
+            indexed = self._commit_index.get(value)
+            if indexed is not None and indexed[1] in commit_ids:
+                winners[message] = indexed[1]
+            else:
+                # The indexed commit was made after the size of its branch was read, or the commit
+                # is linked but not indexed yet (commit_many indexes a batch once it is linked).
+                unresolved[value] = message
+        if unresolved:
+            candidates = {}
+            for node in commit_ids:
+                if node.value in unresolved:
+                    candidates.setdefault(node.value, []).append(node)
+            for value, nodes in candidates.items():
+                winners[unresolved[value]] = min(nodes, key=self._dfs_key)
+
+        slot_count = 1 << (2 * len(messages) - 1).bit_length() if messages else 0
+        slots = array("q", [-1]) * slot_count
+        for message, winner in winners.items():
+            slot = zlib.crc32(message.encode()) & (slot_count - 1)
+            while slots[slot] >= 0:
+                slot = (slot + 1) & (slot_count - 1)
+            slots[slot] = commit_ids[winner]
+        if sys.byteorder != "little":
+            slots.byteswap()
+
+        return branch_ids, commit_ids, slots, merge_rows, branch_rows, commit_rows, pool
+
+    @classmethod
+    def load(cls, path: str) -> Git:
+        """
+        Open a snapshot written by Git.save. The file is memory-mapped and only its branch table is
+        read up front; the commits of a branch are deserialized the first time the branch (or a
+        commit on it) is reached, so history that is never touched is never loaded.
+
+        The snapshot stores every distinct message once on disk; the loaded object has no message pool.
+
+        :param path: path of the snapshot file.
+        :return: Git object positioned where the saved one was.
+        """
+        snapshot = _Snapshot(path)
+        git = cls()
+        git.start = snapshot.branches[0]
+        git._branches = {branch.name: branch for branch in snapshot.branches}
+        git._commit_index = _SnapshotCommitIndex(snapshot)
+        git.current_branch = snapshot.branches[snapshot.current]
+        git.selected_commit = snapshot.commit(snapshot.selected) if snapshot.selected >= 0 else None
+        return git
+
+    def open_journal(self, path: str, group_size: int = 1) -> None:
+        """
+        Start recording every commit and branch creation in an append-only journal.
+
+        :param path: path of the journal file; records are appended if it already exists.
+        :param group_size: number of records written and fsynced together. Larger groups keep commit
+            latency low, at the cost of losing up to `group_size - 1` of the latest records in a crash.
+        :return: None.
+        """
+        self.close_journal()
+        self._journal = Journal(path, group_size)
+
+    def sync(self) -> None:
+        """
+        Make every journaled operation durable, even if its group is not complete yet. Then raise
+        the error of the last background compaction, if it failed since the previous check.
+
+        :return: None.
+        """
+        if self._journal is not None:
+            self._journal.sync()
+        self._raise_compaction_error()
+
+    def _raise_compaction_error(self) -> None:
+        """
+        Raise the error of the last background compaction, once, if it failed.
+
+        :return: None.
+        """
+        error = self._shared.compaction_error
+        if error is not None:
+            self._shared.compaction_error = None
+            raise Exception("Journal compaction failed") from error
+
+    def close_journal(self) -> None:
+        """
+        Sync and stop using the journal, if one is open.
+
+        :return: None.
+        """
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def close(self) -> None:
+        """
+        Close the journal, if one is open, stop the search pool, if one was started, and unmap the
+        snapshot file the tree was loaded from, if any. History that was never reached cannot be
+        read once the snapshot is closed.
+
+        :return: None.
+        """
+        self.close_journal()
+        self._shared.close_pool()
+        if isinstance(self._commit_index, _SnapshotCommitIndex):
+            self._commit_index._snapshot.close()
+
+    def compact(self, snapshot_path: str, background: bool = True) -> Optional[threading.Thread]:
+        """
+        Fold the journal into a fresh snapshot. The journal is rotated first, so new operations go
+        to an empty journal while the snapshot is written; once the snapshot is in place the rotated
+        journal is deleted. Since replay skips operations already in the tree, a crash at any point
+        leaves a snapshot and journals that Git.recover can combine. A rotated journal left behind
+        by such a crash is folded in by the next compaction.
+
+        If a background compaction fails, the rotated journal is kept, and the error is raised by
+        the next call to sync or compact on the tree or any of its worktrees.
+
+        :param snapshot_path: path of the snapshot to replace.
+        :param background: if True, write the snapshot from a new thread and return it.
+        :return: thread writing the snapshot, or None if `background` is False.
+        """
+        if self._journal is None:
+            raise Exception("No journal is open")
+        if self._compaction is not None and self._compaction.is_alive():
+            raise Exception("A compaction is already in progress")
+        self._raise_compaction_error()
+        path = self._journal.path
+        rotated = path + ".compacting"
+
+        group_size = self._journal.group_size
+        self._journal.close()
+        if os.path.exists(rotated):
+            with open(path, "rb") as source, open(rotated, "ab") as target:
+                shutil.copyfileobj(source, target)
+                target.flush()
+                os.fsync(target.fileno())
+            os.remove(path)
+        else:
+            os.replace(path, rotated)
+        self._journal = Journal(path, group_size)
+
+        def fold() -> None:
+            self.save(snapshot_path)
+            os.remove(rotated)
+
+        def fold_in_background() -> None:
+            try:
+                fold()
+            except Exception as error:
+                self._shared.compaction_error = error
+
+        if not background:
+            fold()
+            return None
+        self._compaction = threading.Thread(target=fold_in_background, name="git-compaction")
+        self._compaction.start()
+        return self._compaction
+
+    @classmethod
+    def recover(cls, snapshot_path: str, journal_path: str, group_size: int = 1) -> Git:
+        """
+        Rebuild a Git object after a crash: load the last snapshot (if any), replay the journal left
+        by an unfinished compaction and then the current journal, and keep journaling to it.
+        The selected commit is the result of the last replayed operation.
+
+        :param snapshot_path: path of the last snapshot.
+        :param journal_path: path of the journal.
+        :param group_size: number of records written and fsynced together from now on.
+        :return: recovered Git object.
+        """
+        git = cls.load(snapshot_path) if os.path.exists(snapshot_path) else cls()
+        for path in (journal_path + ".compacting", journal_path):
+            if os.path.exists(path):
+                git._replay(path)
+        git.open_journal(journal_path, group_size)
+        return git
+
+    def _replay(self, path: str) -> None:
+        """
+        Apply the records of a journal file, skipping those already reflected in the tree.
+
+        :param path: path of the journal file.
+        :return: None.
+        """
+        for kind, position, name, other, *merged in Journal.records(path):
+            if kind == Journal.MERGE:
+                branch = self._branches.get(name)
+                source = self._branches.get(merged[0])
+                if branch is None or branch.size < position or source is None or source.size <= merged[1]:
+                    raise Exception("Journal does not match the snapshot")
+                if branch.size == position:
+                    node = source.tail
+                    while node.position > merged[1]:
+                        node = node.prev
+                    self.current_branch = branch
+                    self.selected_commit = branch.tail
+                    self._merge(node, other)
+            elif kind == Journal.COMMIT:
+                branch = self._branches.get(name)
+                if branch is None or branch.size < position:
+                    raise Exception("Journal does not match the snapshot")
+                if branch.size == position:
+                    self.current_branch = branch
+                    self.selected_commit = branch.tail
+                    self.commit(other)
+            elif name not in self._branches:
+                parent = self._branches.get(other)
+                if parent is None or parent.size <= position:
+                    raise Exception("Journal does not match the snapshot")
+                node = parent.tail
+                while node.position > position:
+                    node = node.prev
+                self.current_branch = parent
+                self.selected_commit = node
+                self.checkout_branch(name)
+
+    def find_branch(self, start: GitBranch, name: str) -> GitBranch | None:
+        """
+        Iteratively find branch on the tree.
+
+        :param start: Current tree to look for in.
+        :param name: Name of branch to look for.
+        :return: Branch reference if found, else None.
+        """
+        for branch, node in self._walk(start):
+            if node is None and branch.name == name:
+                return branch
+        return
+
+    def find_commit(self, start: GitBranch, message: str) -> Tuple[GitBranch, Node] | None:
+        """
+        Iteratively find a commit based on the given commit message.
+
+        :param start: Current branch to look for commit
+        :param message: Commit message to look for
+        :return: If found commit, return branch and commit node, else None
+        """
+        message = self._key(message)
+        for branch, node in self._walk(start):
+            if node is not None and node.value == message:
+                return branch, node
+        return
+
+    def grep(self, query: str) -> List[Commit]:
+        """
+        Find the commits whose message matches a keyword query, using the full-text index: words
+        separated by spaces must all appear, OR separates alternatives and "word*" matches a
+        prefix (see TextIndex.query). Answered in time proportional to the matches.
+
+        :param query: query string, e.g. "fix pars* OR lexer".
+        :return: matching commits, in the order they were committed.
+        """
+        if self.text_index is None:
+            raise Exception("No text index, create the Git object with one")
+        return self.text_index.query(query)
+
+    def search(self, matcher: str | Callable[[str], object], start: Optional[GitBranch] = None,
+               processes: Optional[int] = None, piece: int = 65536,
+               pool: Optional[Executor] = None) -> List[Tuple[GitBranch, Commit]]:
+        """
+        Find every commit whose message matches, scanning the history on several processes.
+
+        Every branch is scanned as a whole by the depth-first walk of find_commit, so its commits
+        are laid out in walk order from the branch registry alone, without walking the tree first.
+        The branches are then cut into shards of `piece` messages (a long branch spans several
+        shards, and a shard may hold several short branches), and each shard is sent to a worker
+        as soon as its messages are read, so the workers scan while the next shards are gathered.
+        Shards are consecutive in walk order, so concatenating their results in shard order keeps
+        that order: the first result is what find_commit would return.
+
+        The worker processes are started by the first search that needs them and reused by the
+        following ones (and by worktrees and snapshot views); close stops them.
+
+        :param matcher: regular expression searched (re.search) in every message, or predicate
+            called with every message. With several processes, a predicate must be picklable, i.e.
+            a module-level function.
+        :param start: branch to search from; defaults to the original/main branch.
+        :param processes: number of worker processes; defaults to the number of CPUs. With 1, or
+            when the history fits in one piece, the scan runs in this process.
+        :param piece: number of messages sent to a worker at once.
+        :param pool: executor to scan the shards on instead of the pool of this Git object; it is
+            used whatever the size of the history, and left running.
+        :return: list of (branch, commit) pairs, in find_commit order.
+        """
+        order = self._branch_order(start if start is not None else self.start)
+        total = sum(size for _, size in order)
+        shards = self._search_shards(order, piece)
+        if pool is None:
+            processes = processes or os.cpu_count() or 1
+            if processes > 1 and total > piece:
+                pool = self._shared.search_pool(processes)
+        if pool is None:
+            scanned = ((segments, _search_piece(matcher, messages)) for segments, messages in shards)
+        else:
+            segments = []
+
+            def send() -> Iterator[List[str]]:
+                for shard_segments, messages in shards:
+                    segments.append(shard_segments)
+                    yield messages
+
+            results = pool.map(_search_piece, repeat(matcher), send())
+            scanned = zip(segments, results)
+
+        found = []
+        for shard_segments, hits in scanned:
+            hits = iter(hits)
+            index = next(hits, None)
+            offset = 0
+            for branch, first, size in shard_segments:
+                while index is not None and index < offset + size:
+                    node = self._commit_at(branch.name, first + index - offset)
+                    found.append((branch, node))
+                    index = next(hits, None)
+                offset += size
+        return found
+
+    def _branch_order(self, start: GitBranch) -> List[Tuple[GitBranch, int]]:
+        """
+        List the branches reached from `start` in the order _walk reaches them, with their number of
+        commits. _walk scans a branch completely before exploring the child branches it found, so
+        that order follows from the fork points alone: child branches forked latest come first, and
+        branches forked from the same commit come in creation order.
+
+        :param start: branch to start from.
+        :return: list of (branch, number of commits) pairs.
+        """
+        children = {}
+        first = (start, 0)
+        for extent in self._extents():
+            parent_node = extent[0].parent_node
+            if parent_node is not None:
+                children.setdefault(parent_node.branch, []).append(extent)
+            if extent[0] is start:
+                first = extent
+        order = []
+        pending = [first]
+        while pending:
+            extent = pending.pop()
+            order.append(extent)
+            forks = children.get(extent[0])
+            if forks is not None:
+                if len(forks) > 1:
+                    # Pushed so that the latest fork, then the oldest sibling, is popped first.
+                    forks.sort(key=lambda child: (child[0].parent_node.position, -child[0].sibling_index))
+                pending.extend(forks)
+        return order
+
+    def _search_shards(self, order: List[Tuple[GitBranch, int]],
+                       piece: int) -> Iterator[Tuple[List[Tuple[GitBranch, int, int]], List[str]]]:
+        """
+        Read the messages of a list of branches, in order, as shards of `piece` messages.
+
+        :param order: (branch, number of commits to read) pairs, as returned by _branch_order.
+        :param piece: number of messages per shard; the last shard may be shorter.
+        :return: generator of (segments, messages) pairs, where segments lists the
+            (branch, first position, number of commits) ranges the messages come from.
+        """
+        decompress = self.message_pool is not None and self.message_pool.compress_threshold is not None
+        segments, messages = [], []
+        for branch, size in order:
+            node = branch.get_first_commit()
+            position = 0
+            while position < size:
+                count = min(size - position, piece - len(messages))
+                segments.append((branch, position, count))
+                append = messages.append
+                if decompress:
+                    for _ in range(count):
+                        append(MessagePool.text(node.value))
+                        node = node.next
+                else:
+                    for _ in range(count):
+                        append(node.value)
+                        node = node.next
+                position += count
+                if len(messages) == piece:
+                    yield segments, messages
+                    segments, messages = [], []
+        if messages:
+            yield segments, messages
+
+    def _walk(self, start: GitBranch) -> Iterator[Tuple[GitBranch, Optional[Commit]]]:
+        """
+        Lazily walk the tree depth first, the way find_branch and find_commit search it: each branch
+        is yielded as (branch, None), followed by its commits as (branch, commit), before the child
+        branches are explored, latest fork first; branches forked from the same commit are
+        explored in creation order.
+
+        :param start: branch to start from.
+        :return: generator of (branch, commit or None) pairs.
+        """
+        next_trees = [start]
+        while next_trees:
+            start = next_trees.pop()
+            yield start, None
+            node = start.get_first_commit()
+            while node:
+                yield start, node
+                # Pushed most recent first, so the oldest sibling is popped first.
+                child = node.children_branch
+                while child is not None:
+                    next_trees.append(child)
+                    child = child.sibling
+                node = node.next
+
+    def add_hook(self, hook: Hook) -> None:
+        """
+        Install an instrumentation hook on the traced operations: commit, backwards, forward,
+        checkout_commit, checkout_branch, find_branch and find_commit.
+
+        Tracing is switched on by moving the object to a traced subclass, so a Git object without
+        hooks runs the plain methods with no instrumentation overhead at all.
+
+        :param hook: hook to call around every traced operation.
+        :return: None.
+        """
+        self._hooks.append(hook)
+        if not isinstance(self, _Traced):
+            self.__class__ = _traced_class(type(self))
+
+    def remove_hook(self, hook: Hook) -> None:
+        """
+        Uninstall a hook installed with add_hook; tracing is switched off with the last one.
+
+        :param hook: hook to remove.
+        :return: None.
+        """
+        self._hooks.remove(hook)
+        if not self._hooks:
+            self.__class__ = type(self).__bases__[1]
+
+
+class BranchView:
+    """
+    Read-only branch of a GitSnapshot, as it was when the view was taken: its size, last commit,
+    values and membership tests leave out the commits added to the branch since. GitSnapshot
+    returns these wherever Git returns a branch, and takes them wherever Git takes one.
+    """
+    __slots__ = ["_branch", "_view"]
+
+    def __init__(self, branch: GitBranch, view: GitSnapshot) -> None:
+        """
+        Construct a view of a branch part of a GitSnapshot.
+
+        :param branch: branch of the live tree.
+        :param view: snapshot view the branch is part of.
+        :return: None.
+        """
+        self._branch = branch
+        self._view = view
+
+    @property
+    def name(self) -> str:
+        """
+        Name of the branch.
+
+        :return: branch name.
+        """
+        return self._branch.name
+
+    @property
+    def parent_node(self) -> Optional[Commit]:
+        """
+        Commit the branch was created from.
+
+        :return: commit node, or None for the original branch.
+        """
+        return self._branch.parent_node
+
+    @property
+    def size(self) -> int:
+        """
+        Number of commits of the branch in the view.
+
+        :return: number of commits.
+        """
+        return self._view._size(self._branch)
+
+    @property
+    def head(self) -> Optional[Commit]:
+        """
+        First commit of the branch in the view.
+
+        :return: commit node, or None if the branch has no commits in the view.
+        """
+        return self._branch.head if self.size else None
+
+    @property
+    def tail(self) -> Optional[Commit]:
+        """
+        Last commit of the branch in the view, found in O(log n) through the jump pointers.
+
+        :return: commit node, or None if the branch has no commits in the view.
+        """
+        size = self.size
+        if not size:
+            return None
+        tail = self._branch.tail
+        return tail.ancestor(tail.generation - (tail.position - size + 1))
+
+    def get_first_commit(self) -> Optional[Commit]:
+        """
+        Get the first commit on the branch in the view.
+
+        :return: The first commit node on the branch.
+        """
+        return self.head
+
+    def get_last_commit(self) -> Optional[Commit]:
+        """
+        Get the last commit on the branch in the view.
+
+        :return: The last commit node on the branch.
+        """
+        return self.tail
+
+    def __len__(self) -> int:
+        """
+        Return the number of commits of the branch in the view.
+
+        :return: size of the branch.
+        """
+        return self.size
+
+    def __iter__(self) -> Iterator[T]:
+        """
+        Lazily yield the values of the commits of the branch in the view, from head to tail.
+
+        :return: generator over the values of the branch.
+        """
+        node = self._branch.head
+        for _ in range(self.size):
+            yield node.value
+            node = node.next
+
+    def __contains__(self, val: T) -> bool:
+        """
+        Return boolean indicating whether a commit of the branch in the view holds `val`.
+
+        :param val: value to look for.
+        :return: True if a commit of the branch in the view contains `val`, else False.
+        """
+        return any(value == val for value in self)
+
+    def __eq__(self, other: object) -> bool:
+        """
+        Compare with a branch or another branch view: both are equal if they are the same branch.
+
+        :param other: object to compare with.
+        :return: True if `other` is this branch, else False.
+        """
+        if isinstance(other, BranchView):
+            other = other._branch
+        return self._branch is other
+
+    def __hash__(self) -> int:
+        """
+        Hash the view like the branch itself, so that it can be looked up in place of it.
+
+        :return: hash of the branch.
+        """
+        return hash(self._branch)
+
+    def __repr__(self) -> str:
+        """
+        Represent the branch in the view as a string, like DLL does.
+
+        :return: string representation of the branch.
+        """
+        result = []
+        node = self._branch.head
+        for _ in range(self.size):
+            result.append(str(node))
+            node = node.next
+        return " <-> ".join(result)
+
+
+def _live_branch(branch: GitBranch | BranchView) -> GitBranch:
+    """
+    Return the branch of the live tree a branch or branch view stands for.
+
+    :param branch: branch or branch view.
+    :return: GitBranch.
+    """
+    return branch._branch if isinstance(branch, BranchView) else branch
+
+
+class GitSnapshot(Git):
+    """
+    Immutable point-in-time view of a Git tree, taken in O(1) by Git.snapshot (not to be confused
+    with the snapshot files written by Git.save). It shares all branches and commits with the live
+    tree and hides the branches created after it and the commits added to a branch after it, so it
+    can be kept for as long as needed while the tree keeps growing.
+
+    Every query works on the view: get_current_commit, get_current_branch_name, list_branches,
+    is_ancestor, merge_base, distance, log, log_page, history, find_branch, find_commit, grep, search
+    and save, which writes the tree as it was. Operations changing the tree or the position of
+    the view raise an exception.
+
+    Branches are returned as BranchView (current_branch, start, and the results of find_branch,
+    find_commit and search), which only show the commits of the view. Commit nodes, including
+    selected_commit, are the nodes of the live tree: their value, position, generation and parents
+    never change, but their `next` and `children_branch` links, child_branches and their `branch`
+    (a live GitBranch) reach whatever was added to the tree since the view was taken.
+    """
+    __slots__ = ["_version", "_branch_count", "_start", "_current_branch", "__weakref__"]
+
+    @property
+    def start(self) -> BranchView:
+        """
+        Original branch of the tree, as it was when the view was taken.
+
+        :return: branch view.
+        """
+        return BranchView(self._start, self)
+
+    @property
+    def current_branch(self) -> BranchView:
+        """
+        Branch the view was taken on, as it was then.
+
+        :return: branch view.
+        """
+        return BranchView(self._current_branch, self)
+
+    def snapshot(self) -> GitSnapshot:
+        """
+        Take a view of this view: the view itself, as it never changes.
+
+        :return: this GitSnapshot.
+        """
+        return self
+
+    def _size(self, branch: GitBranch) -> int:
+        """
+        Return the number of commits a branch part of the view had when the view was taken: its size,
+        unless it was committed to since, in which case the last size it recorded before.
+
+        :param branch: branch part of the view.
+        :return: number of commits.
+        """
+        # The size is read first: the version is raised before a branch grows past the view.
+        size = branch.size
+        if branch.version <= self._version:
+            return size
+        sizes = branch.sizes
+        index = bisect.bisect_right(sizes, (self._version, sys.maxsize))
+        return sizes[index - 1][1] if index else 0
+
+    def _holds(self, commit: Commit) -> bool:
+        """
+        Return whether a commit is part of the view.
+
+        :param commit: commit node.
+        :return: True if its branch and the commit were created before the view was taken.
+        """
+        branch = commit.branch
+        return branch.order < self._branch_count and commit.position < self._size(branch)
+
+    def list_branches(self) -> List[str]:
+        """
+        Return the names of the branches part of the view, in the order they were created.
 
-    def backwards(self) -> None:
+        :return: list of branch names, starting with the original branch.
         """
-        Moves the reference of the current working commit back one commit.
-        If already in the first commit of the tree, do not move.
+        return list(self._branches)[:self._branch_count]
+
+    def _extents(self) -> List[Tuple[GitBranch, int]]:
         """
+        List the branches part of the view with their number of visible commits.
 
-        if self.selected_commit is None and self.current_branch.parent_node is None:
+        :return: list of (branch, number of commits) pairs, in creation order.
+        """
+        return [(branch, self._size(branch)) for branch in list(self._branches.values())[:self._branch_count]]
+
+    def _branch_order(self, start: GitBranch | BranchView) -> List[Tuple[BranchView, int]]:
+        """
+        List the branches of the view reached from `start` in _walk order (see Git._branch_order).
+
+        :param start: branch to start from.
+        :return: list of (branch view, number of commits) pairs.
+        """
+        return [(BranchView(branch, self), size) for branch, size in super()._branch_order(_live_branch(start))]
+
+    def _resolve(self, commit: str | Commit) -> Commit:
+        """
+        Turn a commit message or commit node part of the view into a commit node.
+
+        :param commit: commit node, or message looked up like checkout_commit does.
+        :return: commit node.
+        """
+        if isinstance(commit, Commit):
+            if not self._holds(commit):
+                raise Exception("Commit is not existent")
+            return commit
+        existing_commit = self._commit_index.get(self._key(commit))
+        if existing_commit is not None and self._holds(existing_commit[1]):
+            return existing_commit[1]
+        if existing_commit is not None:
+            # A commit made since the view was taken comes first in find_commit order now.
+            found = self.find_commit(self.start, commit)
+            if found is not None:
+                return found[1]
+        raise Exception("Commit is not existent")
+
+    def _commit_at(self, name: str, position: int) -> Optional[Commit]:
+        """
+        Find a commit part of the view by branch and position (see Git._commit_at).
+
+        :param name: name of the branch.
+        :param position: position of the commit within the branch.
+        :return: commit node, or None if there is no such commit in the view.
+        """
+        node = super()._commit_at(name, position)
+        return node if node is not None and self._holds(node) else None
+
+    def grep(self, query: str) -> List[Commit]:
+        """
+        Find the commits part of the view whose message matches a keyword query (see Git.grep).
+
+        :param query: query string.
+        :return: matching commits, in the order they were committed.
+        """
+        return [node for node in super().grep(query) if self._holds(node)]
+
+    def _walk(self, start: GitBranch | BranchView) -> Iterator[Tuple[BranchView, Optional[Commit]]]:
+        """
+        Lazily walk the part of the tree in the view depth first, in the order of Git._walk.
+
+        :param start: branch to start from.
+        :return: generator of (branch view, commit or None) pairs.
+        """
+        start = _live_branch(start)
+        branch_count = self._branch_count
+        if start.order >= branch_count:
             return
+        next_trees = [start]
+        while next_trees:
+            branch = next_trees.pop()
+            view = BranchView(branch, self)
+            yield view, None
+            node = branch.head
+            for _ in range(self._size(branch)):
+                yield view, node
+                child = node.children_branch
+                while child is not None:
+                    if child.order < branch_count:
+                        next_trees.append(child)
+                    child = child.sibling
+                node = node.next
 
-        elif self.selected_commit is None and self.current_branch.parent_node:
-            self.visited_branches.add(self.current_branch)
-            self.selected_commit = self.current_branch.parent_node
 
-        elif self.selected_commit is not None:
+# Git operations a GitSnapshot refuses, as they change the tree or the position of the view.
+SNAPSHOT_REFUSED = ["commit", "commit_many", "merge", "backwards", "forward", "checkout_commit",
+                    "checkout_branch", "worktree", "open_journal", "close_journal", "compact", "close"]
 
-            if self.selected_commit.prev is not None:
-                self.selected_commit = self.selected_commit.prev
-            elif self.selected_commit == self.current_branch.head and self.current_branch.parent_node is not None:
-                self.visited_branches.add(self.current_branch)
-                self.selected_commit = self.current_branch.parent_node
 
+def _refused_method(operation: str) -> Callable:
+    """
+    Build the GitSnapshot version of a Git method that would modify the view.
 
+    :param operation: name of the method.
+    :return: method raising an exception.
+    """
+    def refused(self, *args, **kwargs):
+        raise Exception("Snapshots are read-only")
 
+    refused.__name__ = operation
+    refused.__doc__ = "Not available on a GitSnapshot, which is read-only."
+    return refused
 
-    def forward(self) -> None:
+
+for _operation in SNAPSHOT_REFUSED:
+    setattr(GitSnapshot, _operation, _refused_method(_operation))
+del _operation
+
+
+class _Traced:
+    """
+    Mixin running the operations listed in TRACED_OPERATIONS through the hooks of a Git object.
+    Combined with a Git class by _traced_class.
+    """
+    __slots__ = []
+
+    def _walk(self, start: GitBranch) -> Iterator[Tuple[GitBranch, Optional[Commit]]]:
         """
-        Move the reference of the current working commit forward one commit.
-        Keep the working commit on the working branch if multiple branches are available.
-        If already at the last commit of the tree, do not move.
+        Walk the tree as Git._walk does, counting the commit nodes reached for the hooks.
+
+        :param start: branch to start from.
+        :return: generator of (branch, commit or None) pairs.
         """
-        if self.selected_commit is not None:
-            if self.selected_commit == self.current_branch.tail:
-                return
-            if self.selected_commit.children_branch and self.selected_commit.children_branch in self.visited_branches:
-                self.visited_branches.add(self.current_branch)
-                self.visited_branches.remove(self.selected_commit.children_branch)
-                #self.current_branch = self.selected_commit.children_branch
-                self.selected_commit = self.current_branch.head
-            elif self.selected_commit.next:
-                self.selected_commit = self.selected_commit.next
-            elif self.selected_commit == self.current_branch.tail and self.selected_commit.next is None:
-                if self.selected_commit.children_branch and self.selected_commit.children_branch in self.visited_branches:
-                    self.visited_branches.add(self.current_branch)
-                    self.visited_branches.remove(self.selected_commit.children_branch)
-                    #self.current_branch = self.selected_commit.children_branch
-                    self.selected_commit = self.current_branch.head
+        for branch, node in super()._walk(start):
+            if node is not None:
+                self._visited += 1
+            yield branch, node
 
 
+# Operations reported to hooks, and whether they report the nodes they walk (instead of 1).
+TRACED_OPERATIONS = {
+    "commit": False,
+    "merge": False,
+    "backwards": False,
+    "forward": False,
+    "checkout_commit": False,
+    "checkout_branch": False,
+    "find_branch": True,
+    "find_commit": True,
+}
 
-    def checkout_commit(self, message) -> None:
+_traced_classes: dict[type, type] = {}
+
+
+def _traced_method(operation: str, searches: bool) -> Callable:
+    """
+    Build the traced version of a Git method.
+
+    :param operation: name of the method.
+    :param searches: True if the method walks the tree and reports the nodes it visits.
+    :return: method calling the hooks around the original one.
+    """
+    def traced(self, *args, **kwargs):
+        hooks = self._hooks
+        for hook in hooks:
+            hook.before(operation)
+        # Traced operations may run each other (e.g. while replaying a journal).
+        outer = self._visited
+        self._visited = 0
+        start = time.perf_counter_ns()
+        try:
+            return getattr(super(_Traced, self), operation)(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            visited = self._visited if searches else 1
+            self._visited = outer + self._visited
+            for hook in hooks:
+                hook.after(operation, visited, elapsed)
+
+    traced.__name__ = operation
+    return traced
+
+
+def _traced_class(cls: type) -> type:
+    """
+    Return (creating it once) the traced subclass of a Git class.
+
+    :param cls: Git or a subclass of it.
+    :return: class combining _Traced with `cls`.
+    """
+    traced = _traced_classes.get(cls)
+    if traced is None:
+        namespace = {operation: _traced_method(operation, searches)
+                     for operation, searches in TRACED_OPERATIONS.items()}
+        namespace["__slots__"] = []
+        traced = _traced_classes[cls] = type("Traced" + cls.__name__, (_Traced, cls), namespace)
+    return traced
+
+
+class ConcurrentGit:
+    """
+    Thread-safe front of a Git tree. Every client works through its own GitSession, which keeps its
+    own position in the tree; the tree itself is guarded by a readers-writer lock, so navigation,
+    lookups and history walks run concurrently while commits and branch creations run alone.
+    """
+    __slots__ = ["git", "lock"]
+
+    def __init__(self, git: Optional[Git] = None) -> None:
         """
-        Check out any commit in the tree, moving the current selected branch to that commit's branch.
-        If the commit is found, change the current selected branch to be the parent branch of the commit.
-        If no such commit exists, raise an exception.
+        Construct a thread-safe facade over a Git tree.
 
-        :param message: Commit message to look for.
+        :param git: tree to share; a new empty one by default. It must not be used directly anymore.
+        :return: None.
         """
-        existing_commit = self.find_commit(self.start, message)
-        if existing_commit is not None:
-            self.current_branch = existing_commit[0]
-            self.selected_commit = existing_commit[1]
-            return
+        self.git = git if git is not None else Git()
+        self.lock = RWLock()
 
-        raise Exception("Commit is not existent")
+    def session(self) -> GitSession:
+        """
+        Open a session positioned where the shared Git object is.
 
-    def checkout_branch(self, name) -> None:
+        :return: new session.
         """
-        Check out a tree branch, and move the working commit to the last commit on the branch.
-        If the branch with the given name already exist, change the current branch to be that one, and change the current
-        commit to be the last commit on the branch. If branch does not exist and current working commit does not have a
-        branch, then create a branch from that commit.
+        self.lock.acquire_read()
+        try:
+            return GitSession(self, self.git.worktree())
+        finally:
+            self.lock.release_read()
+
+    def save(self, path: str) -> None:
+        """
+        Write the tree to a snapshot file (see Git.save), blocking writers meanwhile.
+
+        :param path: path of the file to write.
+        :return: None.
+        """
+        self.lock.acquire_read()
+        try:
+            self.git.save(path)
+        finally:
+            self.lock.release_read()
+
+
+class GitSession:
+    """
+    One client's cursor on a ConcurrentGit tree, offering the Git operations under the tree's lock.
+    A session keeps its own selected commit, current branch and visited branches; it is meant to
+    be used by one thread at a time. A commit fails, as Git.commit does, if another session
+    extended the branch since this one moved to its tip. Long audits can run on a snapshot instead
+    of holding the read lock: writers only ever add nodes, which a GitSnapshot does not see.
+    """
+    __slots__ = ["_lock", "_git"]
+
+    def __init__(self, tree: ConcurrentGit, git: Git) -> None:
+        """
+        Construct a session; use ConcurrentGit.session instead.
+
+        :param tree: the shared tree.
+        :param git: worktree of the tree holding the position of this session.
+        :return: None.
+        """
+        self._lock = tree.lock
+        self._git = git
+
+    @property
+    def start(self) -> GitBranch:
+        """
+        Original/main branch of the tree, to start find_branch and find_commit from.
+
+        :return: the main branch.
+        """
+        return self._git.start
+
+    @property
+    def selected_commit(self) -> Optional[Commit]:
+        """
+        Commit selected by this session.
+
+        :return: selected commit node, or None.
+        """
+        return self._git.selected_commit
+
+    def checkout_branch(self, name: str) -> None:
+        """
+        Check out a branch (see Git.checkout_branch). Existing branches are checked out under the
+        read lock; the write lock is only taken to create one.
 
         :param name: The branch name to look for.
         :return: None.
         """
-        existing_branch = self.find_branch(self.start, name)
+        self._lock.acquire_read()
+        try:
+            # Branches are never removed, so an existing one can be checked out by a reader.
+            if name in self._git._branches:
+                return self._git.checkout_branch(name)
+        finally:
+            self._lock.release_read()
+        self._lock.acquire_write()
+        try:
+            self._git.checkout_branch(name)
+        finally:
+            self._lock.release_write()
 
-        # Branch exists
-        if existing_branch is not None:
-            self.current_branch = existing_branch
-            self.selected_commit = existing_branch.get_last_commit()
-            self.visited_branches.clear()
+
+# Git operations offered by GitSession, and whether they modify the tree (and need the write lock).
+SESSION_OPERATIONS = {
+    "get_current_commit": False,
+    "get_current_branch_name": False,
+    "backwards": False,
+    "forward": False,
+    "checkout_commit": False,
+    "list_branches": False,
+    "is_ancestor": False,
+    "merge_base": False,
+    "distance": False,
+    "log": False,
+    "log_page": False,
+    "find_branch": False,
+    "find_commit": False,
+    "grep": False,
+    "snapshot": False,
+    "commit": True,
+    "commit_many": True,
+    "merge": True,
+}
+
+
+def _locked_method(operation: str, write: bool) -> Callable:
+    """
+    Build the GitSession version of a Git method.
+
+    :param operation: name of the method.
+    :param write: True if the method modifies the tree.
+    :return: method running the Git one under the read or write lock.
+    """
+    def locked(self, *args, **kwargs):
+        lock = self._lock
+        if write:
+            lock.acquire_write()
+            try:
+                return getattr(self._git, operation)(*args, **kwargs)
+            finally:
+                lock.release_write()
+        lock.acquire_read()
+        try:
+            return getattr(self._git, operation)(*args, **kwargs)
+        finally:
+            lock.release_read()
+
+    locked.__name__ = operation
+    locked.__doc__ = getattr(Git, operation).__doc__
+    return locked
+
+
+for _operation, _write in SESSION_OPERATIONS.items():
+    setattr(GitSession, _operation, _locked_method(_operation, _write))
+del _operation, _write
+
+
+class _DurabilityBatch:
+    """
+    Makes the journal records of concurrent AsyncGit clients durable together: clients waiting in
+    the same event loop iteration share one write and one fsync, run in the default executor.
+    """
+    __slots__ = ["git", "_waiters", "_flushing"]
+
+    def __init__(self, git: Git) -> None:
+        """
+        Construct a batch with no waiting clients.
+
+        :param git: Git object whose journal is synced.
+        :return: None.
+        """
+        self.git = git
+        # Futures of the clients waiting for the next fsync.
+        self._waiters: List[asyncio.Future] = []
+        # True while a flushing task runs.
+        self._flushing = False
+
+    async def wait(self) -> None:
+        """
+        Wait until every record journaled so far is on disk.
+
+        :return: None.
+        """
+        if self.git._journal is None:
             return
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._waiters.append(future)
+        if not self._flushing:
+            self._flushing = True
+            loop.create_task(self._flush())
+        await future
 
-        # Trying to create a branch on an empty head (No commits on branch yet)
-        if self.selected_commit is None:
-            raise Exception("Branches cannot be created on empty commits")
+    async def _flush(self) -> None:
+        """
+        Sync the journal until no client waits anymore, one batch of waiters per fsync.
 
-        if self.selected_commit.children_branch is None:
-            self.selected_commit.children_branch = GitBranch(name, self.selected_commit)
-            self.current_branch = self.selected_commit.children_branch
-            self.selected_commit = self.selected_commit.children_branch.head
-            self.visited_branches.clear()
+        :return: None.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            while self._waiters:
+                # Let every client that is ready in this iteration join the batch.
+                await asyncio.sleep(0)
+                waiters, self._waiters = self._waiters, []
+                try:
+                    journal = self.git._journal
+                    # Records are only ever written from the loop thread, the fsync runs elsewhere.
+                    if journal is not None and journal.flush():
+                        await loop.run_in_executor(None, journal.fsync)
+                except Exception as error:
+                    for waiter in waiters:
+                        if not waiter.done():
+                            waiter.set_exception(error)
+                    continue
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_result(None)
+        finally:
+            self._flushing = False
 
-        else:
-            raise Exception("Can't create multiple branches based of same commit")
 
-    def find_branch(self, start: GitBranch, name: str) -> GitBranch | None:
+class AsyncGit:
+    """
+    asyncio front of a Git object for use from an event loop.
+
+    Constant and logarithmic time operations run directly. Tree walks (find_branch, find_commit,
+    log and log_page) yield to the event loop every `chunk` nodes, so a scan of a large history does not
+    stall other clients; they see the tree as it is when each node is reached. Commits and branch
+    creations are applied at once and, when the Git object has a journal, wait until their record
+    is durable: the writes of all clients waiting together are synced with a single fsync run in
+    an executor, so commit throughput grows with the number of concurrent clients. Open the
+    journal with a large group_size, so that no fsync runs on the event loop itself.
+    """
+    __slots__ = ["git", "chunk", "_batch"]
+
+    def __init__(self, git: Optional[Git] = None, chunk: int = 1024):
         """
-        Iteratively find branch on the tree.
+        Construct an asyncio front of a Git object.
+
+        :param git: Git object to serve; a new empty one by default.
+        :param chunk: number of nodes walked between two yields to the event loop.
+        :return: None.
+        """
+        if chunk < 1:
+            raise Exception("Chunk size must be at least 1")
+        self.git = git if git is not None else Git()
+        self.chunk = chunk
+        self._batch = _DurabilityBatch(self.git)
+
+    def worktree(self) -> AsyncGit:
+        """
+        Create an AsyncGit over a worktree of this tree (see Git.worktree), for one more client with
+        its own position. Its commits are batched with those of this object.
+
+        :return: new AsyncGit object.
+        """
+        worktree = AsyncGit.__new__(AsyncGit)
+        worktree.git = self.git.worktree()
+        worktree.chunk = self.chunk
+        worktree._batch = self._batch
+        return worktree
+
+    async def get_current_commit(self) -> Optional[str]:
+        """
+        Return the message of the selected commit (see Git.get_current_commit).
+
+        :return: message of the selected commit, or None if there is none.
+        """
+        return self.git.get_current_commit()
+
+    async def get_current_branch_name(self) -> Optional[str]:
+        """
+        Return the name of the current branch (see Git.get_current_branch_name).
+
+        :return: name of the current branch.
+        """
+        return self.git.get_current_branch_name()
+
+    async def commit(self, message: str) -> None:
+        """
+        Commit a message (see Git.commit), and wait until it is durable.
+
+        :param message: Message to be added to commit.
+        :return: None.
+        """
+        self.git.commit(message)
+        await self._batch.wait()
+
+    async def commit_many(self, messages: Iterable[str]) -> None:
+        """
+        Commit several messages (see Git.commit_many), and wait until they are durable.
+
+        :param messages: iterable of commit messages.
+        :return: None.
+        """
+        self.git.commit_many(messages)
+        await self._batch.wait()
+
+    async def merge(self, name: str, message: str) -> None:
+        """
+        Merge a branch into the current one (see Git.merge), and wait until it is durable.
+
+        :param name: name of the branch to merge.
+        :param message: Message of the merge commit.
+        :return: None.
+        """
+        self.git.merge(name, message)
+        await self._batch.wait()
+
+    async def backwards(self, parent: int = 0) -> None:
+        """
+        Move the selected commit back one commit (see Git.backwards).
+
+        :param parent: 0 to move to the first parent, n to move to the n-th merge parent.
+        :return: None.
+        """
+        self.git.backwards(parent)
+
+    async def forward(self) -> None:
+        """
+        Move the selected commit forward one commit (see Git.forward).
+
+        :return: None.
+        """
+        self.git.forward()
+
+    async def checkout_commit(self, message) -> None:
+        """
+        Check out a commit by message (see Git.checkout_commit).
+
+        :param message: message of the commit to check out.
+        :return: None.
+        """
+        self.git.checkout_commit(message)
+
+    async def checkout_branch(self, name: str) -> None:
+        """
+        Check out or create a branch (see Git.checkout_branch); a created branch is durable on return.
+
+        :param name: The branch name to look for.
+        :return: None.
+        """
+        created = name not in self.git._branches
+        self.git.checkout_branch(name)
+        if created:
+            await self._batch.wait()
+
+    async def list_branches(self) -> List[str]:
+        """
+        Return the names of all branches (see Git.list_branches).
+
+        :return: list of branch names, in creation order.
+        """
+        return self.git.list_branches()
+
+    async def is_ancestor(self, a: str | Commit, b: str | Commit) -> bool:
+        """
+        Tell whether `a` is an ancestor of `b` (see Git.is_ancestor).
+
+        :param a: commit node or message.
+        :param b: commit node or message.
+        :return: True if `a` is an ancestor of `b`.
+        """
+        return self.git.is_ancestor(a, b)
+
+    async def merge_base(self, a: str | Commit, b: str | Commit) -> Commit:
+        """
+        Return the closest common ancestor of `a` and `b` (see Git.merge_base).
+
+        :param a: commit node or message.
+        :param b: commit node or message.
+        :return: commit node of the merge base.
+        """
+        return self.git.merge_base(a, b)
+
+    async def distance(self, a: str | Commit, b: str | Commit) -> int:
+        """
+        Return the number of commits between `a` and `b` (see Git.distance).
+
+        :param a: commit node or message.
+        :param b: commit node or message.
+        :return: number of commits between them.
+        """
+        return self.git.distance(a, b)
+
+    async def log(self, n: int, start: str | Commit | None = None) -> List[Commit]:
+        """
+        Return up to `n` commits of history (see Git.log), yielding to the event loop every chunk.
+
+        :param n: maximum number of commits to return.
+        :param start: commit node or message to start from; defaults to the selected commit.
+        :return: list of commit nodes, newest first.
+        """
+        return await self._take(self.git.history(start), n)
+
+    async def log_page(self, n: int, start: str | Commit | None = None,
+                       page_token: Optional[str] = None) -> Tuple[List[Commit], Optional[str]]:
+        """
+        Return a page of history and the next page token (see Git.log_page), yielding to the event
+        loop every chunk.
+
+        :param n: maximum number of commits to return.
+        :param start: commit node or message to start from; defaults to the selected commit.
+        :param page_token: token of the page to return, or None for the first page.
+        :return: (list of commit nodes, token of the next page or None).
+        """
+        cursor = self.git.history(start, page_token)
+        return await self._take(cursor, n), cursor.token()
+
+    async def _take(self, cursor: HistoryCursor, n: int) -> List[Commit]:
+        """
+        Take up to `n` commits from a history cursor, yielding to the event loop every chunk.
+
+        :param cursor: cursor to advance.
+        :param n: maximum number of commits to take.
+        :return: list of commit nodes.
+        """
+        commits = []
+        while len(commits) < n:
+            chunk = list(islice(cursor, min(n - len(commits), self.chunk)))
+            commits += chunk
+            if len(chunk) < self.chunk or len(commits) == n:
+                break
+            await asyncio.sleep(0)
+        return commits
+
+    async def grep(self, query: str) -> List[Commit]:
+        """
+        Find the commits matching a keyword query (see Git.grep).
+
+        :param query: query string.
+        :return: matching commits, in the order they were added to the history.
+        """
+        return self.git.grep(query)
+
+    async def snapshot(self) -> GitSnapshot:
+        """
+        Take a read-only point-in-time view of the tree (see Git.snapshot).
+
+        :return: view of the tree as it is now.
+        """
+        return self.git.snapshot()
+
+    async def find_branch(self, start: GitBranch, name: str) -> GitBranch | None:
+        """
+        Find a branch (see Git.find_branch), yielding to the event loop every chunk of nodes.
 
         :param start: Current tree to look for in.
         :param name: Name of branch to look for.
         :return: Branch reference if found, else None.
         """
-        next_trees = [start]
-        while next_trees:
-            start = next_trees.pop()
-            if start.name == name:
-                return start
-            node = start.get_first_commit()
-            while node:
-                if node.children_branch:
-                    next_trees.append(node.children_branch)
-                node = node.next
-        return
+        for count, (branch, node) in enumerate(self.git._walk(start), 1):
+            if node is None and branch.name == name:
+                return branch
+            if count % self.chunk == 0:
+                await asyncio.sleep(0)
+        return None
 
-    def find_commit(self, start: GitBranch, message: str) -> Tuple[GitBranch, Node] | None:
+    async def find_commit(self, start: GitBranch, message: str) -> Tuple[GitBranch, Node] | None:
         """
-        Iteratively find a commit based on the given commit message.
+        Find a commit (see Git.find_commit), yielding to the event loop every chunk of nodes.
 
         :param start: Current branch to look for commit
         :param message: Commit message to look for
         :return: If found commit, return branch and commit node, else None
         """
-        next_trees = [start]
-        while next_trees:
-            start = next_trees.pop()
-            node = start.get_first_commit()
-            while node:
-                if node.value == message:
-                    return start, node
-                if node.children_branch:
-                    next_trees.append(node.children_branch)
-                node = node.next
-        return
\ No newline at end of file
+        key = self.git._key(message)
+        for count, (branch, node) in enumerate(self.git._walk(start), 1):
+            if node is not None and node.value == key:
+                return branch, node
+            if count % self.chunk == 0:
+                await asyncio.sleep(0)
+        return None
\ No newline at end of file
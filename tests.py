@@ -1,13 +1,33 @@
 
-from main import DLL, Node, Git
+from main import DLL, Node, Commit, Git, GitBranch, CompactDLL, Cursor, MessagePool, CompressedMessage, \
+    Hook, LatencyStats, ConcurrentGit, AsyncGit, TextIndex, EXTEND_BATCH, _Snapshot
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from typing import TypeVar, List
+import asyncio
 import copy
+import gc
+import os
+import random
+import sys
+import tempfile
+import threading
+import tracemalloc
 import unittest
 
 # for more information on typehinting, check out https://docs.python.org/3/library/typing.html
 T = TypeVar("T")  # represents generic type
 
 
+def ends_with_five_in_c1(message: str) -> bool:
+    """
+    Search predicate used by GitTests.test_search; defined at module level so worker processes can
+    unpickle it.
+    """
+    return message.startswith("c1") and message.endswith("5")
+
+
 class DLLTests(unittest.TestCase):
 
     def check_dll(self, expected: List[T], dll: DLL, multilevel: bool = False):
@@ -223,6 +243,65 @@ class DLLTests(unittest.TestCase):
         dll.list_to_dll(source)
         self.check_dll(source, dll)  # if failure here, see (3)
 
+        # (4) any iterable, including a generator, can be used as source
+        dll.list_to_dll(i * i for i in range(5))
+        self.check_dll([0, 1, 4, 9, 16], dll)  # if failure here, see (4)
+
+    def test_extend(self):
+
+        # (1) extend empty DLL with empty iterables
+        dll = DLL()
+        dll.extend([])
+        dll.extendleft(iter(()))
+        self.check_dll([], dll)  # if failure here, see (1)
+
+        # (2) extend on back keeps iteration order, extendleft reverses it
+        dll.extend(i for i in range(3))
+        self.check_dll([0, 1, 2], dll)  # if failure here, see (2)
+        dll.extendleft(range(3, 6))
+        self.check_dll([5, 4, 3, 0, 1, 2], dll)  # if failure here, see (2)
+        dll.extend(range(6, 8), back=True)
+        dll.extend([8], back=False)
+        self.check_dll([8, 5, 4, 3, 0, 1, 2, 6, 7], dll)  # if failure here, see (2)
+
+        # (3) extendleft on an empty DLL matches pushing to the front one by one
+        dll, pushed = DLL(), DLL()
+        dll.extendleft(range(10))
+        for i in range(10):
+            pushed.push(i, back=False)
+        self.check_dll(pushed.dll_to_list(), dll)  # if failure here, see (3)
+
+        # (4) indexed DLLs index extended values in list order
+        dll = DLL(indexed=True)
+        dll.extend([1, 2, 1])
+        dll.extendleft([2, 1])
+        self.check_dll([1, 2, 1, 2, 1], dll)  # if failure here, see (4)
+        self.assertEqual(3, len(dll.find_all(1)))
+        self.assertIs(dll.head, dll.find(1))
+        self.assertIs(dll.tail, dll.find_all(1)[-1])
+        dll.list_to_dll([3])
+        self.assertIsNone(dll.find(1))
+        self.assertIs(dll.head, dll.find(3))
+
+        # (5) the source runs with the garbage collector as the caller left it, which is restored
+        #     afterwards; sources longer than one batch keep their order
+        def source(n):
+            for i in range(n):
+                states.append(gc.isenabled())
+                yield i
+
+        for enabled in (True, False):
+            states = []
+            (gc.enable if enabled else gc.disable)()
+            try:
+                dll = DLL()
+                dll.extend(source(3 * EXTEND_BATCH))
+                self.assertEqual(enabled, gc.isenabled())  # if failure here, see (5)
+            finally:
+                gc.enable()
+            self.assertEqual({enabled}, set(states))  # if failure here, see (5)
+            self.assertEqual(list(range(3 * EXTEND_BATCH)), dll.dll_to_list())
+
     def test_dll_to_list(self):
 
         # (1) create list from empty DLL
@@ -526,6 +605,48 @@ class DLLTests(unittest.TestCase):
         # (6) sanity check empty list after all deletions
         self.check_dll([], dll)  # if failure here, see (6)
 
+        # (7) remove all adjacent duplicates, including head and tail, in one call
+        dll = DLL()
+        dll.list_to_dll([7, 7, 1, 7, 7, 2, 7])
+        count = dll.remove_all(7)
+        self.assertEqual(5, count)
+        self.check_dll([1, 2], dll)  # if failure here, see (7)
+
+    def test_remove_if(self):
+
+        # (1) remove_if on empty DLL
+        dll = DLL()
+        count = dll.remove_if(lambda value: True)
+        self.assertEqual(0, count)
+        self.check_dll([], dll)  # if failure here, see (1)
+
+        # (2) remove_if matching nothing
+        dll = DLL()
+        dll.list_to_dll(list(range(10)))
+        count = dll.remove_if(lambda value: value > 100)
+        self.assertEqual(0, count)
+        self.check_dll(list(range(10)), dll)  # if failure here, see (2)
+
+        # (3) remove_if matching several values, including head and tail
+        count = dll.remove_if(lambda value: value % 3 == 0)
+        self.assertEqual(4, count)
+        self.check_dll([1, 2, 4, 5, 7, 8], dll)  # if failure here, see (3)
+
+        # (4) remove_if matching everything
+        count = dll.remove_if(lambda value: True)
+        self.assertEqual(6, count)
+        self.check_dll([], dll)  # if failure here, see (4)
+
+        # (5) predicate is called exactly once per value
+        dll = DLL(indexed=True)
+        dll.list_to_dll([1, 2, 3, 2, 1])
+        seen = []
+        count = dll.remove_if(lambda value: seen.append(value) or value == 2)
+        self.assertEqual(2, count)
+        self.assertEqual([1, 2, 3, 2, 1], seen)
+        self.check_dll([1, 3, 1], dll)  # if failure here, see (5)
+        self.assertEqual([], dll.find_all(2))
+
     def test_reverse(self):
 
         # (1) reverse empty DLL
@@ -572,6 +693,261 @@ class DLLTests(unittest.TestCase):
         self.assertIs(new_head, old_tail)
         self.assertIs(new_tail, old_head)
 
+    def test_lazy_reverse(self):
+
+        # (1) reverse flips orientation without touching any Node
+        dll = DLL(lazy_reverse=True)
+        dll.list_to_dll(range(10))
+        old_head, old_tail = dll.head, dll.tail
+        dll.reverse()
+        self.assertTrue(dll.is_reversed())
+        self.assertIs(old_head, dll.head)
+        self.assertIs(old_tail, dll.tail)
+        self.assertEqual(list(range(9, -1, -1)), dll.dll_to_list())
+        self.assertEqual(list(range(9, -1, -1)), list(dll))
+        self.assertEqual(list(range(10)), list(reversed(dll)))
+
+        # (2) materialize produces the same chain as an eager reverse
+        eager = DLL()
+        eager.list_to_dll(range(10))
+        eager.reverse()
+        dll.materialize()
+        self.assertFalse(dll.is_reversed())
+        self.check_dll(eager.dll_to_list(), dll)  # if failure here, see (2)
+        self.assertIs(old_tail, dll.head)
+        self.assertIs(old_head, dll.tail)
+
+        # (3) every operation on a lazily reversed DLL matches an eagerly reversed one
+        for indexed in (False, True):
+            lazy, eager = DLL(indexed=indexed, lazy_reverse=True), DLL(indexed=indexed)
+            for dll in (lazy, eager):
+                dll.list_to_dll([i % 5 for i in range(20)])
+            for step in range(40):
+                for dll in (lazy, eager):
+                    if step % 7 == 0:
+                        dll.reverse()
+                    dll.push(step % 6, step % 3 == 0)
+                    if step % 4 == 0:
+                        dll.pop(step % 8 == 0)
+                    if step % 9 == 0:
+                        dll.remove(step % 5)
+                    if step % 13 == 0:
+                        dll.extend([1, 2], step % 2 == 0)
+                self.assertEqual(eager.dll_to_list(), lazy.dll_to_list())
+                self.assertEqual(str(eager), str(lazy))
+                nodes = self._nodes(lazy)
+                if lazy.is_reversed():
+                    nodes.reverse()
+                for val in range(6):
+                    self.assertEqual([n for n in nodes if n.value == val], lazy.find_all(val))
+                    self.assertIs(next((n for n in nodes if n.value == val), None), lazy.find(val))
+                    self.assertEqual(len(eager.find_all(val)), len(lazy.find_all(val)))
+            self.assertEqual(eager.remove_all(1), lazy.remove_all(1))
+            seen_eager, seen_lazy = [], []
+            eager.remove_if(lambda value: seen_eager.append(value) or value == 2)
+            lazy.remove_if(lambda value: seen_lazy.append(value) or value == 2)
+            self.assertEqual(seen_eager, seen_lazy)
+            lazy.materialize()
+            self.check_dll(eager.dll_to_list(), lazy)  # if failure here, see (3)
+
+    def test_indexed(self):
+
+        # (1) indexed and plain DLLs agree on push, pop and find in every position
+        dll, plain = DLL(indexed=True), DLL()
+        self.assertTrue(dll.is_indexed())
+        self.assertFalse(plain.is_indexed())
+        for i in range(40):
+            dll.push(i % 7, i % 3 != 0)
+            plain.push(i % 7, i % 3 != 0)
+        dll.pop()
+        plain.pop()
+        dll.pop(back=False)
+        plain.pop(back=False)
+        self.check_dll(plain.dll_to_list(), dll)  # if failure here, see (1)
+        for val in range(8):
+            self.assertEqual([n.value for n in plain.find_all(val)], [n.value for n in dll.find_all(val)])
+            self.assertEqual(dll.find_all(val), [n for n in self._nodes(dll) if n.value == val])
+            found = dll.find(val)
+            self.assertIs(found, next((n for n in self._nodes(dll) if n.value == val), None))
+
+        # (2) remove and remove_all keep the index in list order
+        lst = plain.dll_to_list()
+        for val in [3, 3, 0, 6, 331]:
+            self.assertEqual(plain.remove(val), dll.remove(val))
+            if val in lst:
+                lst.remove(val)
+            self.check_dll(lst, dll)  # if failure here, see (2)
+        self.assertEqual(plain.remove_all(5), dll.remove_all(5))
+        lst = [x for x in lst if x != 5]
+        self.check_dll(lst, dll)  # if failure here, see (2)
+        self.assertEqual([], dll.find_all(5))
+        self.assertIsNone(dll.find(5))
+
+        # (3) reverse flips the order of every value chain
+        dll.reverse()
+        lst.reverse()
+        self.check_dll(lst, dll)  # if failure here, see (3)
+        for val in range(7):
+            self.assertEqual(dll.find_all(val), [n for n in self._nodes(dll) if n.value == val])
+
+        # (4) list_to_dll rebuilds the index from scratch
+        dll.list_to_dll([1, 2, 1])
+        self.check_dll([1, 2, 1], dll)  # if failure here, see (4)
+        self.assertIs(dll.head, dll.find(1))
+        self.assertEqual([dll.head, dll.tail], dll.find_all(1))
+        self.assertIsNone(dll.find(4))
+
+    def test_iteration(self):
+
+        # (1) protocols on an empty DLL
+        dll = DLL()
+        self.assertEqual(0, len(dll))
+        self.assertEqual([], list(dll))
+        self.assertEqual([], list(reversed(dll)))
+        self.assertNotIn(0, dll)
+
+        # (2) protocols on a longer DLL, plain and indexed
+        for indexed in (False, True):
+            dll = DLL(indexed=indexed)
+            dll.list_to_dll([3, 1, 4, 1, 5])
+            self.assertEqual(5, len(dll))
+            self.assertEqual([3, 1, 4, 1, 5], list(dll))
+            self.assertEqual([5, 1, 4, 1, 3], list(reversed(dll)))
+            self.assertIn(4, dll)
+            self.assertNotIn(331, dll)
+            dll.pop()
+            self.assertEqual(4, len(dll))
+            self.assertNotIn(5, dll)
+
+        # (3) iteration is lazy: stopping early does not walk the rest of the DLL
+        dll = DLL()
+        dll.list_to_dll(range(10))
+        dll.tail.prev.next = None  # detach tail; a full walk would never reach it
+        self.assertEqual([0, 1, 2], [value for _, value in zip(range(3), dll)])
+
+        # (4) cursors resume where the previous traversal stopped
+        dll = DLL()
+        dll.list_to_dll(range(10))
+        cursor = dll.cursor()
+        self.assertEqual([0, 1, 2], [value for _, value in zip(range(3), cursor)])
+        self.assertEqual(3, cursor.node.value)
+        self.assertEqual([3, 4], [value for _, value in zip(range(2), cursor)])
+        self.assertEqual([5, 6, 7, 8, 9], list(cursor))
+        self.assertTrue(cursor.exhausted())
+        self.assertIsNone(cursor.advance())
+
+        # (5) cursors start from any Node, in either direction
+        middle = dll.find(4)
+        self.assertEqual([4, 3, 2, 1, 0], list(dll.cursor(middle, reverse=True)))
+        cursor = Cursor(middle)
+        self.assertIs(middle, cursor.advance())
+        self.assertEqual(5, cursor.node.value)
+        self.assertEqual([9, 8], [value for _, value in zip(range(2), dll.cursor(reverse=True))])
+
+    def _nodes(self, dll: DLL) -> List[Node]:
+        """
+        Collect the Nodes of a DLL by walking `next` references from head.
+        Used as helper function in testcases. Not an actual testcase itself.
+
+        :param dll: DLL to walk.
+        :return: list of Nodes in head to tail order.
+        """
+        nodes, node = [], dll.head
+        while node is not None:
+            nodes.append(node)
+            node = node.next
+        return nodes
+
+
+class CompactDLLTests(unittest.TestCase):
+
+    def check_compact(self, expected: List[T], dll: CompactDLL):
+        """
+        Assert links of a CompactDLL are consistent in both directions and hold `expected`.
+        Used as helper function in testcases. Not an actual testcase itself.
+
+        :param expected: list of expected values in dll
+        :param dll: CompactDLL to be validated
+        :return: None.
+        """
+        self.assertEqual(len(expected), dll.size)
+        self.assertEqual(expected, dll.dll_to_list())
+        backwards, handle = [], dll.tail
+        while handle != -1:
+            backwards.append(dll.value(handle))
+            handle = dll._prev[handle]
+        self.assertEqual(expected[::-1], backwards)
+        self.assertEqual(len(expected) == 0, dll.empty())
+
+    def test_push_pop(self):
+        dll, lst = CompactDLL(), []
+        dll.pop()
+        self.check_compact([], dll)
+        for i in range(30):
+            dll.push(i, i % 2 == 0)
+            if i % 2 == 0:
+                lst.append(i)
+            else:
+                lst.insert(0, i)
+            self.check_compact(lst, dll)
+        for i in range(30):
+            dll.pop(i % 3 != 0)
+            lst.pop(-1 if i % 3 != 0 else 0)
+            self.check_compact(lst, dll)
+
+        # freed slots are reused before the arrays grow
+        dll.list_to_dll(range(5))
+        dll.pop(back=False)
+        dll.push(9)
+        self.assertEqual(5, len(dll._values))
+        self.check_compact([1, 2, 3, 4, 9], dll)
+
+    def test_find_remove(self):
+        dll = CompactDLL()
+        dll.list_to_dll([0, 1, 2, 1, 0, 3])
+        self.assertEqual(0, dll.value(dll.find(0)))
+        self.assertEqual(dll.head, dll.find(0))
+        self.assertIsNone(dll.find(331))
+        self.assertEqual([1, 3], dll.find_all(1))
+        self.assertEqual([], dll.find_all(331))
+
+        self.assertTrue(dll.remove(1))
+        self.assertFalse(dll.remove(331))
+        self.check_compact([0, 2, 1, 0, 3], dll)
+        self.assertEqual(2, dll.remove_all(0))
+        self.check_compact([2, 1, 3], dll)
+        self.assertEqual(2, dll.remove_if(lambda value: value < 3))
+        self.check_compact([3], dll)
+        self.assertEqual(1, dll.remove_all(3))
+        self.check_compact([], dll)
+
+    def test_reverse(self):
+        dll = CompactDLL()
+        dll.reverse()
+        self.check_compact([], dll)
+        dll.list_to_dll(list(range(10)))
+        dll.reverse()
+        self.check_compact(list(range(9, -1, -1)), dll)
+        dll.push(-1)
+        dll.push(10, back=False)
+        dll.remove(5)
+        self.check_compact([10, 9, 8, 7, 6, 4, 3, 2, 1, 0, -1], dll)
+        expected = DLL()
+        expected.list_to_dll([10, 9, 8, 7, 6, 4, 3, 2, 1, 0, -1])
+        self.assertEqual(str(expected), str(dll))
+
+    def test_iteration(self):
+        dll = CompactDLL()
+        self.assertEqual(0, len(dll))
+        self.assertEqual([], list(dll))
+        dll.list_to_dll([3, 1, 4])
+        dll.push(1, back=False)
+        self.assertEqual(4, len(dll))
+        self.assertEqual([1, 3, 1, 4], list(dll))
+        self.assertEqual([4, 1, 3, 1], list(reversed(dll)))
+        self.assertIn(3, dll)
+        self.assertNotIn(331, dll)
+
 
 class GitTests(unittest.TestCase):
     def test_basic_commit(self):
@@ -786,6 +1162,33 @@ class GitTests(unittest.TestCase):
         self.assertEqual(git.get_current_commit(), "main_first_commit")
         self.assertEqual(git.get_current_branch_name(), "main")
 
+        # Registry lists every branch in creation order and agrees with the tree walk
+        self.assertEqual(git.list_branches(), ["main", "second_branch", "third_branch", "fourth_branch"])
+        for branch in branches:
+            git.checkout_branch(branch)
+            self.assertIs(git.current_branch, git.find_branch(git.start, branch))
+
+        # Several branches can be created from the same commit
+        git.checkout_commit("main_third_commit")
+        git.checkout_branch("fifth_branch")
+        git.commit("fifth_branch_first_commit")
+        self.assertEqual(5, len(git.list_branches()))
+        fork = git.find_commit(git.start, "main_third_commit")[1]
+        self.assertEqual(["fifth_branch", "second_branch"], [branch.name for branch in fork.child_branches()])
+        git.backwards()
+        self.assertEqual("main_third_commit", git.get_current_commit())
+        git.forward()
+        self.assertEqual("fifth_branch_first_commit", git.get_current_commit())
+        git.checkout_branch("second_branch")
+        self.assertEqual("second_branch_fourth_commit", git.get_current_commit())
+
+        # Failed branch creation does not register anything
+        empty = Git()
+        self.assertRaises(Exception, empty.checkout_branch, "sixth_branch")
+        self.assertEqual(["main"], empty.list_branches())
+        self.assertIsNone(empty.find_branch(empty.start, "sixth_branch"))
+        self.assertEqual("main", empty.get_current_branch_name())
+
     # Test checking out commits - Not included for grading
     def test_basic_checkout_commit(self):
         git = Git()
@@ -810,7 +1213,1263 @@ class GitTests(unittest.TestCase):
         self.assertEqual(git.get_current_commit(),  "Fourth commit")
         git.checkout_commit("Third commit")
         self.assertEqual(git.get_current_commit(),  "Third commit")
-        
+
+    def test_empty_branch(self):
+        # A branch without commits is an empty DLL; it must still be found and navigated
+        git = Git()
+        git.commit("first")
+        git.checkout_branch("empty")
+        self.assertEqual(0, len(git.current_branch))
+        self.assertIs(git.current_branch, git.find_branch(git.start, "empty"))
+        git.backwards()
+        self.assertEqual(git.get_current_commit(), "first")
+        git.forward()
+        self.assertIsNone(git.get_current_commit())
+        self.assertEqual(git.get_current_branch_name(), "empty")
+
+    def build_tree(self, commits: int, seed: int = 331, fan_out: bool = False) -> Git:
+        """
+        Build a Git tree with `commits` uniquely named commits ("c0", "c1", ...) spread over randomly forked branches.
+        Used as helper function in testcases. Not an actual testcase itself.
+
+        :param commits: number of commits to create.
+        :param seed: seed of the random generator deciding where branches are forked.
+        :param fan_out: fork a new branch even from commits that already have one.
+        :return: the Git object.
+        """
+        rng = random.Random(seed)
+        git = Git()
+        git.commit("c0")
+        for i in range(1, commits):
+            if rng.random() < 0.3:
+                git.checkout_commit(f"c{rng.randrange(i)}")
+                if fan_out or git.selected_commit.children_branch is None:
+                    git.checkout_branch(f"b{i}")
+                else:
+                    git.checkout_branch(git.selected_commit.children_branch.name)
+            git.commit(f"c{i}")
+        return git
+
+    def test_ancestry(self):
+        git = self.build_tree(120)
+        nodes = [git.find_commit(git.start, f"c{i}")[1] for i in range(120)]
+
+        def history(node):
+            result = []
+            while node is not None:
+                result.append(node)
+                node = node.prev if node.prev is not None else git.find_commit(git.start, node.value)[0].parent_node
+            return result
+
+        histories = [history(node) for node in nodes]
+        for i, node in enumerate(nodes):
+            self.assertEqual(len(histories[i]) - 1, node.generation)
+
+        for i in range(0, 120, 3):
+            for j in range(0, 120, 2):
+                a, b = nodes[i], nodes[j]
+                self.assertEqual(a in histories[j], git.is_ancestor(a, b))
+                expected = next(n for n in histories[i] if n in histories[j])
+                self.assertIs(expected, git.merge_base(a, b))
+                self.assertIs(expected, git.merge_base(b.value, a.value))
+                self.assertEqual(histories[i].index(expected) + histories[j].index(expected), git.distance(a, b))
+
+        self.assertTrue(git.is_ancestor("c0", "c0"))
+        self.assertRaises(Exception, git.merge_base, "c0", "missing")
+
+    def test_commit_many(self):
+        git, looped = Git(), Git()
+
+        # (1) equivalent to committing one message at a time, across branches and duplicates
+        git.commit_many(f"c{i}" for i in range(5))
+        looped_messages = [f"c{i}" for i in range(5)]
+        for message in looped_messages:
+            looped.commit(message)
+        for g in (git, looped):
+            g.checkout_commit("c2")
+            g.checkout_branch("feature")
+        git.commit_many(["f0", "c1", "f1"])
+        for message in ["f0", "c1", "f1"]:
+            looped.commit(message)
+        self.assertEqual("f1", git.get_current_commit())
+        self.assertEqual(self.tree_state(looped), self.tree_state(git))
+        for message in ["c0", "c1", "c4", "f0", "f1"]:
+            git.checkout_commit(message)
+            looped.checkout_commit(message)
+            self.assertEqual(looped.get_current_branch_name(), git.get_current_branch_name())
+            self.assertEqual(looped.selected_commit.generation, git.selected_commit.generation)
+
+        # (2) an empty iterable changes nothing
+        git.checkout_branch("main")
+        git.commit_many([])
+        self.assertEqual("c4", git.get_current_commit())
+
+        # (3) committing in the middle of the timeline raises before consuming anything
+        git.backwards()
+        messages = iter(["x"])
+        self.assertRaises(Exception, git.commit_many, messages)
+        self.assertEqual(["x"], list(messages))
+
+        # (4) the first commits of a new branch
+        git.forward()
+        git.checkout_branch("fresh")
+        git.commit_many(["n0", "n1"])
+        self.assertEqual("n1", git.get_current_commit())
+        git.backwards()
+        git.backwards()
+        self.assertEqual("c4", git.get_current_commit())
+        self.assertEqual(["n1", "n0", "c4"], [n.value for n in git.log(3, "n1")])
+
+    def test_log(self):
+        git = Git()
+        self.assertEqual([], git.log(5))
+        for commit in ["a", "b", "c"]:
+            git.commit(commit)
+        git.checkout_branch("feature")
+        self.assertEqual(["c", "b"], [node.value for node in git.log(2)])
+        git.commit("d")
+        git.commit("e")
+
+        self.assertEqual(["e", "d", "c", "b", "a"], [node.value for node in git.log(10)])
+        self.assertEqual(["e", "d", "c"], [node.value for node in git.log(3)])
+        self.assertEqual([], git.log(0))
+        self.assertEqual(["b", "a"], [node.value for node in git.log(5, "b")])
+        self.assertEqual([4, 3, 2, 1, 0], [node.generation for node in git.log(5)])
+
+        git.backwards()
+        git.backwards()
+        self.assertEqual(["c", "b"], [node.value for node in git.log(2)])
+        self.assertEqual(0, git.distance("c", "c"))
+        self.assertEqual(2, git.distance("a", "c"))
+        self.assertEqual(4, git.distance("e", "a"))
+
+    def build_dag(self, commits: int, seed: int = 23) -> Git:
+        """
+        Build a Git history with `commits` uniquely named commits ("c0", "c1", ...) spread over randomly
+        forked branches that randomly merge each other.
+        Used as helper function in testcases. Not an actual testcase itself.
+
+        :param commits: number of commits to create.
+        :param seed: seed of the random generator deciding where branches are forked and merged.
+        :return: the Git object.
+        """
+        rng = random.Random(seed)
+        git = Git()
+        git.commit("c0")
+        for i in range(1, commits):
+            roll = rng.random()
+            if roll < 0.2:
+                git.checkout_commit(f"c{rng.randrange(i)}")
+                git.checkout_branch(f"b{i}")
+            elif roll < 0.4:
+                git.checkout_branch(rng.choice(git.list_branches()))
+                merged = rng.choice(git.list_branches())
+                if merged != git.get_current_branch_name():
+                    try:
+                        git.merge(merged, f"c{i}")
+                        continue
+                    except Exception:
+                        pass
+            git.commit(f"c{i}")
+        return git
+
+    def test_merges(self):
+        # (1) a merge commit has the selected commit and the tip of the merged branch as parents
+        git = Git()
+        for commit in ["a", "b", "c"]:
+            git.commit(commit)
+        git.checkout_commit("b")
+        git.checkout_branch("feature")
+        git.commit("f0")
+        git.commit("f1")
+        git.checkout_branch("main")
+        git.merge("feature", "m")
+        merge = git.selected_commit
+        self.assertEqual("m", git.get_current_commit())
+        self.assertEqual(["c", "f1"], [node.value for node in merge.parents()])
+        # c and f0 rank the same; the first parent was reached first.
+        self.assertEqual(["m", "f1", "c", "f0", "b", "a"], [node.value for node in git.log(10)])
+        self.assertTrue(git.is_ancestor("f0", "m"))
+        self.assertFalse(git.is_ancestor("c", "f1"))
+        self.assertIs(git.find_commit(git.start, "f1")[1], git.merge_base("f1", "m"))
+        self.assertEqual("b", git.merge_base("c", "f1").value)
+        self.assertEqual(2, git.distance("f0", "m"))
+        self.assertEqual(3, git.distance("c", "f1"))
+
+        # (2) nothing left to merge, unknown branches and merging in the middle of the timeline
+        self.assertRaises(Exception, git.merge, "feature", "again")
+        self.assertRaises(Exception, git.merge, "main", "self")
+        self.assertRaises(Exception, git.merge, "missing", "x")
+        git.checkout_branch("feature")
+        git.commit("f2")
+        git.backwards()
+        self.assertRaises(Exception, git.merge, "main", "x")
+        git.forward()
+        git.merge("main", "back")
+        self.assertEqual(["back", "f2", "m", "f1", "c", "f0", "b", "a"], [node.value for node in git.log(10)])
+
+        # (3) backwards follows any parent of a merge commit, and forward steps back into it
+        git.checkout_commit("m")
+        git.checkout_branch("main")
+        git.backwards(1)
+        self.assertEqual("f1", git.get_current_commit())
+        git.backwards()
+        self.assertEqual("f0", git.get_current_commit())
+        git.forward()
+        git.forward()
+        self.assertEqual("m", git.get_current_commit())
+        git.backwards()
+        self.assertEqual("c", git.get_current_commit())
+        self.assertRaises(Exception, git.backwards, 1)
+
+        # (4) random histories: every query agrees with a brute force walk of the parents
+        git = self.build_dag(300)
+        nodes = [git.find_commit(git.start, f"c{i}")[1] for i in range(300)]
+        self.assertTrue(sum(1 for node in nodes if node.merge_parents) > 20)
+
+        def ancestors(node):
+            depths, level = {node: 0}, [node]
+            while level:
+                following = []
+                for child in level:
+                    for parent in child.parents():
+                        if parent not in depths:
+                            depths[parent] = depths[child] + 1
+                            following.append(parent)
+                level = following
+            return depths
+
+        histories = [ancestors(node) for node in nodes]
+        for i, node in enumerate(nodes):
+            log = git.log(1000, node)
+            self.assertEqual(set(histories[i]), set(log))
+            self.assertEqual(len(histories[i]), len(log))
+            position = {commit: index for index, commit in enumerate(log)}
+            for commit in log:
+                self.assertTrue(all(position[parent] > position[commit] for parent in commit.parents()))
+        for i in range(0, 300, 7):
+            for j in range(0, 300, 5):
+                a, b = nodes[i], nodes[j]
+                self.assertEqual(a in histories[j], git.is_ancestor(a, b))
+                common = [node for node in histories[i] if node in histories[j]]
+                base = git.merge_base(a, b)
+                self.assertIn(base, common)
+                # No other common ancestor descends from the merge base.
+                self.assertFalse(any(node is not base and base in histories[nodes.index(node)] for node in common))
+                self.assertEqual(min(histories[i][node] + histories[j][node] for node in common), git.distance(a, b))
+
+        # (5) find_commit still visits every commit once, merges included
+        stats = LatencyStats()
+        git.add_hook(stats)
+        self.assertIsNone(git.find_commit(git.start, "missing"))
+        self.assertEqual(300, stats.report()["find_commit"]["visited_total"])
+        git.remove_hook(stats)
+
+        # (6) merges survive a snapshot round trip, whichever branch is materialized first
+        with tempfile.TemporaryDirectory() as directory:
+            snapshot = os.path.join(directory, "history.snap")
+            journal = os.path.join(directory, "history.journal")
+            git.save(snapshot)
+            for order in (range(300), range(299, -1, -1)):
+                loaded = Git.load(snapshot)
+                for i in order:
+                    node = loaded._resolve(f"c{i}")
+                    self.assertEqual([parent.value for parent in nodes[i].parents()],
+                                     [parent.value for parent in node.parents()])
+                    self.assertEqual(nodes[i].order(), node.order())
+
+            # (7) and a journal replay
+            git = Git()
+            git.open_journal(journal)
+            git.commit("a")
+            git.checkout_branch("feature")
+            git.commit("f0")
+            git.checkout_branch("main")
+            git.commit("b")
+            git.merge("feature", "m")
+            git.checkout_branch("feature")
+            git.commit("f1")
+            git.merge("main", "n")
+            git.close_journal()
+            recovered = Git.recover(snapshot + ".missing", journal)
+            self.assertEqual(self.tree_state(git), self.tree_state(recovered))
+            self.assertEqual(["n", "f1", "m", "f0", "b", "a"], [node.value for node in recovered.log(10, "n")])
+            recovered.close_journal()
+
+    def test_log_pages(self):
+        # (1) pages of a tree history, across branch boundaries
+        git = self.build_tree(100)
+        git.checkout_commit("c99")
+        expected = [node.value for node in git.log(1000)]
+        pages, token = [], None
+        while True:
+            page, token = git.log_page(7, page_token=token)
+            pages.append([node.value for node in page])
+            if token is None:
+                break
+            self.assertLessEqual(len(token), 100)
+        self.assertEqual(expected, [message for page in pages for message in page])
+        self.assertTrue(all(len(page) == 7 for page in pages[:-1]))
+        cursor = git.history("c0")
+        self.assertEqual(["c0"], [node.value for node in cursor])
+        self.assertIsNone(cursor.token())
+        self.assertEqual(([], None), Git().log_page(5))
+
+        # (2) pages of a DAG history resume the walk exactly, even from another (loaded) object
+        git = self.build_dag(300)
+        expected = list(git.history("c299"))
+        self.assertEqual(len(expected), len(set(expected)))
+        with tempfile.TemporaryDirectory() as directory:
+            snapshot = os.path.join(directory, "history.snap")
+            git.save(snapshot)
+            loaded = Git.load(snapshot)
+            commits, token = git.log_page(50, "c299")
+            while token is not None:
+                page, token = (loaded, git)[len(commits) // 50 % 2].log_page(50, page_token=token)
+                commits += page
+            self.assertEqual([node.value for node in expected], [node.value for node in commits])
+
+        # (3) commits made after a page was served do not change the following pages
+        cursor = git.history("c299")
+        head = list(islice(cursor, 20))
+        token = cursor.token()
+        git.checkout_commit("c299")
+        git.checkout_branch("late")
+        git.commit_many(f"late{i}" for i in range(10))
+        self.assertEqual(expected[20:], list(git.history(page_token=token)))
+        self.assertEqual(expected[:20], head)
+
+        # (4) malformed tokens
+        for token in ["", "not a token", "W10=", "WzEsW1sibm9wZSIsMCwwXV1d"]:
+            self.assertRaises(Exception, git.log_page, 5, None, token)
+
+    def test_message_pool(self):
+        body = "Merge branch 'feature' into main\n\n" + "Resolve conflicts in the parser. " * 20
+        git = Git(MessagePool(compress_threshold=100))
+        for i in range(50):
+            git.commit("".join(["w", "i", "p"]))  # a new string object each time
+            git.commit(body[:-1] + body[-1])
+        git.checkout_branch("feature")
+        git.commit_many(["wip", f"fix {0}", body])
+
+        # (1) equal messages share a single object, long ones are compressed
+        pool = git.message_pool
+        self.assertEqual(3, len(pool))
+        wip = git.start.head.value
+        self.assertTrue(all(value is wip for value in git.start if not isinstance(value, bytes)))
+        self.assertIsInstance(git.start.tail.value, CompressedMessage)
+        self.assertIs(git.start.tail.value, git.current_branch.tail.value)
+        self.assertLess(len(git.start.tail.value), len(body))
+
+        # (2) reading and looking up messages is transparent
+        self.assertEqual(body, git.get_current_commit())
+        git.checkout_commit(body)
+        self.assertEqual(("main", 1), (git.get_current_branch_name(), git.selected_commit.position))
+        self.assertEqual(body, git.get_current_commit())
+        git.checkout_commit("wip")
+        self.assertEqual("wip", git.get_current_commit())
+        self.assertIs(git.start.head.next, git.find_commit(git.start, body)[1])
+        self.assertEqual(1, git.distance(body, "wip"))
+
+        # (3) the report accounts for every commit, and only those
+        self.assertRaises(Exception, git.commit, "rejected")
+        report = pool.report()
+        self.assertEqual(103, report["commits"])
+        self.assertEqual(3, report["distinct"])
+        self.assertEqual(report["raw_bytes"] - report["stored_bytes"], report["saved_bytes"])
+        self.assertGreater(report["saved_bytes"], 50 * len(body))
+
+        # (4) snapshots hold the original messages
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "history.snap")
+            git.save(path)
+            loaded = Git.load(path)
+            loaded.checkout_commit(body)
+            self.assertEqual(body, loaded.get_current_commit())
+            self.assertEqual(self.tree_state(git), self.tree_state(loaded))
+
+    def test_hooks(self):
+        class Recorder(Hook):
+            def __init__(self):
+                self.events = []
+
+            def before(self, operation):
+                self.events.append(("before", operation))
+
+            def after(self, operation, visited, elapsed_ns):
+                self.events.append(("after", operation, visited))
+
+        git = Git()
+        for commit in ["a", "b", "c"]:
+            git.commit(commit)
+        git.backwards()
+        git.checkout_branch("feature")
+        git.commit("d")
+        git.checkout_branch("main")
+
+        # (1) without hooks the plain class runs
+        self.assertIs(Git, type(git))
+
+        # (2) hooks see every traced operation, and the nodes searches walk
+        recorder, stats = Recorder(), LatencyStats()
+        git.add_hook(recorder)
+        git.add_hook(stats)
+        git.backwards()
+        git.forward()
+        self.assertEqual("feature", git.find_commit(git.start, "d")[0].name)
+        self.assertEqual("feature", git.find_branch(git.start, "feature").name)
+        self.assertIsNone(git.find_commit(git.start, "missing"))
+        self.assertRaises(Exception, git.checkout_commit, "missing")
+        self.assertEqual([("before", "backwards"), ("after", "backwards", 1),
+                          ("before", "forward"), ("after", "forward", 1),
+                          ("before", "find_commit"), ("after", "find_commit", 4),
+                          ("before", "find_branch"), ("after", "find_branch", 3),
+                          ("before", "find_commit"), ("after", "find_commit", 4),
+                          ("before", "checkout_commit"), ("after", "checkout_commit", 1)],
+                         recorder.events)
+        self.assertEqual("c", git.get_current_commit())
+
+        # (3) the aggregator reports percentiles per operation
+        for _ in range(99):
+            git.find_branch(git.start, "main")
+        report = stats.report()
+        self.assertEqual(2, report["find_commit"]["count"])
+        self.assertEqual(8, report["find_commit"]["visited_total"])
+        self.assertEqual(100, report["find_branch"]["count"])
+        self.assertEqual(0, report["find_branch"]["visited_p50"])
+        self.assertEqual(0, report["find_branch"]["visited_p99"])
+        self.assertEqual(3, report["find_branch"]["visited_total"])
+        self.assertLessEqual(report["find_branch"]["p50_ns"], report["find_branch"]["p99_ns"])
+        self.assertLessEqual(report["find_branch"]["p99_ns"], report["find_branch"]["max_ns"])
+
+        # (4) removing the last hook switches tracing off again
+        git.remove_hook(recorder)
+        git.remove_hook(stats)
+        self.assertIs(Git, type(git))
+        events = len(recorder.events)
+        git.checkout_commit("d")
+        self.assertEqual(events, len(recorder.events))
+
+    def test_worktrees(self):
+        git = self.build_tree(500)
+        git.checkout_commit("c0")
+
+        # (1) worktrees start at their creator's position, then move independently
+        first, second = git.worktree(), git.worktree()
+        self.assertEqual("c0", first.get_current_commit())
+        first.checkout_commit("c300")
+        second.checkout_commit("c100")
+        second.backwards()
+        self.assertEqual("c0", git.get_current_commit())
+        self.assertEqual("c300", first.get_current_commit())
+        self.assertIs(git.find_commit(git.start, "c100")[1].parent(), second.selected_commit)
+
+        # (2) each one behaves like a Git object of its own over the same history
+        for message in ["c42", "c250", "c499"]:
+            solo = self.build_tree(500)
+            tree = git.worktree()
+            for g in (solo, tree):
+                g.checkout_commit(message)
+                for _ in range(3):
+                    g.backwards()
+                for _ in range(2):
+                    g.forward()
+            self.assertEqual(solo.get_current_commit(), tree.get_current_commit())
+            self.assertEqual(solo.get_current_branch_name(), tree.get_current_branch_name())
+
+        # (3) commits and branches made through one worktree are seen by all
+        second.checkout_branch("shared")
+        second.commit("s0")
+        first.checkout_commit("s0")
+        self.assertEqual("shared", first.get_current_branch_name())
+        self.assertIn("shared", git.list_branches())
+        self.assertEqual("c0", git.get_current_commit())
+
+        # (4) a worktree costs a constant amount of memory
+        tracemalloc.start()
+        worktrees = [git.worktree() for _ in range(1000)]
+        used, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertLess(used / len(worktrees), 1024)
+
+        # (5) worktrees follow the journal opened, compacted or closed through any of them
+        with tempfile.TemporaryDirectory() as directory:
+            snapshot_path = os.path.join(directory, "history.snap")
+            journal_path = os.path.join(directory, "history.journal")
+            git = Git()
+            git.commit("j0")
+            tree = git.worktree()
+            git.open_journal(journal_path)
+            tree.commit("j1")
+            git.compact(snapshot_path, background=False)
+            tree.commit("j2")
+            tree.checkout_branch("side")
+            tree.commit("j3")
+            recovered = Git.recover(snapshot_path, journal_path)
+            self.assertEqual(self.tree_state(git), self.tree_state(recovered))
+            recovered.close()
+            tree.close_journal()
+            self.assertIsNone(git._journal)
+            git.commit("j4")
+
+    def test_snapshots(self):
+        git = self.build_tree(300)
+        git.checkout_commit("c150")
+        expected_state = self.tree_state(git.worktree())
+        expected_log = [node.value for node in git.log(1000, "c299")]
+        view = git.snapshot()
+
+        # (1) commits, merges and branches made after the view was taken are not visible in it
+        git.checkout_branch("main")
+        git.commit("late0")
+        git.commit("c250")  # the index now points at this commit for "c250"
+        git.checkout_branch("late")
+        git.commit_many(f"late{i}" for i in range(1, 20))
+        git.merge(git.find_commit(git.start, "c299")[0].name, "late-merge")
+        self.assertEqual(git.find_commit(git.start, "c150")[0].name, view.get_current_branch_name())
+        self.assertEqual("c150", view.get_current_commit())
+        self.assertEqual([name for name, _, _ in expected_state], view.list_branches())
+        self.assertIsNone(view.find_commit(view.start, "late0"))
+        self.assertIsNone(view.find_branch(view.start, "late"))
+        self.assertEqual(expected_log, [node.value for node in view.log(1000, "c299")])
+        self.assertRaises(Exception, view.log, 5, "late-merge")
+        self.assertRaises(Exception, view.is_ancestor, "c0", git.selected_commit)
+        c250 = view._resolve("c250")
+        self.assertIsNot(git._resolve("c250"), c250)
+        self.assertEqual(c250.branch.name, view.find_commit(view.start, "c250")[0].name)
+        self.assertTrue(view.is_ancestor("c0", "c250"))
+        self.assertIs(git.merge_base("c150", c250), view.merge_base("c150", "c250"))
+        self.assertEqual(git.distance("c150", "c299"), view.distance("c150", "c299"))
+        self.assertEqual([(branch.name, node.value) for branch, node in view.search("^c29")],
+                         [(branch.name, node.value) for branch, node in git.search("^c29")])
+
+        # (2) pages of history resume within the view; tokens reaching later commits are rejected
+        commits, token = view.log_page(40, "c299")
+        while token is not None:
+            page, token = view.log_page(40, page_token=token)
+            commits += page
+        self.assertEqual(expected_log, [node.value for node in commits])
+        cursor = git.history("late-merge")
+        next(cursor)
+        self.assertRaises(Exception, view.log_page, 5, None, cursor.token())
+
+        # (3) saving the view writes the tree as it was
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "view.snap")
+            view.save(path)
+            self.assertEqual(expected_state, self.tree_state(Git.load(path)))
+
+            # (4) a view of a loaded tree sees the branches deserialized after it was taken
+            git.save(path)
+            loaded = Git.load(path)
+            loaded_view = loaded.snapshot()
+            loaded.checkout_branch("late")
+            loaded.commit("after")
+            self.assertEqual(git.list_branches(), loaded_view.list_branches())
+            self.assertEqual(git.log(10, "late-merge")[1].value, loaded_view.log(10, "late-merge")[1].value)
+            self.assertIsNone(loaded_view.find_commit(loaded_view.start, "after"))
+
+        # (5) read-only
+        for operation, args in [("commit", ("x",)), ("commit_many", (["x"],)), ("merge", ("late", "x")),
+                                ("backwards", ()), ("forward", ()), ("checkout_commit", ("c0",)),
+                                ("checkout_branch", ("main",)), ("worktree", ())]:
+            self.assertRaises(Exception, getattr(view, operation), *args)
+        self.assertIs(view, view.snapshot())
+
+        # (6) grep only finds the commits of the view
+        indexed = Git(text_index=TextIndex())
+        indexed.commit("fix parser")
+        indexed_view = indexed.snapshot()
+        indexed.commit("fix lexer")
+        self.assertEqual(["fix parser"], [node.value for node in indexed_view.grep("fix")])
+        self.assertEqual(2, len(indexed.grep("fix")))
+
+        # (7) a view costs a constant amount of memory and time
+        tracemalloc.start()
+        views = [git.snapshot() for _ in range(1000)]
+        used, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertLess(used / len(views), 1024)
+
+        # (8) a view taken before the first commit sees an empty tree
+        empty = Git()
+        empty_view = empty.snapshot()
+        empty.commit("first")
+        empty.checkout_branch("side")
+        empty.commit("second")
+        self.assertEqual([], empty_view.search("."))
+        self.assertEqual(["main"], empty_view.list_branches())
+        self.assertIsNone(empty_view.get_current_commit())
+        self.assertIsNone(empty_view.find_commit(empty_view.start, "first"))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "empty.snap")
+            empty_view.save(path)
+            self.assertEqual([("main", None, [])], self.tree_state(Git.load(path)))
+
+        # (9) the branches of a view only show the commits made before it, whatever view reads them
+        tree = Git()
+        tree.commit("d1")
+        first = tree.snapshot()
+        tree.commit("d2")
+        tree.checkout_branch("side")
+        second = tree.snapshot()
+        tree.checkout_branch("main")
+        tree.commit("d0")
+        for view, values in [(first, ["d1"]), (second, ["d1", "d2"])]:
+            branch = view.start
+            self.assertEqual(len(values), len(branch))
+            self.assertEqual(values, list(branch))
+            self.assertNotIn("d0", branch)
+            self.assertEqual(values[-1], branch.tail.value)
+            self.assertEqual(branch, tree.start)
+            self.assertEqual(values, list(view.find_branch(view.start, "main")))
+        self.assertEqual(["d1"], list(first.current_branch))
+        self.assertEqual(["main"], first.list_branches())
+        self.assertEqual(("side", 0), (second.current_branch.name, len(second.current_branch)))
+        self.assertRaises(AttributeError, setattr, first, "current_branch", tree.start)
+        # Sizes are only kept while a view may need them: a commit in a later version drops them.
+        self.assertEqual(2, len(tree.start.sizes))
+        del first, second, view, branch
+        tree.snapshot()
+        tree.commit("d3")
+        self.assertEqual([], tree.start.sizes)
+
+    def test_async(self):
+        # (1) walks give the same answers as Git, and let other coroutines run meanwhile
+        git = self.build_tree(2000)
+        git.checkout_commit("c1999")
+        front = AsyncGit(git, chunk=100)
+
+        async def walk_while_ticking():
+            ticks, done = 0, False
+
+            async def tick():
+                nonlocal ticks
+                while not done:
+                    ticks += 1
+                    await asyncio.sleep(0)
+
+            ticker = asyncio.create_task(tick())
+            missing = await front.find_commit(git.start, "missing")
+            done = True
+            await ticker
+            found = await front.find_commit(git.start, "c1500")
+            branch = await front.find_branch(git.start, found[0].name)
+            history = await front.log(5000)
+            return missing, ticks, found, branch, history
+
+        missing, ticks, found, branch, history = asyncio.run(walk_while_ticking())
+        self.assertIsNone(missing)
+        self.assertGreaterEqual(ticks, 19)
+        self.assertEqual(git.find_commit(git.start, "c1500"), found)
+        self.assertIs(found[0], branch)
+        self.assertEqual(git.log(5000), history)
+
+        # (2) concurrent clients' commits are durable on return, with fsyncs shared between them
+        with tempfile.TemporaryDirectory() as directory:
+            snapshot, journal = os.path.join(directory, "history.snap"), os.path.join(directory, "journal")
+            git = Git()
+            git.open_journal(journal, group_size=10 ** 6)
+            front = AsyncGit(git)
+
+            async def client(k):
+                tree = front.worktree()
+                await tree.checkout_commit(f"c{k}")
+                await tree.checkout_branch(f"a{k}")
+                for i in range(10):
+                    await tree.commit(f"a{k}-{i}")
+                return await tree.get_current_commit()
+
+            async def serve():
+                await front.commit_many(f"c{i}" for i in range(20))
+                return await asyncio.gather(*(client(k) for k in range(20)))
+
+            with mock.patch("main.os.fsync", wraps=os.fsync) as fsync:
+                tips = asyncio.run(serve())
+            self.assertEqual([f"a{k}-9" for k in range(20)], tips)
+            self.assertLess(fsync.call_count, 20)
+
+            recovered = Git.recover(snapshot, journal)
+            self.assertEqual(self.tree_state(git), self.tree_state(recovered))
+            recovered.close_journal()
+            git.close_journal()
+
+    def test_search(self):
+        git = self.build_tree(2000)
+        for i in range(0, 2000, 97):  # duplicates, so find_commit's choice matters
+            git.checkout_commit(f"c{i}")
+            if git.selected_commit.children_branch is None:
+                git.checkout_branch(f"dup{i}")
+                git.commit(f"c{i * 7 % 2000}")
+        expected = [(branch, node) for branch, node in git._walk(git.start)
+                    if node is not None and node.value.endswith("5") and node.value.startswith("c1")]
+
+        # (1) the same matches, in find_commit order, in process and across processes
+        for processes, piece in [(1, 65536), (2, 100), (3, 333)]:
+            self.assertEqual(expected, git.search(r"^c1\d*5$", processes=processes, piece=piece))
+            self.assertEqual(expected, git.search(ends_with_five_in_c1, processes=processes, piece=piece))
+        for message in ["c0", "c1001", "c7"]:
+            self.assertEqual(git.find_commit(git.start, message), git.search(f"^{message}$", processes=2, piece=50)[0])
+
+        # (2) searching from a branch, and finding nothing
+        branch = git._branches["dup0"]
+        self.assertEqual([(branch, branch.head)], git.search("^c0$", start=branch))
+        self.assertEqual([], git.search("missing", processes=2, piece=100))
+        self.assertEqual([], Git().search("c"))
+
+        # (3) worker processes are started once and reused by later searches, worktrees and views
+        git.search("c1", processes=2, piece=100)
+        pool = git._shared.pool
+        view = git.snapshot()
+        git.checkout_branch("main")
+        git.commit("c1995")
+        git.worktree().search("c1", processes=2, piece=100)
+        self.assertEqual(expected, view.search(r"^c1\d*5$", processes=2, piece=100))
+        self.assertIs(pool, git._shared.pool)
+        self.assertEqual(len(expected) + 1, len(git.search(r"^c1\d*5$", processes=2, piece=100)))
+
+        # (4) a pool given by the caller is used instead, and close stops the pool of the tree
+        with ThreadPoolExecutor(2) as executor:
+            self.assertEqual(expected, view.search(r"^c1\d*5$", pool=executor))
+        git.close()
+        self.assertIsNone(git._shared.pool)
+        self.assertEqual(expected, view.search(ends_with_five_in_c1, processes=3, piece=333))
+        git.close()
+
+    def test_grep(self):
+        words = ["fix", "Fixes", "parser", "parse", "lexer", "tests", "wip", "docs", "merge", "main"]
+        rng = random.Random(7)
+        git = Git(MessagePool(compress_threshold=30), TextIndex())
+        committed = []
+        for i in range(600):
+            message = " ".join(rng.choice(words) for _ in range(rng.randrange(1, 6))) + f" #{i % 50}"
+            if rng.random() < 0.1 and git.selected_commit is not None and git.selected_commit.children_branch is None:
+                git.checkout_branch(f"b{i}")
+            if git.selected_commit is not None and git.selected_commit.next is not None:
+                git.checkout_branch(git.get_current_branch_name())
+            if i % 100 == 99:
+                git.commit_many([message, message + " bulk"])
+                committed += [(git.selected_commit.prev, message), (git.selected_commit, message + " bulk")]
+            else:
+                git.commit(message)
+                committed.append((git.selected_commit, message))
+            if rng.random() < 0.2:
+                git.checkout_commit(rng.choice(committed)[1])
+
+        def expected(query):
+            def matches(message, term):
+                tokens = [token.casefold() for token in message.replace("#", " ").split()]
+                if term.endswith("*"):
+                    return any(token.startswith(term[:-1]) for token in tokens)
+                return term in tokens
+            groups = [group.split() for group in query.casefold().split(" or ")]
+            return [node for node, message in committed
+                    if any(all(matches(message, term) for term in group) for group in groups)]
+
+        # (1) AND, OR and prefix queries match a brute-force scan, in commit order
+        for query in ["fix", "FIX parser", "pars*", "fix* lexer", "wip OR docs", "parse lexer OR merge main tests",
+                      "17", "1*", "bulk", "missing", "missing OR wip", "fix missing*"]:
+            self.assertEqual(expected(query), git.grep(query), query)
+
+        # (2) worktrees share the index, invalid queries raise, and an index is needed
+        tree = git.worktree()
+        git.checkout_branch("main")
+        git.commit("unique token")
+        self.assertEqual([git.selected_commit], tree.grep("uniq*"))
+        for query in ["", "OR wip", "wip OR"]:
+            self.assertRaises(Exception, git.grep, query)
+        self.assertRaises(Exception, Git().grep, "wip")
+
+    def test_concurrent(self):
+        shared = ConcurrentGit()
+        shared.session().commit_many(f"c{i}" for i in range(100))
+        writers, readers, commits = 4, 8, 200
+        done = threading.Event()
+
+        def write(k: int) -> None:
+            session = shared.session()
+            session.checkout_commit(f"c{k}")
+            session.checkout_branch(f"w{k}")
+            for i in range(commits):
+                session.commit(f"w{k}-{i}")
+                if i % 20 == 0:
+                    # Contend with the other writers for the tip of main.
+                    while True:
+                        session.checkout_branch("main")
+                        try:
+                            session.commit(f"m{k}-{i}")
+                            break
+                        except Exception:
+                            pass
+                    session.checkout_branch(f"w{k}")
+
+        def read(seed: int) -> int:
+            session, rng, checks = shared.session(), random.Random(seed), 0
+            while not done.is_set() or checks < 100:
+                r = rng.randrange(1, 100)
+                session.checkout_commit(f"c{r}")
+                self.assertEqual(f"c{r}", session.get_current_commit())
+                session.backwards()
+                self.assertEqual(f"c{r - 1}", session.get_current_commit())
+                session.checkout_branch("main")
+                generations = [node.generation for node in session.log(5)]
+                self.assertEqual(list(range(generations[0], generations[0] - 5, -1)), generations)
+                self.assertEqual(50, session.find_commit(session.start, "c50")[1].position)
+                self.assertTrue(session.is_ancestor("c0", f"c{r}"))
+                checks += 1
+            return checks
+
+        # Switch threads often, so unsynchronized access would interleave.
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            with ThreadPoolExecutor(max_workers=writers + readers) as pool:
+                read_futures = [pool.submit(read, seed) for seed in range(readers)]
+                write_futures = [pool.submit(write, k) for k in range(writers)]
+                for future in write_futures:
+                    future.result()
+                done.set()
+                for future in read_futures:
+                    self.assertGreaterEqual(future.result(), 100)
+        finally:
+            sys.setswitchinterval(interval)
+
+        # every commit landed once, on a consistent tree
+        session = shared.session()
+        git = shared.git
+        for k in range(writers):
+            for i in range(commits):
+                session.checkout_commit(f"w{k}-{i}")
+                self.assertEqual((f"w{k}", i), (session.get_current_branch_name(), session.selected_commit.position))
+        self.assertEqual(100 + writers * commits // 20, len(git.start))
+        self.assertEqual(["main"] + [f"w{k}" for k in range(writers)], sorted(session.list_branches()))
+        for name in git.list_branches():
+            branch, previous = git._branches[name], None
+            node = branch.head
+            for position in range(branch.size):
+                self.assertEqual((position, previous), (node.position, node.prev))
+                self.assertEqual(node.parent().generation + 1 if node.parent() else 0, node.generation)
+                previous, node = node, node.next
+            self.assertIs(previous, branch.tail)
+
+    def test_save_load(self):
+        git = self.build_tree(300)
+        for i in range(0, 300, 7):  # duplicate messages across branches
+            git.checkout_branch(git.list_branches()[i % len(git.list_branches())])
+            git.commit(f"c{i}")
+        git.checkout_commit("c42")
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "history.snap")
+            git.save(path)
+            loaded = Git.load(path)
+
+            # (1) position and branch registry survive, without deserializing untouched branches
+            self.assertEqual(git.get_current_commit(), loaded.get_current_commit())
+            self.assertEqual(git.get_current_branch_name(), loaded.get_current_branch_name())
+            self.assertEqual(git.list_branches(), loaded.list_branches())
+            lazy = [name for name in loaded.list_branches() if type(loaded._branches[name]) is not GitBranch]
+            self.assertGreater(len(lazy), 0)
+
+            # (2) every commit is found where the original tree has it
+            for i in range(300):
+                git.checkout_commit(f"c{i}")
+                loaded.checkout_commit(f"c{i}")
+                self.assertEqual(git.get_current_branch_name(), loaded.get_current_branch_name())
+                self.assertEqual(git.selected_commit.generation, loaded.selected_commit.generation)
+                self.assertEqual(git.selected_commit.position, loaded.selected_commit.position)
+            self.assertRaises(Exception, loaded.checkout_commit, "missing")
+            self.assertEqual(git.distance("c3", "c250"), loaded.distance("c3", "c250"))
+
+            # (3) navigation and new commits work on the loaded tree
+            for name in git.list_branches():
+                git.checkout_branch(name)
+                loaded.checkout_branch(name)
+                self.assertEqual(git.get_current_commit(), loaded.get_current_commit())
+                for _ in range(5):
+                    git.backwards()
+                    loaded.backwards()
+                    self.assertEqual(git.get_current_commit(), loaded.get_current_commit())
+                for _ in range(5):
+                    git.forward()
+                    loaded.forward()
+                    self.assertEqual(git.get_current_commit(), loaded.get_current_commit())
+            loaded.checkout_branch("main")
+            loaded.commit("c1")
+            git.checkout_branch("main")
+            git.commit("c1")
+            git.checkout_commit("c1")
+            loaded.checkout_commit("c1")
+            self.assertEqual(git.get_current_branch_name(), loaded.get_current_branch_name())
+
+            # (4) a loaded tree can be saved again
+            loaded.save(path)
+            reloaded = Git.load(path)
+            self.assertEqual(loaded.list_branches(), reloaded.list_branches())
+            self.assertEqual([n.value for n in loaded.log(400, "c299")], [n.value for n in reloaded.log(400, "c299")])
+
+            # (5) an empty tree round-trips
+            Git().save(path)
+            empty = Git.load(path)
+            self.assertIsNone(empty.get_current_commit())
+            self.assertEqual(["main"], empty.list_branches())
+
+            # (6) overwriting a snapshot leaves the trees loaded from it readable until they are closed
+            git.save(path)
+            first, closed = Git.load(path), Git.load(path)
+            Git().save(path)
+            self.assertFalse(os.path.exists(path + ".tmp"))
+            self.assertEqual(self.tree_state(git), self.tree_state(first))
+            closed.close()
+            self.assertRaises(ValueError, closed.checkout_commit, "c250")
+            first.close()
+
+            # (7) a long chain of branches, each merging the previous one, loads and recovers
+            chain = Git()
+            chain.commit("root")
+            for i in range(300):
+                chain.checkout_commit("root")
+                chain.checkout_branch(f"chain{i}")
+                chain.commit(f"chain{i}-0")
+                if i:
+                    chain.merge(f"chain{i - 1}", f"chain-merge{i}")
+            chain.save(path)
+            expected = [node.value for node in chain.log(1000, "chain-merge299")]
+            for loaded in (Git.load(path), Git.recover(path, os.path.join(directory, "chain.journal"))):
+                loaded.checkout_commit("chain-merge299")
+                self.assertEqual(expected, [node.value for node in loaded.log(1000)])
+                self.assertEqual(chain.distance("root", "chain-merge299"), loaded.distance("root", "chain-merge299"))
+                self.assertEqual(self.tree_state(chain), self.tree_state(loaded))
+                loaded.close()
+
+            # (8) a merge made while the branch sizes are read makes save read them again
+            racy = Git()
+            racy.commit("r0")
+            racy.checkout_branch("a")
+            racy.commit("a1")
+            racy.checkout_commit("r0")
+            racy.checkout_branch("b")
+            racy.commit("b1")
+            listed = Git._extents
+
+            def racing_extents(git):
+                extents = listed(git)
+                if not racing_extents.done:
+                    # "a" was read before its new commit, "b" after the merge of that commit.
+                    racing_extents.done = True
+                    git.checkout_branch("a")
+                    git.commit("a2")
+                    git.checkout_branch("b")
+                    git.merge("a", "b2")
+                    extents = [(branch, branch.size if branch.name == "b" else size) for branch, size in extents]
+                return extents
+
+            racing_extents.done = False
+            with mock.patch.object(Git, "_extents", racing_extents):
+                racy.save(path)
+            self.assertEqual(self.tree_state(racy), self.tree_state(Git.load(path)))
+
+    def tree_state(self, git: Git) -> List[tuple]:
+        """
+        Describe every branch of a Git tree by name, fork point and commit messages.
+        Used as helper function in testcases. Not an actual testcase itself.
+
+        :param git: Git object to describe.
+        :return: list of (name, parent commit position or None, messages) tuples in creation order.
+        """
+        state = []
+        for name in git.list_branches():
+            git.checkout_branch(name)
+            branch = git.current_branch
+            fork = branch.parent_node.position if branch.parent_node is not None else None
+            state.append((name, fork, [MessagePool.text(value) for value in branch]))
+        return state
+
+    def test_journal(self):
+        with tempfile.TemporaryDirectory() as directory:
+            snapshot = os.path.join(directory, "history.snap")
+            journal = os.path.join(directory, "history.journal")
+
+            # (1) recovery without a snapshot replays every journaled commit and branch
+            git = Git()
+            git.open_journal(journal)
+            for i in range(10):
+                git.commit(f"c{i}")
+            git.checkout_commit("c4")
+            git.checkout_branch("feature")
+            git.commit("f0")
+            git.commit("c1")
+            git.checkout_branch("main")
+            git.commit("c10")
+            git.close_journal()
+
+            recovered = Git.recover(snapshot, journal)
+            self.assertEqual("c10", recovered.get_current_commit())
+            self.assertEqual(self.tree_state(git), self.tree_state(recovered))
+            recovered.close_journal()
+
+            # (2) a record torn by a crash is ignored
+            with open(journal, "ab") as file:
+                file.write(b"\x20\x00\x00\x00garbage")
+            recovered = Git.recover(snapshot, journal)
+            self.assertEqual(self.tree_state(git), self.tree_state(recovered))
+            recovered.close_journal()
+            os.remove(journal)
+
+            # (3) grouped records reach the file once the group is complete or on sync
+            git = Git()
+            git.open_journal(journal, group_size=4)
+            for i in range(3):
+                git.commit(f"c{i}")
+            self.assertEqual(0, len(list(git._journal.records(journal))))
+            git.commit("c3")
+            self.assertEqual(4, len(list(git._journal.records(journal))))
+            git.commit("c4")
+            git.sync()
+            self.assertEqual(5, len(list(git._journal.records(journal))))
+
+            # (4) background compaction while commits keep coming in
+            git.checkout_branch("feature")
+            thread = git.compact(snapshot)
+            for i in range(5, 200):
+                git.commit(f"c{i}")
+            thread.join()
+            self.assertTrue(os.path.exists(snapshot))
+            self.assertFalse(os.path.exists(journal + ".compacting"))
+            git.sync()
+            recovered = Git.recover(snapshot, journal)
+            self.assertEqual(self.tree_state(git), self.tree_state(recovered))
+            recovered.close_journal()
+
+            # (5) crash after rotating the journal but before the snapshot was replaced
+            git.checkout_commit("c150")
+            git.checkout_branch("late")
+            git.commit("l0")
+            git.close_journal()
+            os.replace(journal, journal + ".compacting")
+            with open(journal, "wb"):
+                pass
+            recovered = Git.recover(snapshot, journal)
+            self.assertEqual("l0", recovered.get_current_commit())
+            self.assertEqual(self.tree_state(git), self.tree_state(recovered))
+
+            # (6) the next compaction folds in the journal left behind by the crash
+            recovered.compact(snapshot, background=False)
+            self.assertFalse(os.path.exists(journal + ".compacting"))
+            recovered.close_journal()
+            self.assertEqual(self.tree_state(git), self.tree_state(Git.load(snapshot)))
+
+            # (7) a failed background compaction is raised by the next sync, once, and its journal is
+            #     folded in by the next compaction
+            recovered = Git.recover(snapshot, journal)
+            recovered.checkout_branch("main")
+            recovered.commit("after-crash")
+            with mock.patch.object(Git, "_encode", side_effect=OSError("disk full")):
+                recovered.compact(snapshot).join()
+            self.assertTrue(os.path.exists(journal + ".compacting"))
+            self.assertRaises(Exception, recovered.worktree().sync)
+            recovered.sync()
+            recovered.compact(snapshot, background=False)
+            self.assertFalse(os.path.exists(journal + ".compacting"))
+            recovered.close_journal()
+            self.assertEqual(self.tree_state(recovered), self.tree_state(Git.load(snapshot)))
+
+            # (8) a compaction saving the tree while a branch is being materialized waits for it
+            git = Git()
+            for i in range(5):
+                git.commit(f"c{i}")
+            git.checkout_commit("c2")
+            git.checkout_branch("side")
+            git.commit_many(f"s{i}" for i in range(10))
+            git.checkout_branch("main")
+            git.save(snapshot)
+            os.remove(journal)
+            loaded = Git.recover(snapshot, journal)
+            paused, resume = threading.Event(), threading.Event()
+            message = _Snapshot.message
+
+            def slow_message(snap, commit_id):
+                if threading.current_thread() is navigator and not paused.is_set():
+                    paused.set()
+                    resume.wait()
+                return message(snap, commit_id)
+
+            navigator = threading.Thread(target=loaded.checkout_branch, args=("side",))
+            with mock.patch.object(_Snapshot, "message", slow_message):
+                navigator.start()
+                self.assertTrue(paused.wait(10))
+                compaction = loaded.compact(snapshot)
+                compaction.join(0.2)
+                resume.set()
+                navigator.join()
+                compaction.join()
+            loaded.sync()
+            loaded.close_journal()
+            recovered = Git.recover(snapshot, journal)
+            self.assertEqual(self.tree_state(git), self.tree_state(recovered))
+            recovered.close_journal()
+
+            # (9) a compaction overlapping a merge saves the merge commit with its merge parent, or
+            #     leaves it to the journal
+            os.remove(snapshot)
+            os.remove(journal)
+            git = Git.recover(snapshot, journal)
+            git.commit("a")
+            git.checkout_branch("side")
+            git.commit("b")
+            git.checkout_branch("main")
+            git.commit("c")
+            paused, resume = threading.Event(), threading.Event()
+            set_merge_parents = Commit.set_merge_parents
+
+            def slow_merge_parents(node, merge_parents):
+                if threading.current_thread() is merger and not paused.is_set():
+                    paused.set()
+                    resume.wait()
+                set_merge_parents(node, merge_parents)
+
+            merger = threading.Thread(target=git.merge, args=("side", "m"))
+            with mock.patch.object(Commit, "set_merge_parents", slow_merge_parents):
+                merger.start()
+                try:
+                    self.assertTrue(paused.wait(10))
+                    git.compact(snapshot, background=False)
+                finally:
+                    resume.set()
+                    merger.join()
+            git.close_journal()
+            recovered = Git.recover(snapshot, journal)
+            recovered.checkout_commit("m")
+            self.assertEqual(["c", "b"], [node.value for node in recovered.selected_commit.parents()])
+            recovered.close_journal()
+
+            # (10) a compaction overlapping commit_many saves the commits linked but not indexed yet
+            git = Git.recover(snapshot, journal)
+            paused, resume = threading.Event(), threading.Event()
+
+            def messages():
+                for i in range(EXTEND_BATCH + 10):
+                    if i == EXTEND_BATCH + 5:
+                        paused.set()
+                        resume.wait()
+                    yield f"batch{i}"
+
+            committer = threading.Thread(target=git.commit_many, args=(messages(),))
+            committer.start()
+            try:
+                self.assertTrue(paused.wait(10))
+                git.compact(snapshot).join()
+            finally:
+                resume.set()
+                committer.join()
+            git.sync()
+            git.close_journal()
+            recovered = Git.recover(snapshot, journal)
+            self.assertEqual(self.tree_state(git), self.tree_state(recovered))
+            recovered.close_journal()
+            loaded = Git.load(snapshot)
+            loaded.checkout_commit(f"batch{EXTEND_BATCH - 1}")
+            self.assertEqual("m", loaded.selected_commit.ancestor(2).value)
+
+    def test_fan_out(self):
+        git = self.build_tree(400, seed=5, fan_out=True)
+        # Many branches from one commit, and duplicated messages across them
+        git.checkout_commit("c3")
+        for i in range(50):
+            git.checkout_branch(f"fan{i}")
+            git.commit(f"c{i % 7}")
+            git.commit(f"fan{i}-tip")
+            git.checkout_commit("c3")
+        fork = git.selected_commit
+        self.assertEqual([f"fan{i}" for i in reversed(range(50))], [branch.name for branch in fork.child_branches()][:50])
+        forks = [node for _, node in git._walk(git.start) if node is not None and len(list(node.child_branches())) > 1]
+        self.assertGreater(len(forks), 1)
+
+        # (1) the index and the depth-first walks agree on every message
+        for i in range(400):
+            git.checkout_commit(f"c{i}")
+            self.assertEqual(git.find_commit(git.start, f"c{i}"), (git.current_branch, git.selected_commit))
+        for name in git.list_branches():
+            self.assertEqual(name, git.find_branch(git.start, name).name)
+        walked = [branch.name for branch, node in git._walk(git.start) if node is None]
+        self.assertEqual(sorted(git.list_branches()), sorted(walked))
+
+        # (2) backwards to the root then forward again returns to the tip, through fan-out commits
+        for name in ["fan0", "fan25", "fan49"] + git.list_branches()[-5:]:
+            git.checkout_branch(name)
+            tip = git.selected_commit
+            for _ in range(tip.generation):
+                git.backwards()
+            self.assertEqual(0, git.selected_commit.generation)
+            for _ in range(tip.generation):
+                git.forward()
+            self.assertIs(tip, git.selected_commit)
+
+        # (3) snapshots and journals keep every child branch, in creation order
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "history.snap")
+            git.save(path)
+            loaded = Git.load(path)
+            self.assertEqual(self.tree_state(git), self.tree_state(loaded))
+            loaded.checkout_commit("c3")
+            self.assertEqual([branch.name for branch in fork.child_branches()],
+                             [branch.name for branch in loaded.selected_commit.child_branches()])
+            for i in range(7):
+                loaded.checkout_commit(f"c{i}")
+                git.checkout_commit(f"c{i}")
+                self.assertEqual(git.get_current_branch_name(), loaded.get_current_branch_name())
+
+            journal = os.path.join(directory, "journal")
+            logged = Git()
+            logged.open_journal(journal)
+            logged.commit("root")
+            for name in ["x", "y", "z"]:
+                logged.checkout_commit("root")
+                logged.checkout_branch(name)
+                logged.commit(f"{name}0")
+            logged.close_journal()
+            recovered = Git.recover(os.path.join(directory, "missing.snap"), journal)
+            recovered.close_journal()
+            recovered.checkout_commit("root")
+            self.assertEqual(["z", "y", "x"], [branch.name for branch in recovered.selected_commit.child_branches()])
+
+    def test_checkout_commit_duplicates(self):
+        # Duplicate messages resolve to the commit find_commit's depth-first search reaches first
+        git = Git()
+        for commit in ["wip", "a", "b", "c"]:
+            git.commit(commit)
+
+        git.checkout_commit("a")
+        git.checkout_branch("from_a")
+        for commit in ["fix", "wip", "x"]:
+            git.commit(commit)
+
+        git.checkout_commit("c")
+        git.checkout_branch("from_c")
+        for commit in ["fix", "y"]:
+            git.commit(commit)
+
+        git.checkout_commit("x")
+        git.checkout_branch("from_x")
+        git.commit("y")
+        git.commit("fix")
+
+        git.checkout_branch("main")
+        git.commit("wip")
+        git.commit("fix")
+
+        for message in ["wip", "a", "b", "c", "fix", "x", "y"]:
+            expected_branch, expected_node = git.find_commit(git.start, message)
+            git.checkout_commit(message)
+            self.assertIs(git.current_branch, expected_branch)
+            self.assertIs(git.selected_commit, expected_node)
+            self.assertEqual(git.get_current_commit(), message)
+
+        git.checkout_commit("fix")
+        self.assertEqual(git.get_current_branch_name(), "main")
+        git.checkout_commit("y")
+        self.assertEqual(git.get_current_branch_name(), "from_c")
+
 
 if __name__ == '__main__':
     unittest.main()